@@ -0,0 +1,149 @@
+# analysis_pipeline.py
+import concurrent.futures
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from map_access import window_maps
+from map_cache import get_map_cache, source_key
+from map_store import map_to_dataframe
+from synthetic_maps import generate_synthetic_maps
+
+# 解析するマップ名
+MAP_NAMES = ("CD", "position", "LER")
+
+
+class AnalysisPipeline:
+    """
+    入力ごとに結果を覚えておく解析パイプライン
+
+    読み込み → 解析窓の切り出し → マップごとのデータフレーム → マップごとの画像、の
+    各段階を入力をキーにして記憶する。解析パラメータを変えたときは、その値に依存する
+    段階だけが再計算される。実行のマップの読み込みはプロセス全体のマップキャッシュに任せ、
+    マップのファイルが更新された場合は以降の段階もやり直す。
+    """
+
+    def __init__(self, renderer, memo_size=8):
+        self.renderer = renderer
+        self.memo_size = memo_size
+        self._memo = {}
+        self._image_lock = threading.Lock()  # 画像は描画プロセスの完了通知スレッドからも記憶する
+        self.recomputed = []  # 直前の解析で再計算した段階（ログ用）
+
+    def _cached(self, stage, key, compute):
+        """段階の結果を入力キーで記憶し、同じ入力なら再計算しない"""
+        memo = self._memo.setdefault(stage, OrderedDict())
+        if key in memo:
+            memo.move_to_end(key)
+            return memo[key]
+
+        value = compute()
+        memo[key] = value
+        while len(memo) > self.memo_size:
+            memo.popitem(last=False)
+        self.recomputed.append(stage)
+        return value
+
+    def clear(self):
+        """記憶している結果を全て破棄する"""
+        with self._image_lock:
+            self._memo.clear()
+
+    def _metric_frame(self, window, name):
+        """解析窓のマップをデータフレームにする（保存されていないマップはテスト用に生成）"""
+        if window[name] is not None:
+            return map_to_dataframe(window, name)
+
+        shape = window["CD"].shape
+        if name == "position":
+            data = np.random.normal(0, 5, shape)
+        else:
+            data = np.random.normal(3, 0.5, shape)
+        return pd.DataFrame(data=data, index=window["y_nm"], columns=window["x_nm"])
+
+    def analyze(self, date_dir, params, ROI, X0, Y0, X_pitch, Y_pitch, X_num, Y_num):
+        """
+        解析を実行し、マップごとのデータフレームを返す
+
+        Returns:
+        --------
+        dict
+            マップ名 -> (段階のキー, pd.DataFrame)。キーは render() に渡す
+        """
+        self.recomputed = []
+        window_args = (ROI, X0, Y0, X_pitch, Y_pitch, X_num, Y_num)
+
+        map_cache = get_map_cache()
+        misses = map_cache.misses
+        maps = map_cache.get(date_dir)
+        if map_cache.misses != misses:
+            self.recomputed.append("load")
+
+        if maps is None:
+            # マップがない実行はテスト用のマップを生成（パラメータにも依存する）
+            print(f"警告: {date_dir} のマップが見つかりません。テストデータを生成します。")
+            window_key = (date_dir, window_args, tuple(sorted(params.items())))
+            window = self._cached(
+                "window", window_key,
+                lambda: generate_synthetic_maps(params, X0, Y0, X_pitch, Y_pitch, X_num, Y_num)
+            )
+        else:
+            window_key = (date_dir, source_key(date_dir), window_args)
+            window = self._cached("window", window_key, lambda: window_maps(maps, *window_args))
+
+        metrics = {}
+        for name in MAP_NAMES:
+            metric_key = window_key + (name,)
+            metrics[name] = (
+                metric_key,
+                self._cached("metric", metric_key, lambda name=name: self._metric_frame(window, name))
+            )
+
+        print(f"再計算した段階: {self.recomputed if self.recomputed else 'なし'}")
+        stats = map_cache.stats()
+        print(f"マップキャッシュ: ヒット {stats['hits']} / ミス {stats['misses']}, "
+              f"{stats['entries']} 件 {stats['bytes'] / 1e6:.1f} MB")
+        return metrics
+
+    def render(self, metric_key, title, cmap_name, center_zero, prepare):
+        """
+        マップの画像を返す（同じマップ・表示設定の画像は描画し直さない）
+
+        Parameters:
+        -----------
+        metric_key : tuple
+            analyze() が返した段階のキー
+        prepare : callable
+            描画が必要なときだけ呼ばれ、(配列, 列ラベル, 行ラベル) を返す関数
+
+        Returns:
+        --------
+        concurrent.futures.Future
+            Base64エンコードしたPNG文字列を返すFuture
+        """
+        key = metric_key + (title, cmap_name, center_zero)
+        with self._image_lock:
+            memo = self._memo.setdefault("image", OrderedDict())
+            cached = memo.get(key)
+            if cached is not None:
+                memo.move_to_end(key)
+        if cached is not None:
+            future = concurrent.futures.Future()
+            future.set_result(cached)
+            return future
+
+        data, x_labels, y_labels = prepare()
+        future = self.renderer.submit(title, data, title, cmap_name,
+                                      center_zero=center_zero, x_labels=x_labels, y_labels=y_labels)
+
+        def remember(done):
+            if done.exception() is None and done.result():
+                with self._image_lock:
+                    memo[key] = done.result()
+                    while len(memo) > self.memo_size * len(MAP_NAMES):
+                        memo.popitem(last=False)
+
+        future.add_done_callback(remember)
+        return future
@@ -0,0 +1,263 @@
+# batch_runner.py
+import argparse
+import csv
+import hashlib
+import json
+import os
+import time
+import traceback
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from progress import format_progress_line
+from result_cache import normalize_params
+from result_channel import rebase_result
+from run_catalog import DATA_DIR
+from sweep import expand_sweep, is_sweep_value
+
+
+def job_key(params):
+    """パラメータセットを識別するキー（再開時に完了済みかどうかの判定に使う）"""
+    payload = json.dumps(normalize_params(params), sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def read_jobs(path):
+    """
+    JSONLまたはCSVのファイルからパラメータセットを読み込む
+
+    1行が1パラメータセット。値に範囲指定（開始:終了:刻み）やリスト指定（a,b,c）が
+    含まれる行は全組み合わせに展開する。CSVの値はGUIの入力欄と同じく文字列のまま渡す。
+
+    Returns:
+    --------
+    list of dict
+        パラメータセットのリスト（ファイルの順）
+    """
+    rows = []
+    if path.lower().endswith(".csv"):
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            for row in csv.DictReader(f):
+                rows.append({name: value for name, value in row.items() if name and value != ""})
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    rows.append(json.loads(line))
+                except json.JSONDecodeError as ex:
+                    raise ValueError(f"{path} の {line_no} 行目を読み込めません: {str(ex)}")
+
+    jobs = []
+    for row in rows:
+        if any(is_sweep_value(value) for value in row.values() if isinstance(value, str)):
+            jobs.extend(expand_sweep(row))
+        else:
+            jobs.append(row)
+    return jobs
+
+
+def _journal_path(output_path):
+    """結果を1件ずつ追記するJSONLファイルのパス（Parquet出力時は再開用にParquetの隣に残す）"""
+    if output_path.lower().endswith(".parquet"):
+        return output_path + ".partial.jsonl"
+    return output_path
+
+
+def read_journal(journal_path):
+    """
+    途中まで書かれた結果ファイルを読み込む
+
+    異常終了で最後の行が途中で切れている場合は、その行を無視する。
+
+    Returns:
+    --------
+    list of dict
+        記録済みの結果
+    """
+    records = []
+    if not os.path.exists(journal_path):
+        return records
+    with open(journal_path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                print(f"警告: {journal_path} の壊れた行を無視します")
+    return records
+
+
+def _open_journal(journal_path):
+    """結果ファイルを追記用に開く（途中で切れた行の後ろに続けて書かないよう改行を補う）"""
+    needs_newline = False
+    if os.path.exists(journal_path) and os.path.getsize(journal_path) > 0:
+        with open(journal_path, "rb") as f:
+            f.seek(-1, os.SEEK_END)
+            needs_newline = f.read(1) != b"\n"
+    journal = open(journal_path, "a", encoding="utf-8")
+    if needs_newline:
+        journal.write("\n")
+    return journal
+
+
+def _make_record(params, result, output_path):
+    """
+    シミュレーション結果を結果ファイルの1行にする
+
+    sim_result の配列（.npy）の参照は実行ディレクトリからの相対パスなので、
+    結果ファイルの場所からの相対パスに直す。
+    """
+    sim_result = result.get("sim_result")
+    date_dir = result.get("date_dir")
+    if sim_result is not None and date_dir is not None:
+        sim_result = rebase_result(
+            sim_result,
+            os.path.join(DATA_DIR, date_dir, "data", "output"),
+            os.path.dirname(os.path.abspath(output_path))
+        )
+    return {
+        "key": job_key(params),
+        "params": params,
+        "date_dir": date_dir,
+        "cached": bool(result.get("cached", False)),
+        "sim_result": sim_result,
+        "error": result.get("error"),
+        "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def write_parquet(records, output_path):
+    """結果をParquetファイルに書き出す（パラメータは1列ずつ、結果はJSON文字列で保存）"""
+    if pa is None:
+        raise ImportError("Parquetで出力するには pyarrow が必要です")
+
+    param_names = sorted({name for record in records for name in record["params"]})
+    columns = {
+        "key": [r["key"] for r in records],
+        "date_dir": [r["date_dir"] for r in records],
+        "cached": [r["cached"] for r in records],
+        "error": [r["error"] for r in records],
+        "finished_at": [r["finished_at"] for r in records],
+        "sim_result_json": [json.dumps(r["sim_result"], ensure_ascii=False) for r in records],
+    }
+    for name in param_names:
+        columns[f"p_{name}"] = [
+            str(r["params"][name]) if name in r["params"] else None for r in records
+        ]
+
+    tmp_path = output_path + ".tmp"
+    pq.write_table(pa.table(columns), tmp_path)
+    os.replace(tmp_path, output_path)
+
+
+def run_batch(input_path, output_path, workers=None, force=False, retry_failed=False):
+    """
+    パラメータセットのファイルを並列に実行し、結果を1件ずつ出力ファイルに追記する
+
+    出力ファイルに記録済みのパラメータセットは実行しないので、異常終了した後は
+    同じコマンドを再実行すれば続きから再開できる。Parquetで出力する場合も、
+    記録済みの判定に使うJSONL（出力ファイル名 + .partial.jsonl）は削除せずに残す。
+
+    Parameters:
+    -----------
+    input_path : str
+        パラメータセットのJSONLまたはCSVファイル
+    output_path : str
+        結果のJSONLまたはParquetファイル
+    workers : int, optional
+        ワーカープロセス数（省略時はCPU数）
+    force : bool
+        Trueの場合は結果キャッシュを使わずに再実行する
+    retry_failed : bool
+        Trueの場合はエラーで終わったパラメータセットも再実行する
+
+    Returns:
+    --------
+    int
+        今回の実行でエラーになった件数
+    """
+    from simulation_runner import load_simulation_module
+    from worker_pool import SimulationWorkerPool
+
+    # 単発実行と同じシミュレーションで計算する（テスト用ダミー処理の結果は記録しない）
+    if load_simulation_module() is None:
+        raise ImportError("シミュレーションモジュールが見つからないためバッチ実行できません")
+
+    jobs = read_jobs(input_path)
+    journal_path = _journal_path(output_path)
+
+    done = {}
+    for record in read_journal(journal_path):
+        if record.get("error") is None or not retry_failed:
+            done[record["key"]] = record
+
+    pending = {}
+    for params in jobs:
+        key = job_key(params)
+        if key not in done:
+            pending.setdefault(key, params)
+
+    total = len(done) + len(pending)
+    print(f"パラメータセット {len(jobs)} 件（記録済み {len(done)} 件、実行 {len(pending)} 件）")
+
+    failed = 0
+    if pending:
+        pool = SimulationWorkerPool(processes=workers)
+        pool.start()
+        journal = _open_journal(journal_path)
+        try:
+            completed = len(done)
+            for params, result in pool.run_unordered_items(pending.values(), force=force):
+                record = _make_record(params, result, output_path)
+                journal.write(json.dumps(record, ensure_ascii=False) + "\n")
+                journal.flush()
+                os.fsync(journal.fileno())
+                done[record["key"]] = record
+
+                completed += 1
+                if record["error"] is not None:
+                    failed += 1
+                    print(f"エラー: {record['error']}")
+                print(format_progress_line(completed * 100 / total, f"{completed}/{total} 件完了"), flush=True)
+        finally:
+            journal.close()
+            pool.shutdown()
+
+    if journal_path != output_path:
+        records = [done[job_key(params)] for params in jobs if job_key(params) in done]
+        write_parquet(records, output_path)
+
+    print(f"バッチ実行完了: {total} 件中 エラー {failed} 件、結果を {output_path} に保存しました")
+    return failed
+
+
+def batch_main(argv=None):
+    """バッチ実行のコマンドライン入口"""
+    parser = argparse.ArgumentParser(
+        prog="run_simulation_process.py batch",
+        description="パラメータセットのファイルをGUIなしで一括実行する"
+    )
+    parser.add_argument("input", help="パラメータセットのJSONLまたはCSVファイル")
+    parser.add_argument("output", help="結果のJSONL（.jsonl）またはParquet（.parquet）ファイル")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="ワーカープロセス数（省略時はCPU数）")
+    parser.add_argument("--force", action="store_true", help="結果キャッシュを使わずに再実行する")
+    parser.add_argument("--retry-failed", action="store_true", help="エラーで終わったパラメータセットも再実行する")
+    args = parser.parse_args(argv)
+
+    try:
+        failed = run_batch(args.input, args.output, args.workers, args.force, args.retry_failed)
+    except Exception as e:
+        print(f"エラーが発生しました: {str(e)}")
+        traceback.print_exc()
+        return 1
+    return 1 if failed else 0
@@ -0,0 +1,280 @@
+# checkpoint.py
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import time
+
+from run_catalog import DATA_DIR
+
+# チェックポイントのファイル名（実行ディレクトリの data/output に保存する）
+CHECKPOINT_NAME = "checkpoint.pkl"
+
+# 実行中のプロセスが押さえるロックファイルの名前（data/output に置く）
+CLAIM_NAME = "run.lock"
+
+# 中断した実行の索引（パラメータのハッシュごとのディレクトリに、実行IDの名前の空ファイルを置く）
+RESUMABLE_DIR = os.path.join("..", "resumable_runs")
+
+# 実行IDを親プロセスに伝える標準出力の行の先頭
+RUN_ID_PREFIX = "RUN_ID "
+
+
+def format_run_id_line(run_id):
+    """実行IDを標準出力に書く1行の文字列にする"""
+    return f"{RUN_ID_PREFIX}{run_id}"
+
+
+def parse_run_id_line(line):
+    """標準出力の1行が実行IDの行ならIDを返す（それ以外はNone）"""
+    if not line.startswith(RUN_ID_PREFIX):
+        return None
+    return line[len(RUN_ID_PREFIX):].strip() or None
+
+
+def _params_key(params):
+    """中断した実行の索引に使うパラメータのハッシュ（input.json と完全に一致する場合だけ同じになる）"""
+    payload = json.dumps(params, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _marker_path(params, run_id, index_dir=RESUMABLE_DIR):
+    """中断した実行の索引のファイルのパス"""
+    return os.path.join(index_dir, _params_key(params), run_id)
+
+
+def _remove_file(path):
+    """ファイルがあれば削除する"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def find_resumable_run(params, data_dir=DATA_DIR, index_dir=RESUMABLE_DIR):
+    """
+    同じパラメータで中断した実行を探す
+
+    Checkpoint が最初の保存時に書き、完了時に消す索引（RESUMABLE_DIR）から
+    params の実行だけを調べるので、../data の全ての実行を走査しない。索引は
+    ディスクにあるので、GUIを起動し直した後や異常終了した後も見つけられる。
+    他のプロセスが実行中（RunClaim で押さえている）の実行は返さない。
+
+    Returns:
+    --------
+    str or None
+        再開できる実行ID（複数あれば最も新しいもの）
+    """
+    params_dir = os.path.join(index_dir, _params_key(params))
+    try:
+        run_ids = sorted(os.listdir(params_dir), reverse=True)
+    except OSError:
+        return None
+    for run_id in run_ids:
+        run_dir = os.path.join(data_dir, run_id)
+        output_dir = os.path.join(run_dir, "data", "output")
+        if (not os.path.exists(os.path.join(output_dir, CHECKPOINT_NAME))
+                or os.path.exists(os.path.join(output_dir, "output.json"))):
+            # 消えた実行や完了した実行の索引は片付ける
+            _remove_file(os.path.join(params_dir, run_id))
+            continue
+        if is_claimed(run_dir):
+            continue
+        return run_id
+    return None
+
+
+def _lock_file(f):
+    """ファイルに排他ロックをかける（他で押さえられていれば待たずに OSError）"""
+    if os.name == "nt":
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def _unlock_file(f):
+    """_lock_file() でかけたロックを外す"""
+    if os.name == "nt":
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+class RunClaimedError(RuntimeError):
+    """実行ディレクトリが別のプロセスで実行中"""
+
+
+class RunClaim:
+    """
+    実行ディレクトリを1つのプロセスだけが実行・再開できるようにする排他ロック
+
+    data/output/run.lock をOSのファイルロックで押さえる。取得は不可分なので、
+    同じ中断した実行を2つのプロセスが同時に再開することはない。プロセスが
+    異常終了してもロックはOSが解放するので、中断した実行はそのまま再開できる。
+    """
+
+    def __init__(self, run_dir):
+        self.path = os.path.join(run_dir, "data", "output", CLAIM_NAME)
+        self._file = None
+
+    def acquire(self):
+        """
+        ロックを取る
+
+        Returns:
+        --------
+        bool
+            取れた場合はTrue、別のプロセスが押さえている場合はFalse
+        """
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        f = open(self.path, "a+b")
+        try:
+            _lock_file(f)
+        except OSError:
+            f.close()
+            return False
+        self._file = f
+        return True
+
+    def release(self):
+        """ロックを外す"""
+        if self._file is None:
+            return
+        try:
+            _unlock_file(self._file)
+        finally:
+            self._file.close()
+            self._file = None
+
+
+def is_claimed(run_dir):
+    """実行ディレクトリを別のプロセスが押さえているかどうか"""
+    if not os.path.exists(os.path.join(run_dir, "data", "output", CLAIM_NAME)):
+        return False
+    claim = RunClaim(run_dir)
+    if not claim.acquire():
+        return True
+    claim.release()
+    return False
+
+
+class Checkpoint:
+    """
+    長時間のシミュレーションの途中状態を実行ディレクトリに保存・復元する
+
+    シミュレーションとの取り決め:
+      - run_simulation(params, checkpoint=...) の形で受け取る
+      - 開始時に load() を呼び、Noneでなければその状態から続きを計算する
+      - 計算の区切りごとに maybe_save(state, percent) を呼ぶ
+        （前回の保存から interval 秒以上経っていれば保存する）
+    state は pickle できるオブジェクトなら何でもよい。
+    params を渡すと、最初の保存時に find_resumable_run() の索引に登録し、
+    clear() で索引から外す。on_progress を渡すと、maybe_save() に渡された percent が
+    1%以上進むたび（と再開時）に on_progress(percent) を呼ぶ。
+    """
+
+    def __init__(self, run_dir, interval=60, params=None, on_progress=None):
+        self.run_dir = run_dir
+        self.interval = interval
+        self.on_progress = on_progress
+        self._reported_percent = None
+        self.path = os.path.join(run_dir, "data", "output", CHECKPOINT_NAME)
+        self.marker_path = None
+        if params is not None:
+            self.marker_path = _marker_path(params, os.path.basename(os.path.normpath(run_dir)))
+        self.saved_percent = None
+        self._last_saved_at = time.time()
+
+    def load(self):
+        """
+        最後に保存した状態を返す
+
+        Returns:
+        --------
+        object or None
+            保存した状態。チェックポイントがない、または読めない場合はNone
+        """
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "rb") as f:
+                snapshot = pickle.load(f)
+        except Exception as ex:
+            print(f"チェックポイントを読み込めません（最初から実行します）: {str(ex)}")
+            return None
+        self.saved_percent = snapshot.get("percent")
+        print(f"チェックポイントから再開します（{snapshot.get('saved_at', '?')} 保存）")
+        self._report(self.saved_percent)
+        return snapshot["state"]
+
+    def save(self, state, percent=None):
+        """状態を保存する（書き込み途中で落ちても前回のチェックポイントは壊れない）"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        snapshot = {
+            "state": state,
+            "percent": percent,
+            "saved_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            pickle.dump(snapshot, f, protocol=pickle.HIGHEST_PROTOCOL)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        if self.marker_path is not None and not os.path.exists(self.marker_path):
+            os.makedirs(os.path.dirname(self.marker_path), exist_ok=True)
+            open(self.marker_path, "w").close()
+        self.saved_percent = percent
+        self._last_saved_at = time.time()
+
+    def maybe_save(self, state, percent=None):
+        """
+        前回の保存から interval 秒以上経っていれば状態を保存する
+
+        state に関数を渡した場合は、保存するときだけ呼んで状態を作る。
+
+        Returns:
+        --------
+        bool
+            保存した場合はTrue
+        """
+        self._report(percent)
+        if time.time() - self._last_saved_at < self.interval:
+            return False
+        self.save(state() if callable(state) else state, percent)
+        return True
+
+    def _report(self, percent):
+        """進捗を on_progress に伝える（前回から1%未満しか進んでいなければ伝えない）"""
+        if self.on_progress is None or percent is None:
+            return
+        if self._reported_percent is not None and int(percent) == int(self._reported_percent):
+            return
+        self._reported_percent = percent
+        self.on_progress(percent)
+
+    def clear(self):
+        """完了したシミュレーションのチェックポイントを削除する"""
+        for path in (self.path, self.path + ".tmp"):
+            if os.path.exists(path):
+                os.remove(path)
+        if self.marker_path is not None:
+            _remove_file(self.marker_path)
+
+
+def supports_checkpoint(run_simulation):
+    """シミュレーションの実行関数が checkpoint 引数を受け取れるかどうか"""
+    try:
+        parameters = inspect.signature(run_simulation).parameters
+    except (TypeError, ValueError):
+        return False
+    return "checkpoint" in parameters or any(
+        p.kind == inspect.Parameter.VAR_KEYWORD for p in parameters.values()
+    )
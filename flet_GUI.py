@@ -1,23 +1,27 @@
 import flet as ft
 import pandas as pd
 import numpy as np
-import matplotlib
-matplotlib.use('Agg')  # GUIを使わないバックエンドを設定
-import matplotlib.pyplot as plt
-import base64
-import io
 import json
 import os
-import datetime
-import glob
 import traceback
+import concurrent.futures
+
+from heatmap_renderer import ParallelHeatmapRenderer
+from map_access import load_window
+from map_store import map_to_dataframe
+from synthetic_maps import generate_synthetic_maps
+from run_catalog import RunCatalog, register_run
+from run_id import allocate_run_dir
+from result_selection import ResultSelection
+from run_neighbors import NEIGHBOR_COUNT, get_neighbor_index
+from run_query import RunQuery
+from search_pager import SearchResultPager
 
 # シミュレーション実行関数
 def simu(params):
     """シミュレーションを実行し、結果を保存する"""
     # 結果を保存するディレクトリを作成
-    date_str = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-    data_dir = os.path.join("..", "data", date_str)
+    date_str, data_dir = allocate_run_dir()
     input_dir = os.path.join(data_dir, "data", "input")
     output_dir = os.path.join(data_dir, "data", "output")
     
@@ -28,6 +32,9 @@ def simu(params):
     with open(os.path.join(input_dir, "input.json"), "w") as f:
         json.dump(params, f, indent=4)
     
+    # 検索用カタログに登録
+    register_run(date_str, params)
+    
     # 結果を返す
     result = {
         "date_dir": date_str,
@@ -53,58 +60,41 @@ def Analyze(date_dir, params, ROI, X0, Y0, X_pitch, Y_pitch, X_num, Y_num):
     print(f"解析パラメータ: ROI={ROI}, X0={X0}, Y0={Y0}, X_pitch={X_pitch}, Y_pitch={Y_pitch}, X_num={X_num}, Y_num={Y_num}")
     
     try:
-        # CSVファイルが存在するかチェック
-        csv_path = "CD_map.csv"
-        if not os.path.exists(csv_path):
+        # 実行のマップから解析窓の部分だけを読み込む
+        maps = load_window(date_dir, ROI, X0, Y0, X_pitch, Y_pitch, X_num, Y_num)
+        if maps is None:
             # ファイルが見つからない場合はテストデータを生成
-            print(f"警告: {csv_path} が見つかりません。テストデータを生成します。")
-            # テスト用のデータフレーム生成
-            fixed_size = 20
-            
-            # インデックスと列名を生成（実際の値を想定）
-            y_indices = [f"Y{i}" for i in range(fixed_size)]
-            # X軸は降順
-            x_columns = [f"X{fixed_size - i - 1}" for i in range(fixed_size)]
-            
-            # CDマップのデータフレーム
-            cd_data = np.zeros((fixed_size, fixed_size))
-            base_cd = float(params.get("pattern_width", 100))
-            
-            for i in range(fixed_size):
-                for j in range(fixed_size):
-                    dist_from_center = np.sqrt(((i - fixed_size/2)/(fixed_size/2))**2 + ((j - fixed_size/2)/(fixed_size/2))**2)
-                    cd_value = base_cd * (1 - 0.2 * dist_from_center) + np.random.normal(0, base_cd * 0.03)
-                    wave_pattern = 5.0 * np.sin(i/2) * np.cos(j/2)
-                    cd_data[i, j] = cd_value + wave_pattern
+            print(f"警告: {date_dir} のマップが見つかりません。テストデータを生成します。")
+            # テスト用のマップを解析窓の点数・ピッチ・原点で生成
+            maps = generate_synthetic_maps(params, X0, Y0, X_pitch, Y_pitch, X_num, Y_num)
             
-            CD_df = pd.DataFrame(data=cd_data, index=y_indices, columns=x_columns)
-            
-            # 位置ずれマップのデータフレーム
-            pos_data = np.random.normal(0, 5, (fixed_size, fixed_size))
-            pos_df = pd.DataFrame(data=pos_data, index=y_indices, columns=x_columns)
-            
-            # LERマップのデータフレーム
-            ler_data = np.random.normal(3, 0.5, (fixed_size, fixed_size))
-            LER_df = pd.DataFrame(data=ler_data, index=y_indices, columns=x_columns)
+            CD_df = map_to_dataframe(maps, "CD")
+            pos_df = map_to_dataframe(maps, "position")
+            LER_df = map_to_dataframe(maps, "LER")
             
         else:
-            # CSVファイルの読み込み
-            print(f"CSVファイルを読み込み中: {csv_path}")
-            CD_df = pd.read_csv(csv_path, index_col=0)
+            # 座標[nm]を行・列ラベルに持つデータフレームに変換
+            CD_df = map_to_dataframe(maps, "CD")
             print(f"読み込み完了: {CD_df.shape}")
             
-            # テスト用の他のマップも生成（同じインデックスと列名を使用）
-            pos_df = pd.DataFrame(
-                data=np.random.normal(0, 5, CD_df.shape),
-                index=CD_df.index,
-                columns=CD_df.columns
-            )
+            # 保存されていないマップはテスト用に生成（同じインデックスと列名を使用）
+            if maps["position"] is not None:
+                pos_df = map_to_dataframe(maps, "position")
+            else:
+                pos_df = pd.DataFrame(
+                    data=np.random.normal(0, 5, CD_df.shape),
+                    index=CD_df.index,
+                    columns=CD_df.columns
+                )
             
-            LER_df = pd.DataFrame(
-                data=np.random.normal(3, 0.5, CD_df.shape),
-                index=CD_df.index,
-                columns=CD_df.columns
-            )
+            if maps["LER"] is not None:
+                LER_df = map_to_dataframe(maps, "LER")
+            else:
+                LER_df = pd.DataFrame(
+                    data=np.random.normal(3, 0.5, CD_df.shape),
+                    index=CD_df.index,
+                    columns=CD_df.columns
+                )
             
             # データの詳細を出力
             print(f"データの範囲: min={CD_df.values.min()}, max={CD_df.values.max()}")
@@ -112,7 +102,7 @@ def Analyze(date_dir, params, ROI, X0, Y0, X_pitch, Y_pitch, X_num, Y_num):
             print(f"列名: {CD_df.columns.tolist()}")
             
     except Exception as e:
-        print(f"CSVファイル読み込みエラー: {str(e)}")
+        print(f"マップ読み込みエラー: {str(e)}")
         traceback.print_exc()
         # エラー時はテストデータを返す
         fixed_size = 20
@@ -152,8 +142,17 @@ class PhotomaskApp:
         # アプリケーションの状態
         self.current_view = "input"  # 現在の画面
         self.simulation_result = None  # シミュレーション結果
-        self.search_results = []  # 検索結果
-        self.selected_result = None  # 選択された検索結果
+        self.search_pager = None  # 検索結果（1ページずつ取り出す）
+        self.result_selection = ResultSelection()  # 検索結果の選択状態
+        self.result_checkboxes = {}  # 表示中のページのチェックボックス（実行ディレクトリ名 -> Checkbox）
+        
+        # ヒートマップ描画エンジン（マップごとの描画プロセスでFigureを使い回す）
+        self.heatmap_renderer = ParallelHeatmapRenderer(
+            ["CD Map [nm]", "Position Map [nm]", "LER Map [nm]"],
+            figsize=(6, 5),
+            dpi=100
+        )
+        self.heatmap_renderer.start()
         
         # パラメータの定義（15項目）
         self.param_fields = {
@@ -290,41 +289,23 @@ class PhotomaskApp:
     def search_results_handler(self, e):
         """過去の結果を検索"""
         try:
-            self.search_results = []
+            self.search_pager = None
             
             # 現在のパラメータを取得
             current_params = {}
             for name, field in self.param_fields.items():
                 current_params[name] = field.value
                 
-            # 過去のデータを検索
-            data_path = os.path.join("..", "data")
-            if os.path.exists(data_path):
-                date_dirs = glob.glob(os.path.join(data_path, "*"))
-                
-                for date_dir in date_dirs:
-                    if os.path.isdir(date_dir):
-                        input_json_path = os.path.join(date_dir, "data", "input", "input.json")
-                        if os.path.exists(input_json_path):
-                            try:
-                                with open(input_json_path, "r") as f:
-                                    params = json.load(f)
-                                    
-                                # パラメータが一致するか確認
-                                match = True
-                                for key, value in current_params.items():
-                                    if key in params and str(params[key]) != str(value):
-                                        match = False
-                                        break
-                                        
-                                if match:
-                                    date_name = os.path.basename(date_dir)
-                                    self.search_results.append({
-                                        "date_dir": date_name,
-                                        "params": params
-                                    })
-                            except Exception as ex:
-                                print(f"Error reading {input_json_path}: {str(ex)}")
+            # カタログを差分更新してから索引で検索
+            catalog = RunCatalog()
+            catalog.refresh()
+            self.search_pager = SearchResultPager.from_query(catalog, self._build_run_query(current_params))
+            
+            # 一致する実行がなければ、パラメータ空間で近い実行を近い順に表示する
+            if self.search_pager.total == 0:
+                neighbors = get_neighbor_index().query(current_params, k=NEIGHBOR_COUNT)
+                self.search_pager = SearchResultPager.from_list(neighbors, keep_order=True)
+            self.result_selection.clear()
             
             # 検索結果画面に移動
             self.show_search_results_view()
@@ -342,26 +323,40 @@ class PhotomaskApp:
             self.page.dialog.open = True
             self.page.update()
         
+    def _build_run_query(self, current_params):
+        """入力欄の値から検索条件を作る（実行順に並べる）"""
+        return RunQuery.from_fields(current_params)
+        
     def show_search_results_view(self):
         """検索結果画面を表示"""
         self.current_view = "search_results"
         
-        # 検索結果テーブルの作成
+        # 検索結果テーブルの作成（近い実行を表示する場合は距離の列を加える）
+        show_distance = any("distance" in result for result in self.search_pager.rows)
         table_columns = [
             ft.DataColumn(ft.Text("選択")),
             ft.DataColumn(ft.Text("日付")),
-        ] + [
+        ] + (
+            [ft.DataColumn(ft.Text("距離"), numeric=True)] if show_distance else []
+        ) + [
             ft.DataColumn(ft.Text(name)) for name in self.param_fields.keys()
         ]
         
+        # 表示中のページの行だけを作る
         table_rows = []
-        for i, result in enumerate(self.search_results):
+        self.result_checkboxes = {}
+        for i, result in enumerate(self.search_pager.rows):
+            checkbox = ft.Checkbox(
+                value=self.result_selection.is_selected(result["date_dir"]),
+                on_change=lambda e, idx=i: self.select_result(e, idx)
+            )
+            self.result_checkboxes[result["date_dir"]] = checkbox
             row_cells = [
-                ft.DataCell(
-                    ft.Checkbox(value=False, on_change=lambda e, idx=i: self.select_result(e, idx))
-                ),
+                ft.DataCell(checkbox),
                 ft.DataCell(ft.Text(result["date_dir"])),
             ]
+            if show_distance:
+                row_cells.append(ft.DataCell(ft.Text(f"{result['distance']:.3f}")))
             
             for name in self.param_fields.keys():
                 value = result["params"].get(name, "")
@@ -384,17 +379,46 @@ class PhotomaskApp:
             on_click=lambda _: self.show_input_view()
         )
         
+        btn_prev = ft.ElevatedButton(
+            text="前のページ",
+            icon=ft.icons.NAVIGATE_BEFORE,
+            disabled=not self.search_pager.has_prev,
+            on_click=lambda _: self.change_search_page(-1)
+        )
+        
+        btn_next = ft.ElevatedButton(
+            text="次のページ",
+            icon=ft.icons.NAVIGATE_NEXT,
+            disabled=not self.search_pager.has_next,
+            on_click=lambda _: self.change_search_page(1)
+        )
+        
         btn_analyze = ft.ElevatedButton(
             text="解析モードに移る",
             icon=ft.icons.ANALYTICS,
             on_click=self.go_to_analysis_from_search
         )
         
+        btn_compare = ft.ElevatedButton(
+            text="選択した結果を比較",
+            icon=ft.icons.COMPARE_ARROWS,
+            on_click=self.compare_selected_results
+        )
+        
+        multi_select_checkbox = ft.Checkbox(
+            label="複数選択",
+            value=self.result_selection.multi,
+            on_change=self.toggle_multi_select
+        )
+        
         # レイアウト
         content = ft.Column(
             controls=[
                 ft.Text("検索結果", size=24, weight=ft.FontWeight.BOLD),
-                ft.Text(f"検索結果: {len(self.search_results)}件"),
+                ft.Text(
+                    "一致する実行がないため、条件に近い実行を近い順に表示しています" if show_distance
+                    else self.search_pager.describe()
+                ),
                 ft.Divider(),
                 ft.Container(
                     results_table,
@@ -404,7 +428,7 @@ class PhotomaskApp:
                 ),
                 ft.Divider(),
                 ft.Row(
-                    [btn_back, btn_analyze],
+                    [btn_back, btn_prev, btn_next, multi_select_checkbox, btn_compare, btn_analyze],
                     alignment=ft.MainAxisAlignment.CENTER,
                     spacing=20
                 )
@@ -418,28 +442,79 @@ class PhotomaskApp:
         self.page.add(content)
         self.page.update()
         
-    def select_result(self, e, idx):
-        """検索結果を選択"""
-        # チェックボックスの状態を更新
-        for i, row in enumerate(self.page.controls[0].controls[3].content.rows):
-            checkbox = row.cells[0].content
-            if i == idx:
-                checkbox.value = e.control.value
-            else:
-                checkbox.value = False
-                
-        # 選択された結果を保存
-        if e.control.value:
-            self.selected_result = self.search_results[idx]
+    def change_search_page(self, step):
+        """検索結果のページを送る（step: 1で次、-1で前のページ）"""
+        if step > 0:
+            self.search_pager.next_page()
         else:
-            self.selected_result = None
+            self.search_pager.prev_page()
+        self.show_search_results_view()
+        
+    def _update_result_checkboxes(self, changed):
+        """選択状態が変わった行のチェックボックスだけを画面に反映する"""
+        for date_dir in changed:
+            checkbox = self.result_checkboxes.get(date_dir)
+            if checkbox is None:
+                continue  # 表示中のページにない行
+            value = self.result_selection.is_selected(date_dir)
+            if checkbox.value != value:
+                checkbox.value = value
+                checkbox.update()
+        
+    def select_result(self, e, idx):
+        """検索結果を選択（変わった行のチェックボックスだけを更新する）"""
+        changed = self.result_selection.set(self.search_pager.rows[idx], e.control.value)
+        self._update_result_checkboxes(changed)
+        
+    def toggle_multi_select(self, e):
+        """単一選択・複数選択を切り替える"""
+        changed = self.result_selection.set_multi(e.control.value)
+        self._update_result_checkboxes(changed)
+        
+    def compare_selected_results(self, e):
+        """選択した結果のパラメータを並べて表示する（値が異なるパラメータだけ）"""
+        results = self.result_selection.results
+        if len(results) < 2:
+            self.page.dialog = ft.AlertDialog(
+                title=ft.Text("選択エラー"),
+                content=ft.Text("「複数選択」をオンにして、比較する結果を2件以上選択してください。"),
+                actions=[
+                    ft.TextButton("OK", on_click=lambda _: self.close_dialog())
+                ]
+            )
+            self.page.dialog.open = True
+            self.page.update()
+            return
             
+        differing = [
+            name for name in self.param_fields.keys()
+            if len({str(r["params"].get(name, "")) for r in results}) > 1
+        ]
+        compare_table = ft.DataTable(
+            columns=[ft.DataColumn(ft.Text("パラメータ"))] + [
+                ft.DataColumn(ft.Text(r["date_dir"])) for r in results
+            ],
+            rows=[
+                ft.DataRow(cells=[ft.DataCell(ft.Text(name))] + [
+                    ft.DataCell(ft.Text(str(r["params"].get(name, "")))) for r in results
+                ])
+                for name in differing
+            ],
+        )
+        self.page.dialog = ft.AlertDialog(
+            title=ft.Text(f"{len(results)}件の比較（値が異なるパラメータ {len(differing)}項目）"),
+            content=ft.Row([compare_table], scroll=ft.ScrollMode.AUTO),
+            actions=[
+                ft.TextButton("OK", on_click=lambda _: self.close_dialog())
+            ]
+        )
+        self.page.dialog.open = True
         self.page.update()
         
     def go_to_analysis_from_search(self, e):
-        """検索結果から解析画面に移動"""
-        if self.selected_result:
-            self.simulation_result = self.selected_result
+        """検索結果から解析画面に移動（複数選択時は最後に選択した結果）"""
+        if self.result_selection.current:
+            self.simulation_result = self.result_selection.current
             self.show_analysis_view()
         else:
             # 何も選択されていない場合はアラート表示
@@ -639,118 +714,50 @@ class PhotomaskApp:
         self.page.update()
         
     def update_map_display(self, CD_df, pos_df, LER_df):
-        """マップ表示を更新"""
+        """マップ表示を更新（3つのマップを並列に描画し、できた順に表示する）"""
         try:
             print(f"マップサイズ: CD={CD_df.shape}, POS={pos_df.shape}, LER={LER_df.shape}")
             
-            # CD Map
-            print("CDマップの画像生成開始")
-            cd_map_img = self.create_matplotlib_heatmap(CD_df, "CD Map [nm]", "viridis")
-            if cd_map_img:
-                print("CDマップの画像をコンテナに設定")
-                self.cd_map_container.content = ft.Image(src_base64=cd_map_img)
-            else:
-                self.cd_map_container.content = ft.Text("CDマップの生成に失敗しました", color=ft.colors.RED)
-            
-            # Position Map
-            print("位置マップの画像生成開始")
-            pos_map_img = self.create_matplotlib_heatmap(pos_df, "Position Map [nm]", "coolwarm", center_zero=True)
-            if pos_map_img:
-                print("位置マップの画像をコンテナに設定")
-                self.pos_map_container.content = ft.Image(src_base64=pos_map_img)
-            else:
-                self.pos_map_container.content = ft.Text("位置マップの生成に失敗しました", color=ft.colors.RED)
-            
-            # LER Map
-            print("LERマップの画像生成開始")
-            ler_map_img = self.create_matplotlib_heatmap(LER_df, "LER Map [nm]", "hot")
-            if ler_map_img:
-                print("LERマップの画像をコンテナに設定")
-                self.ler_map_container.content = ft.Image(src_base64=ler_map_img)
-            else:
-                self.ler_map_container.content = ft.Text("LERマップの生成に失敗しました", color=ft.colors.RED)
+            # (データ, タイトル, カラーマップ, 0中心, 表示先, 表示名)
+            map_specs = [
+                (CD_df, "CD Map [nm]", "viridis", False, self.cd_map_container, "CDマップ"),
+                (pos_df, "Position Map [nm]", "coolwarm", True, self.pos_map_container, "位置マップ"),
+                (LER_df, "LER Map [nm]", "hot", False, self.ler_map_container, "LERマップ"),
+            ]
             
-            # 画面更新
-            print("画面更新")
-            self.page.update()
+            # 3つのマップの描画をまとめて投入
+            futures = {}
+            for data, title, cmap_name, center_zero, container, label in map_specs:
+                print(f"{label}の画像生成開始")
+                future = self.heatmap_renderer.submit(
+                    title, data.values, title, cmap_name,
+                    center_zero=center_zero,
+                    x_labels=list(data.columns),
+                    y_labels=list(data.index)
+                )
+                futures[future] = (container, label)
+            
+            # 描画が終わったマップから順に表示
+            for future in concurrent.futures.as_completed(futures):
+                container, label = futures[future]
+                try:
+                    img = future.result()
+                except Exception:
+                    print(f"Matplotlibヒートマップ生成エラー:\n{traceback.format_exc()}")
+                    img = None
+                    
+                if img:
+                    print(f"{label}の画像をコンテナに設定")
+                    container.content = ft.Image(src_base64=img)
+                else:
+                    container.content = ft.Text(f"{label}の生成に失敗しました", color=ft.colors.RED)
+                self.page.update()
             
         except Exception as e:
             error_details = traceback.format_exc()
             print(f"マップ表示エラー: {str(e)}\n{error_details}")
             self.status_text.value = f"マップの表示中にエラーが発生しました: {str(e)}"
             self.status_text.color = ft.colors.RED
-    
-    def create_matplotlib_heatmap(self, df, title, cmap_name, center_zero=False):
-        """matplotlibを使用してデータフレームからヒートマップを生成する"""
-        try:
-            # Clean previous plot
-            plt.clf()
-            plt.figure(figsize=(10, 8))
-            
-            # データフレームから値の配列を取得
-            data = df.values
-            
-            # 値の範囲を設定
-            if center_zero:
-                vmax = max(abs(np.min(data)), abs(np.max(data)))
-                vmin = -vmax
-            else:
-                vmin = np.min(data)
-                vmax = np.max(data)
-            
-            # ヒートマップを作成
-            im = plt.imshow(data, cmap=cmap_name, interpolation='nearest', 
-                           vmin=vmin, vmax=vmax, origin='upper', aspect='equal')
-            
-            # カラーバーを追加
-            cbar = plt.colorbar(im)
-            cbar.set_label(title)
-            
-            # タイトルを設定
-            plt.title(title)
-            
-            # X軸とY軸のラベルを設定
-            plt.xlabel("X軸")
-            plt.ylabel("Y軸")
-            
-            # X軸とY軸の目盛りとラベルを設定
-            # X軸（列名）の目盛り
-            plt.xticks(np.arange(len(df.columns)), df.columns, rotation=90)
-            # Y軸（インデックス）の目盛り
-            plt.yticks(np.arange(len(df.index)), df.index)
-            
-            # グリッド線の表示
-            ax = plt.gca()
-            ax.grid(True, color='white', linestyle='-', linewidth=0.7)
-            ax.set_axisbelow(False)
-            
-            # 統計情報を表示
-            mean_val = np.mean(data)
-            std_val = np.std(data)
-            min_val = np.min(data)
-            max_val = np.max(data)
-            
-            stats_text = f"Mean: {mean_val:.2f}, Std: {std_val:.2f}\nMin: {min_val:.2f}, Max: {max_val:.2f}"
-            plt.figtext(0.02, 0.02, stats_text, fontsize=9, bbox=dict(facecolor='white', alpha=0.8))
-            
-            # レイアウトの調整
-            plt.tight_layout()
-            
-            # 画像をメモリに保存してBase64でエンコード
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=100)
-            buf.seek(0)
-            plt.close()
-            
-            # Base64エンコード
-            img_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-            
-            return img_base64
-            
-        except Exception as e:
-            error_details = traceback.format_exc()
-            print(f"Matplotlibヒートマップ生成エラー:\n{error_details}")
-            return None
 
 if __name__ == "__main__":
     app = PhotomaskApp()
\ No newline at end of file
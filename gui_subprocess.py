@@ -6,6 +6,17 @@ import os
 import json
 import tempfile
 import threading
+import time
+
+from checkpoint import find_resumable_run, parse_run_id_line
+from progress import estimate_eta, format_eta, parse_progress_line
+from result_channel import read_result
+from run_catalog import DATA_DIR
+from subprocess_log import SubprocessLogCapture
+
+# 同時に起動するシミュレーションのサブプロセスの上限（超えた分は空きが出るまで待つ）
+MAX_CONCURRENT_SIMULATIONS = os.cpu_count() or 1
+_simulation_slots = threading.BoundedSemaphore(MAX_CONCURRENT_SIMULATIONS)
 
 class GUIApplication:
     # ... 既存のコード ...
@@ -18,7 +29,8 @@ class GUIApplication:
             for name, field in self.param_fields.items():
                 params[name] = field.value
                 
-            # プログレスバー表示
+            # プログレスバー表示（進捗行を受け取るまでは0%）
+            self.progress_bar.value = 0
             self.page.overlay.append(self.progress_bar)
             self.page.update()
             
@@ -41,6 +53,12 @@ class GUIApplication:
     
     def _execute_simulation_process(self, params):
         """別プロセスでシミュレーションを実行（スレッド内から呼ばれる）"""
+        # 実行中のサブプロセスが上限に達していれば空きが出るまで待つ
+        with _simulation_slots:
+            self._execute_simulation_process_in_slot(params)
+    
+    def _execute_simulation_process_in_slot(self, params):
+        """サブプロセスを1つ起動してシミュレーションを実行する"""
         try:
             # 一時ファイルの作成
             with tempfile.NamedTemporaryFile(mode='w', suffix='.json', delete=False, encoding='utf-8') as f:
@@ -53,11 +71,20 @@ class GUIApplication:
             # シミュレーション実行コマンド
             cmd = [
                 sys.executable, 
+                "-u",  # 進捗行をすぐに受け取れるようにバッファリングを無効化
                 "run_simulation_process.py",
                 param_file,
                 result_file
             ]
             
+            # 同じパラメータの実行が中断されていれば、そのチェックポイントから再開する
+            # （GUIを起動し直した後も見つかるよう、ディスクの索引から探す。同時に
+            # 再開しようとした場合はサブプロセスがロックを取れた方だけが再開する）
+            run_id = find_resumable_run(params)
+            if run_id is not None:
+                print(f"中断した実行 {run_id} を再開します")
+                cmd += ["--run-id", run_id]
+            
             # サブプロセス実行（タイムアウト付き）
             timeout_seconds = 3600  # 1時間
             try:
@@ -70,15 +97,60 @@ class GUIApplication:
                     encoding='utf-8'
                 )
                 
-                # 通信をモニタリング
-                stdout, stderr = process.communicate(timeout=timeout_seconds)
+                # 出力はメモリに溜めずに実行ディレクトリのログファイルへ流す
+                # 標準エラーは別スレッドで読み取る（パイプが詰まらないように）
+                log_capture = SubprocessLogCapture()
+                stderr_thread = threading.Thread(
+                    target=log_capture.pump,
+                    args=(process.stderr, "stderr"),
+                    daemon=True
+                )
+                stderr_thread.start()
+                
+                # タイムアウトしたらプロセスを強制終了
+                timed_out = threading.Event()
+                def kill_on_timeout():
+                    timed_out.set()
+                    process.kill()
+                timer = threading.Timer(timeout_seconds, kill_on_timeout)
+                timer.start()
+                
+                # 標準出力を1行ずつ読み、進捗行をプログレスバーに反映
+                started_at = time.time()
+                def handle_stdout_line(line):
+                    nonlocal run_id
+                    started_run_id = parse_run_id_line(line)
+                    if started_run_id is not None:
+                        run_id = started_run_id
+                        log_capture.attach_run_dir(os.path.join(DATA_DIR, run_id))
+                        return False
+                    progress = parse_progress_line(line)
+                    if progress is None:
+                        return False
+                    percent, phase = progress
+                    eta = estimate_eta(started_at, percent)
+                    self.page.add_event(lambda _, p=percent, ph=phase, t=eta: self._simulation_progress(p, ph, t))
+                    return True
+                
+                try:
+                    log_capture.pump(process.stdout, "stdout", on_line=handle_stdout_line)
+                    process.wait()
+                finally:
+                    timer.cancel()
+                stderr_thread.join()
+                log_capture.close()
+                stderr = log_capture.tail("stderr")
+                if log_capture.log_path is not None:
+                    print(f"シミュレーションのログ: {log_capture.log_path}")
+                
+                if timed_out.is_set():
+                    raise subprocess.TimeoutExpired(cmd, timeout_seconds)
                 
                 if process.returncode != 0:
                     raise Exception(f"プロセスがエラーコード {process.returncode} で終了\n{stderr}")
                 
-                # 結果を読み込み
-                with open(result_file, 'r', encoding='utf-8') as f:
-                    result_data = json.load(f)
+                # 結果を読み込み（配列は実行ディレクトリの .npy をメモリマップで開く）
+                result_data = read_result(result_file)
                 
                 # エラーチェック
                 if isinstance(result_data, dict) and "error" in result_data:
@@ -93,7 +165,10 @@ class GUIApplication:
             except subprocess.TimeoutExpired:
                 # タイムアウト時はプロセスを強制終了
                 process.kill()
-                raise Exception(f"シミュレーションが {timeout_seconds} 秒を超えて応答しないため中断しました")
+                message = f"シミュレーションが {timeout_seconds} 秒を超えて応答しないため中断しました"
+                if run_id is not None:
+                    message += f"\n同じパラメータで再実行すると実行 {run_id} のチェックポイントから再開します"
+                raise Exception(message)
                 
         except Exception as ex:
             print(f"シミュレーション実行中のエラー: {str(ex)}")
@@ -111,6 +186,12 @@ class GUIApplication:
             except:
                 pass
     
+    def _simulation_progress(self, percent, phase, eta):
+        """シミュレーションの進捗を表示（メインスレッドで実行）"""
+        self.progress_bar.value = percent / 100
+        self.progress_bar.tooltip = f"{phase} ({percent:.0f}%)  {format_eta(eta)}"
+        self.page.update()
+    
     def _simulation_completed(self):
         """シミュレーション完了時の処理（メインスレッドで実行）"""
         # プログレスバーを非表示
@@ -0,0 +1,306 @@
+# heatmap_renderer.py
+import base64
+import concurrent.futures
+import multiprocessing as mp
+import struct
+import threading
+import zlib
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+import matplotlib
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+# 目盛りの数（5おきに表示して見やすくする）
+TICK_COUNT = 5
+
+# 高速描画で出力する画像の最大辺 [px]
+FAST_MAX_SIZE = 1024
+
+# これより大きいマップは高速描画を使う目安 [セル数]
+FAST_RENDER_CELLS = 1_000_000
+
+
+def _format_label(label):
+    """目盛りラベルを表示用の文字列にする（数値は余分な桁を省く）"""
+    if isinstance(label, (int, float, np.integer, np.floating)):
+        return f"{float(label):g}"
+    return str(label)
+
+
+def _value_range(data, center_zero):
+    """カラーマップの範囲を決める"""
+    vmin = float(np.nanmin(data))
+    vmax = float(np.nanmax(data))
+    if center_zero:
+        vmax = max(abs(vmin), abs(vmax))
+        vmin = -vmax
+    if vmin == vmax:
+        vmax = vmin + 1e-12
+    return vmin, vmax
+
+
+class _HeatmapSlot:
+    """1つの表示枠で使い回す Figure / Axes / カラーバー"""
+
+    def __init__(self, figsize, dpi):
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot(1, 1, 1)
+        self.image = None
+        self.colorbar = None
+        self.stats_text = None
+        self.shape = None
+        self.lock = threading.Lock()
+
+
+class HeatmapRenderer:
+    """
+    ヒートマップ描画エンジン
+
+    マップ（表示枠）ごとに Figure / Axes / カラーバーを1度だけ作り、2回目以降は
+    画像データ・値の範囲・目盛りだけを更新して描画する。pyplotのグローバル状態は使わない。
+    """
+
+    def __init__(self, figsize=(6, 5), dpi=100):
+        self.figsize = figsize
+        self.dpi = dpi
+        self._slots = {}
+        self._slots_lock = threading.Lock()
+
+    def _get_slot(self, slot_name):
+        """表示枠に対応する描画オブジェクトを返す（なければ作る）"""
+        with self._slots_lock:
+            slot = self._slots.get(slot_name)
+            if slot is None:
+                slot = _HeatmapSlot(self.figsize, self.dpi)
+                self._slots[slot_name] = slot
+            return slot
+
+    def render(self, slot_name, data, title, cmap_name, center_zero=False, x_labels=None, y_labels=None):
+        """
+        ヒートマップをPNGで描画し、Base64文字列を返す
+
+        Parameters:
+        -----------
+        slot_name : str
+            表示枠の名前（同じ名前なら前回の Figure を使い回す）
+        data : np.ndarray
+            2次元のマップ
+        title : str
+            タイトルとカラーバーのラベル
+        cmap_name : str
+            カラーマップ名
+        center_zero : bool
+            Trueの場合は0を中心に対称な範囲で表示する
+        x_labels, y_labels : sequence, optional
+            列・行のラベル（省略時はインデックス）
+        """
+        data = np.asarray(data)
+        vmin, vmax = _value_range(data, center_zero)
+        slot = self._get_slot(slot_name)
+
+        with slot.lock:
+            ax = slot.ax
+            if slot.image is None:
+                # 初回のみ画像・カラーバー・統計表示を作成
+                slot.image = ax.imshow(data, cmap=cmap_name, interpolation='nearest',
+                                       vmin=vmin, vmax=vmax, origin='upper', aspect='equal')
+                slot.colorbar = slot.figure.colorbar(slot.image, ax=ax)
+                ax.set_xlabel("X軸")
+                ax.set_ylabel("Y軸")
+                ax.grid(True, color='white', linestyle='-', linewidth=0.5)
+                ax.set_axisbelow(False)
+                slot.stats_text = slot.figure.text(0.02, 0.02, "", fontsize=8,
+                                                   bbox=dict(facecolor='white', alpha=0.8))
+            else:
+                # 2回目以降はデータと範囲だけを更新
+                slot.image.set_data(data)
+                slot.image.set_cmap(cmap_name)
+                slot.image.set_clim(vmin, vmax)
+
+            rows, cols = data.shape
+            if slot.shape != data.shape:
+                slot.image.set_extent((-0.5, cols - 0.5, rows - 0.5, -0.5))
+                ax.set_xlim(-0.5, cols - 0.5)
+                ax.set_ylim(rows - 0.5, -0.5)
+
+            ax.set_title(title)
+            slot.colorbar.set_label(title)
+
+            # 目盛りは TICK_COUNT おきに表示
+            xtick_step = max(1, cols // TICK_COUNT)
+            ytick_step = max(1, rows // TICK_COUNT)
+            xticks_pos = np.arange(0, cols, xtick_step)
+            yticks_pos = np.arange(0, rows, ytick_step)
+            ax.set_xticks(xticks_pos)
+            ax.set_xticklabels(
+                [_format_label(x_labels[i]) for i in xticks_pos] if x_labels is not None else xticks_pos,
+                rotation=90
+            )
+            ax.set_yticks(yticks_pos)
+            ax.set_yticklabels(
+                [_format_label(y_labels[i]) for i in yticks_pos] if y_labels is not None else yticks_pos
+            )
+
+            # 統計情報を表示
+            slot.stats_text.set_text(
+                f"Mean: {np.nanmean(data):.2f}, Std: {np.nanstd(data):.2f}\n"
+                f"Min: {np.nanmin(data):.2f}, Max: {np.nanmax(data):.2f}"
+            )
+
+            # レイアウトの調整はサイズが変わったときだけ行う
+            if slot.shape != data.shape:
+                slot.figure.tight_layout()
+                slot.shape = data.shape
+
+            # 描画結果のピクセルを直接PNGにする（savefigより描画・圧縮の手間が少ない）
+            slot.canvas.draw()
+            rgb = np.asarray(slot.canvas.buffer_rgba())[:, :, :3]
+            png = encode_png(rgb)
+
+        return base64.b64encode(png).decode('utf-8')
+
+
+def _png_chunk(chunk_type, payload):
+    """PNGのチャンクを作る"""
+    return (struct.pack(">I", len(payload)) + chunk_type + payload
+            + struct.pack(">I", zlib.crc32(chunk_type + payload) & 0xffffffff))
+
+
+def encode_png(rgb):
+    """
+    (高さ, 幅, 3) のuint8配列をPNGのバイト列にする
+
+    各行の先頭にフィルタ種別0を付けてzlibで圧縮するだけの最小構成。
+    """
+    height, width, _ = rgb.shape
+    raw = np.empty((height, width * 3 + 1), dtype=np.uint8)
+    raw[:, 0] = 0
+    raw[:, 1:] = rgb.reshape(height, width * 3)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)  # 8bit RGB
+    return (b"\x89PNG\r\n\x1a\n"
+            + _png_chunk(b"IHDR", header)
+            + _png_chunk(b"IDAT", zlib.compress(raw.tobytes(), 1))
+            + _png_chunk(b"IEND", b""))
+
+
+_lut_cache = {}
+
+
+def _colormap_lut(cmap_name):
+    """カラーマップを256色のRGB表にする"""
+    lut = _lut_cache.get(cmap_name)
+    if lut is None:
+        cmap = matplotlib.colormaps[cmap_name]
+        lut = (cmap(np.linspace(0.0, 1.0, 256))[:, :3] * 255).round().astype(np.uint8)
+        _lut_cache[cmap_name] = lut
+    return lut
+
+
+def render_fast(data, cmap_name, center_zero=False, max_size=FAST_MAX_SIZE):
+    """
+    matplotlibの描画を通さず、カラーマップの色表で直接PNGを作りBase64文字列を返す
+
+    軸・カラーバーは付かない。max_size を超える大きなマップは間引いてから色付けする。
+    """
+    data = np.asarray(data)
+    step_y = max(1, -(-data.shape[0] // max_size))
+    step_x = max(1, -(-data.shape[1] // max_size))
+    data = data[::step_y, ::step_x]
+
+    vmin, vmax = _value_range(data, center_zero)
+    scaled = (data - vmin) * (255.0 / (vmax - vmin))
+    index = np.nan_to_num(scaled, nan=0.0).clip(0, 255).astype(np.uint8)
+
+    rgb = _colormap_lut(cmap_name)[index]
+    return base64.b64encode(encode_png(rgb)).decode('utf-8')
+
+
+# 描画プロセス内で使い回す描画エンジン
+_process_renderer = None
+
+
+def _init_process_renderer(figsize, dpi):
+    """描画プロセスの起動時に描画エンジンを作っておく"""
+    global _process_renderer
+    _process_renderer = HeatmapRenderer(figsize=figsize, dpi=dpi)
+
+
+def _render_in_process(slot_name, data, title, cmap_name, center_zero, x_labels, y_labels):
+    """描画プロセス内でヒートマップを描画する"""
+    if data.size > FAST_RENDER_CELLS:
+        return render_fast(data, cmap_name, center_zero=center_zero)
+    return _process_renderer.render(slot_name, data, title, cmap_name,
+                                    center_zero=center_zero, x_labels=x_labels, y_labels=y_labels)
+
+
+class ParallelHeatmapRenderer:
+    """
+    複数のヒートマップを同時に描画する描画エンジン
+
+    表示枠ごとに専用の描画プロセスを1つ持つ。各プロセスは自分の表示枠の Figure を
+    使い回すので、HeatmapRenderer の再利用の効果を保ったまま枠の数だけ並列に描画できる。
+    """
+
+    def __init__(self, slot_names, figsize=(6, 5), dpi=100):
+        self.slot_names = list(slot_names)
+        self.figsize = figsize
+        self.dpi = dpi
+        self._executors = {}
+        self._lock = threading.Lock()
+
+    def _executor(self, slot_name, restart=False):
+        """表示枠の描画プロセスを返す（なければ起動する）"""
+        with self._lock:
+            executor = self._executors.get(slot_name)
+            if restart and executor is not None:
+                executor.shutdown(wait=False, cancel_futures=True)
+                executor = None
+            if executor is None:
+                ctx = mp.get_context('spawn')  # Windows互換性のため'spawn'を使用
+                executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=ctx,
+                    initializer=_init_process_renderer,
+                    initargs=(self.figsize, self.dpi)
+                )
+                self._executors[slot_name] = executor
+            return executor
+
+    def start(self):
+        """全ての表示枠の描画プロセスを起動しておく"""
+        for slot_name in self.slot_names:
+            self._executor(slot_name).submit(int)
+
+    def submit(self, slot_name, data, title, cmap_name, center_zero=False, x_labels=None, y_labels=None):
+        """
+        ヒートマップの描画を投入する
+
+        Returns:
+        --------
+        concurrent.futures.Future
+            Base64エンコードしたPNG文字列を返すFuture
+        """
+        args = (
+            slot_name,
+            np.asarray(data),
+            title,
+            cmap_name,
+            center_zero,
+            np.asarray(x_labels) if x_labels is not None else None,
+            np.asarray(y_labels) if y_labels is not None else None,
+        )
+        try:
+            return self._executor(slot_name).submit(_render_in_process, *args)
+        except BrokenProcessPool:
+            return self._executor(slot_name, restart=True).submit(_render_in_process, *args)
+
+    def shutdown(self):
+        """全ての描画プロセスを終了する"""
+        with self._lock:
+            executors, self._executors = self._executors, {}
+        for executor in executors.values():
+            executor.shutdown(wait=True, cancel_futures=True)
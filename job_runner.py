@@ -0,0 +1,285 @@
+# job_runner.py
+import concurrent.futures
+import heapq
+import itertools
+import threading
+import time
+import traceback
+from concurrent.futures.process import BrokenProcessPool
+
+from progress import estimate_eta
+
+# ジョブの優先度（値が小さいほど先に実行する）
+PRIORITY_INTERACTIVE = 0  # 「シミュレーション実行」ボタンからの1件
+PRIORITY_SWEEP = 10       # スイープの各点
+
+# 終わったジョブをキュー表示に残す件数
+KEEP_FINISHED_JOBS = 20
+
+
+class SimulationJob:
+    """投入したシミュレーション1件の状態"""
+
+    def __init__(self, job_id, params, priority=PRIORITY_INTERACTIVE, force=False):
+        self.job_id = job_id
+        self.params = params
+        self.priority = priority
+        self.force = force
+        self.status = "queued"  # queued / running / done / failed / cancelled
+        self.percent = 0.0
+        self.phase = "待機中"
+        self.eta = None
+        self.result = None
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = False
+        self.retried = False
+        self.future = None  # ワーカープールに投入した実行のFuture
+        self.callbacks = (None, None, None)  # (on_progress, on_done, on_error)
+
+    @property
+    def finished(self):
+        """終了済み（完了・失敗・キャンセル）かどうか"""
+        return self.status in ("done", "failed", "cancelled")
+
+
+class JobRunner:
+    """
+    シミュレーションを優先度付きのキューに積み、ワーカープールで実行するランナー
+
+    同時に実行するのは max_concurrent 件（省略時はワーカープールのプロセス数）までで、
+    それを超えた分は優先度順（同じ優先度なら投入順）に待たせる。こうすることで
+    ワーカーは常に埋まるが、プールに必要以上のジョブを積み上げない。
+
+    submit() はすぐに戻り、進捗・完了・失敗はコールバックで通知する。
+    コールバックはGUIのイベントスレッドではなくバックグラウンドスレッドから呼ばれる。
+    """
+
+    def __init__(self, worker_pool, max_concurrent=None):
+        self.worker_pool = worker_pool
+        self.max_concurrent = max_concurrent or worker_pool.processes
+        self.jobs = {}
+        self._job_ids = itertools.count(1)
+        self._seq = itertools.count()
+        self._queue = []  # (優先度, 投入順, ジョブ) のヒープ
+        self._running = set()
+        self._listeners = []
+        self._cond = threading.Condition()
+        self._dispatcher = None
+
+    def add_listener(self, listener):
+        """ジョブの状態が変わるたびに listener() を呼ぶ（キュー表示の更新用）"""
+        self._listeners.append(listener)
+
+    def _notify(self):
+        """状態変化をリスナーに通知する"""
+        for listener in self._listeners:
+            try:
+                listener()
+            except Exception:
+                traceback.print_exc()
+
+    def submit(self, params, on_progress=None, on_done=None, on_error=None, force=False,
+               priority=PRIORITY_INTERACTIVE):
+        """
+        シミュレーションをキューに投入する
+
+        Parameters:
+        -----------
+        params : dict
+            シミュレーションパラメータ
+        on_progress : callable, optional
+            on_progress(job) 進捗更新時（job.percent, job.phase, job.eta を参照）
+        on_done : callable, optional
+            on_done(job) 正常終了時（job.result にシミュレーション結果）
+        on_error : callable, optional
+            on_error(job) 失敗またはキャンセル時（job.status が "failed" か "cancelled"、
+            job.error に例外）
+        force : bool
+            Trueの場合は結果キャッシュを使わずに再実行する
+        priority : int
+            PRIORITY_INTERACTIVE または PRIORITY_SWEEP（小さいほど先に実行）
+
+        Returns:
+        --------
+        SimulationJob
+            投入したジョブ
+        """
+        job = SimulationJob(next(self._job_ids), params, priority, force)
+        job.callbacks = (on_progress, on_done, on_error)
+
+        with self._cond:
+            self.jobs[job.job_id] = job
+            heapq.heappush(self._queue, (priority, next(self._seq), job))
+            self._forget_finished()
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+                self._dispatcher.start()
+            self._cond.notify_all()
+
+        self._notify()
+        return job
+
+    def cancel(self, job_id):
+        """
+        ジョブをキャンセルする
+
+        待機中のジョブはキューから外す。実行中のジョブはワーカープールにキャンセルを
+        依頼し（サービスのキューで待っていれば取り消される）、止められなかった場合は
+        終わった時点で結果を捨ててキャンセル扱いにする。
+
+        Returns:
+        --------
+        bool
+            キャンセルを受け付けた場合はTrue（終了済みのジョブはFalse）
+        """
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            job.cancel_requested = True
+            was_queued = job.status == "queued"
+            if was_queued:
+                job.status = "cancelled"
+                job.phase = "キャンセル"
+                job.finished_at = time.time()
+            else:
+                job.phase = "キャンセル待ち（実行中の計算が終わるまで）"
+            future = job.future
+
+        if was_queued:
+            self._call(job, 2)
+        elif future is not None:
+            future.cancel()
+        self._notify()
+        return True
+
+    def active_jobs(self):
+        """
+        キュー表示用のジョブ一覧（実行中 → 待機中（実行順） → 最近終わったもの）
+        """
+        with self._cond:
+            running = sorted(
+                (job for job in self.jobs.values() if job.status == "running"),
+                key=lambda job: job.started_at
+            )
+            queued = [job for _, _, job in sorted(self._queue) if job.status == "queued"]
+            finished = sorted(
+                (job for job in self.jobs.values() if job.finished),
+                key=lambda job: job.finished_at,
+                reverse=True
+            )
+        return running + queued + finished
+
+    def _forget_finished(self):
+        """終わったジョブを古いものから捨てる（ロックを取った状態で呼ぶ）"""
+        finished = sorted(
+            (job for job in self.jobs.values() if job.finished),
+            key=lambda job: job.finished_at
+        )
+        for job in finished[:max(0, len(finished) - KEEP_FINISHED_JOBS)]:
+            del self.jobs[job.job_id]
+
+    def _dispatch(self):
+        """空きがあればキューの先頭のジョブをワーカープールに渡す（専用スレッド）"""
+        while True:
+            with self._cond:
+                while not self._queue or len(self._running) >= self.max_concurrent:
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._queue)
+                if job.status != "queued":
+                    continue  # キャンセル済み
+                job.status = "running"
+                job.phase = "開始"
+                job.started_at = time.time()
+                self._running.add(job.job_id)
+                idle = len(self._running) == 1
+
+            self._notify()
+            try:
+                # 他に実行中のジョブがないときだけ、ワーカーが応答するか確認する
+                # （実行中に確認すると計算の終了待ちをタイムアウトと誤認するため）
+                if idle:
+                    self.worker_pool.health_check()
+                self._start(job)
+            except Exception as ex:
+                self._finish(job, error=ex)
+
+    def _start(self, job):
+        """ジョブをワーカープールに投入する"""
+        def update_progress(percent, phase):
+            job.percent = percent
+            if not job.cancel_requested:
+                job.phase = phase
+            job.eta = estimate_eta(job.started_at, percent)
+            self._call(job, 0)
+            self._notify()
+
+        future = self.worker_pool.submit(
+            job.params, on_progress=update_progress, force=job.force, priority=job.priority
+        )
+        job.future = future
+        future.add_done_callback(lambda f: self._on_future_done(job, f))
+
+    def _on_future_done(self, job, future):
+        """ワーカーでの実行が終わったときの処理（ワーカープールのスレッドから呼ばれる）"""
+        try:
+            result = future.result()
+        except BrokenProcessPool as ex:
+            # ワーカーが異常終了した場合はプールを作り直して1回だけ再実行する
+            if not job.retried and not job.cancel_requested:
+                traceback.print_exc()
+                job.retried = True
+                try:
+                    self.worker_pool.restart()
+                    self._start(job)
+                    return
+                except Exception as restart_ex:
+                    ex = restart_ex
+            self._finish(job, error=ex)
+            return
+        except Exception as ex:
+            self._finish(job, error=ex)
+            return
+
+        if "error" in result:
+            self._finish(job, error=Exception(f"シミュレーション実行中にエラーが発生しました: {result['error']}"))
+        else:
+            self._finish(job, result=result)
+
+    def _finish(self, job, result=None, error=None):
+        """ジョブを終了状態にして空きを作り、コールバックを呼ぶ"""
+        with self._cond:
+            self._running.discard(job.job_id)
+            job.finished_at = time.time()
+            if job.cancel_requested:
+                job.status = "cancelled"
+                job.phase = "キャンセル"
+                job.error = concurrent.futures.CancelledError()
+            elif error is not None:
+                print(f"ジョブ {job.job_id} の実行エラー: {str(error)}")
+                job.status = "failed"
+                job.phase = "失敗"
+                job.error = error
+            else:
+                job.status = "done"
+                job.phase = "完了"
+                job.result = result
+                job.percent = 100.0
+                job.eta = 0.0
+            self._cond.notify_all()
+
+        self._call(job, 1 if job.status == "done" else 2)
+        self._notify()
+
+    def _call(self, job, index):
+        """ジョブのコールバック（0: 進捗, 1: 完了, 2: 失敗・キャンセル）を呼ぶ"""
+        callback = job.callbacks[index]
+        if callback is None:
+            return
+        try:
+            callback(job)
+        except Exception:
+            traceback.print_exc()
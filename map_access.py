@@ -0,0 +1,134 @@
+# map_access.py
+import numpy as np
+
+from map_cache import load_maps_cached
+
+
+def _nearest_indices(coords, targets):
+    """
+    各目標座標に最も近いマップ上のインデックスを返す（マップの範囲外の目標は除く）
+
+    座標は昇順・降順のどちらでもよい。
+    """
+    coords = np.asarray(coords, dtype=np.float64)
+    targets = np.asarray(targets, dtype=np.float64)
+    if len(coords) == 0:
+        return np.array([], dtype=np.intp)
+    if len(coords) == 1:
+        return np.zeros(len(targets), dtype=np.intp)
+
+    order = np.argsort(coords, kind="stable")
+    sorted_coords = coords[order]
+
+    pos = np.clip(np.searchsorted(sorted_coords, targets), 1, len(sorted_coords) - 1)
+    left = sorted_coords[pos - 1]
+    right = sorted_coords[pos]
+    pos = pos - ((targets - left) < (right - targets))
+
+    # 端から半グリッド以上はみ出した目標はマップ外とする
+    half_step = np.min(np.diff(sorted_coords)) / 2
+    inside = (targets >= sorted_coords[0] - half_step) & (targets <= sorted_coords[-1] + half_step)
+    return order[pos[inside]]
+
+
+def _as_selector(indices):
+    """等間隔のインデックスはスライスに変換する（メモリマップをビューのまま切り出せる）"""
+    if len(indices) == 1:
+        return slice(int(indices[0]), int(indices[0]) + 1)
+    steps = np.diff(indices)
+    if len(indices) > 1 and steps[0] != 0 and np.all(steps == steps[0]):
+        start, step = int(indices[0]), int(steps[0])
+        stop = int(indices[-1]) + step
+        return slice(start, stop if stop >= 0 else None, step)
+    return indices
+
+
+def window_indices(x_nm, y_nm, ROI, X0, Y0, X_pitch, Y_pitch, X_num, Y_num):
+    """
+    解析パラメータから読み出す行・列の範囲を計算する
+
+    ROIが "center" の場合はマップ中心から (X0, Y0) ずらした点を中心に、
+    それ以外の場合は (X0, Y0) を始点に、ピッチ間隔で X_num x Y_num 点を取る。
+
+    Returns:
+    --------
+    tuple
+        (行の選択, 列の選択)。スライスまたはインデックス配列
+    """
+    x_nm = np.asarray(x_nm, dtype=np.float64)
+    y_nm = np.asarray(y_nm, dtype=np.float64)
+
+    if str(ROI).strip().lower() == "center":
+        x_start = (x_nm.min() + x_nm.max()) / 2 + X0 - X_pitch * (X_num - 1) / 2
+        y_start = (y_nm.min() + y_nm.max()) / 2 + Y0 - Y_pitch * (Y_num - 1) / 2
+    else:
+        x_start, y_start = X0, Y0
+
+    cols = _in_axis_order(x_nm, _nearest_indices(x_nm, x_start + X_pitch * np.arange(X_num)))
+    rows = _in_axis_order(y_nm, _nearest_indices(y_nm, y_start + Y_pitch * np.arange(Y_num)))
+    return _as_selector(rows), _as_selector(cols)
+
+
+def _in_axis_order(coords, indices):
+    """
+    座標の小さい順に並んだインデックスを、マップの軸と同じ向きに並べ直す
+
+    降順の軸では窓も降順のまま切り出す（昇順に反転しない）。
+    """
+    if len(coords) > 1 and coords[0] > coords[-1]:
+        return indices[::-1]
+    return indices
+
+
+def _read(data, rows, cols):
+    """メモリマップ上の配列から窓の部分だけを読み出す"""
+    if isinstance(rows, slice) and isinstance(cols, slice):
+        return np.array(data[rows, cols])
+    if isinstance(rows, slice):
+        return np.array(data[rows][:, cols])
+    if isinstance(cols, slice):
+        return np.array(data[:, cols][rows])
+    return np.array(data[np.ix_(rows, cols)])
+
+
+def window_maps(maps, ROI, X0, Y0, X_pitch, Y_pitch, X_num, Y_num):
+    """
+    読み込み済みのマップから解析窓の部分だけを切り出す
+
+    窓がマップと重ならない場合（座標がnmでない従来のCSVなど）はマップ全体を返す。
+
+    Returns:
+    --------
+    dict
+        load_maps() と同じ形式で、窓の部分だけを含むマップ
+    """
+    rows, cols = window_indices(maps["x_nm"], maps["y_nm"], ROI, X0, Y0, X_pitch, Y_pitch, X_num, Y_num)
+    x_sel = maps["x_nm"][cols]
+    y_sel = maps["y_nm"][rows]
+    if len(x_sel) == 0 or len(y_sel) == 0:
+        print("警告: 解析窓がマップの範囲外です。マップ全体を使用します。")
+        return maps
+
+    window = {"x_nm": np.array(x_sel), "y_nm": np.array(y_sel)}
+    for name in ("CD", "position", "LER"):
+        window[name] = _read(maps[name], rows, cols) if maps[name] is not None else None
+    print(f"解析窓: {len(maps['y_nm'])}x{len(maps['x_nm'])} -> {len(y_sel)}x{len(x_sel)}")
+    return window
+
+
+def load_window(date_dir, ROI, X0, Y0, X_pitch, Y_pitch, X_num, Y_num):
+    """
+    実行のマップから解析窓の部分だけを読み出す
+
+    maps.arrow はメモリマップで開くので、ディスクから読むのは窓に含まれる部分だけになる。
+    最近読み込んだ実行のマップはキャッシュから取り出す。
+
+    Returns:
+    --------
+    dict or None
+        load_maps() と同じ形式で、窓の部分だけを含むマップ。マップがない場合はNone
+    """
+    maps = load_maps_cached(date_dir)
+    if maps is None:
+        return None
+    return window_maps(maps, ROI, X0, Y0, X_pitch, Y_pitch, X_num, Y_num)
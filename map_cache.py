@@ -0,0 +1,162 @@
+# map_cache.py
+import os
+import threading
+from collections import OrderedDict
+
+from map_store import LEGACY_CSV_NAME, MAP_STORE_NAME, load_maps, output_dir
+from run_catalog import DATA_DIR
+
+# キャッシュに保持するマップの合計サイズの上限（バイト）
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+
+def _maps_nbytes(maps):
+    """マップ1実行分の配列の合計サイズ（バイト）"""
+    return sum(value.nbytes for value in maps.values() if value is not None)
+
+
+def source_key(date_dir, data_dir=DATA_DIR):
+    """
+    実行のマップを読み込む元のファイルを識別するキーを返す
+
+    load_maps() と同じ順（maps.arrow → 実行内のCSV → カレントディレクトリのCSV）で探し、
+    (パス, 更新時刻, サイズ) を返す。ファイルが書き換えられるとキーも変わる。
+
+    Returns:
+    --------
+    tuple or None
+        マップのファイルがない場合はNone
+    """
+    run_output_dir = output_dir(date_dir, data_dir)
+    candidates = (
+        os.path.join(run_output_dir, MAP_STORE_NAME),
+        os.path.join(run_output_dir, LEGACY_CSV_NAME),
+        LEGACY_CSV_NAME,
+    )
+    for path in candidates:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        return (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    return None
+
+
+class MapCache:
+    """
+    読み込んだマップを実行ディレクトリ名とファイルの更新時刻で覚えておくLRUキャッシュ
+
+    検索結果から解析画面へ何度も切り替えても、最近見た実行はディスクから読み直さない。
+    保持するマップの合計サイズが上限を超えたら、最も長く使われていないものから捨てる。
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (date_dir, data_dir) -> (ソースのキー, マップ, サイズ)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _remove(self, key):
+        """エントリを1件取り除く（ロックを取った状態で呼ぶ）"""
+        _, _, nbytes = self._entries.pop(key)
+        self._total_bytes -= nbytes
+
+    def _evict(self):
+        """合計サイズが上限に収まるまで古いエントリを捨てる（ロックを取った状態で呼ぶ）"""
+        while self._entries and self._total_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def get(self, date_dir, data_dir=DATA_DIR):
+        """
+        実行のマップを返す（キャッシュにない、またはファイルが更新されていれば読み込む）
+
+        Returns:
+        --------
+        dict or None
+            load_maps() と同じ形式のマップ。マップがない場合はNone
+        """
+        key = (date_dir, data_dir)
+        source = source_key(date_dir, data_dir)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and source is not None and entry[0] == source:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            if entry is not None:
+                self._remove(key)
+
+        maps = load_maps(date_dir, data_dir)
+        if maps is None:
+            return None
+
+        # CSVからmaps.arrowに変換された場合に備えて、読み込み後のファイルで覚える
+        source = source_key(date_dir, data_dir)
+        nbytes = _maps_nbytes(maps)
+        if source is None or nbytes > self.max_bytes:
+            return maps
+
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (source, maps, nbytes)
+            self._total_bytes += nbytes
+            self._evict()
+        return maps
+
+    def invalidate(self, date_dir, data_dir=DATA_DIR):
+        """実行のマップをキャッシュから取り除く"""
+        with self._lock:
+            if (date_dir, data_dir) in self._entries:
+                self._remove((date_dir, data_dir))
+
+    def clear(self):
+        """キャッシュを空にする"""
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def stats(self):
+        """
+        キャッシュの利用状況を返す
+
+        Returns:
+        --------
+        dict
+            hits, misses, evictions, hit_rate, entries, bytes, max_bytes
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+# プロセス全体で共有するキャッシュ
+_map_cache = None
+_map_cache_lock = threading.Lock()
+
+
+def get_map_cache():
+    """プロセス全体で共有するマップキャッシュを返す"""
+    global _map_cache
+    with _map_cache_lock:
+        if _map_cache is None:
+            _map_cache = MapCache()
+        return _map_cache
+
+
+def load_maps_cached(date_dir, data_dir=DATA_DIR):
+    """load_maps() のキャッシュ付き版"""
+    return get_map_cache().get(date_dir, data_dir)
@@ -0,0 +1,166 @@
+# map_pyramid.py
+import os
+import warnings
+
+import numpy as np
+
+from map_cache import load_maps_cached
+from map_store import output_dir
+from run_catalog import DATA_DIR
+
+# タイルの一辺 [セル]
+TILE_SIZE = 256
+
+# 各レベルで保存する集約値
+STATS = ("min", "max", "mean")
+
+# ピラミッドの保存先（実行の出力ディレクトリ内）
+PYRAMID_DIR_NAME = "pyramid"
+
+
+def pyramid_dir(date_dir, name, data_dir=DATA_DIR):
+    """マップのピラミッドを保存するディレクトリ"""
+    return os.path.join(output_dir(date_dir, data_dir), PYRAMID_DIR_NAME, name)
+
+
+def _level_path(directory, level, stat):
+    """レベル・集約値ごとのファイルパス"""
+    return os.path.join(directory, f"L{level}_{stat}.npy")
+
+
+def _pad_even(data, fill):
+    """行・列を偶数にそろえる（はみ出した分は fill で埋める）"""
+    rows, cols = data.shape
+    pad_rows, pad_cols = rows % 2, cols % 2
+    if not pad_rows and not pad_cols:
+        return data
+    return np.pad(data, ((0, pad_rows), (0, pad_cols)), constant_values=fill)
+
+
+def _blocks(data):
+    """2x2のブロックに分けた4次元配列にする"""
+    rows, cols = data.shape
+    return data.reshape(rows // 2, 2, cols // 2, 2)
+
+
+def _downsample(min_map, max_map, mean_map, count_map):
+    """1つ上のレベル（縦横1/2）の min / max / mean / 有効セル数を計算する"""
+    min_blocks = _blocks(_pad_even(min_map, np.nan))
+    max_blocks = _blocks(_pad_even(max_map, np.nan))
+    count_blocks = _blocks(_pad_even(count_map, 0))
+    sum_blocks = _blocks(_pad_even(np.nan_to_num(mean_map) * count_map, 0.0))
+
+    with warnings.catch_warnings():
+        # 全てNaNのブロック（端のはみ出し部分）は警告を出さずにNaNにする
+        warnings.simplefilter("ignore", RuntimeWarning)
+        new_min = np.nanmin(min_blocks, axis=(1, 3))
+        new_max = np.nanmax(max_blocks, axis=(1, 3))
+
+    new_count = count_blocks.sum(axis=(1, 3))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        new_mean = np.where(new_count > 0, sum_blocks.sum(axis=(1, 3)) / new_count, np.nan)
+    return new_min, new_max, new_mean, new_count
+
+
+def build_pyramid(date_dir, name, data, data_dir=DATA_DIR, tile_size=TILE_SIZE):
+    """
+    マップの縮小画像のピラミッドを作成して実行ディレクトリに保存する
+
+    レベルkは元のマップを 2^k x 2^k セルごとに集約したもので、min / max / mean を
+    それぞれ .npy で保存する。1タイルに収まるレベルまで作成する（レベル0は元のマップ）。
+    以前により大きなマップで作ったレベルのファイルが残っていれば先に削除する。
+
+    Returns:
+    --------
+    int
+        作成した最大のレベル
+    """
+    directory = pyramid_dir(date_dir, name, data_dir)
+    os.makedirs(directory, exist_ok=True)
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.startswith("L") and entry.name.endswith(".npy"):
+                os.remove(entry.path)
+
+    data = np.asarray(data, dtype=np.float64)
+    min_map = max_map = mean_map = data
+    count_map = np.isfinite(data).astype(np.int64)
+
+    level = 0
+    while max(min_map.shape) > tile_size:
+        min_map, max_map, mean_map, count_map = _downsample(min_map, max_map, mean_map, count_map)
+        level += 1
+        for stat, values in zip(STATS, (min_map, max_map, mean_map)):
+            path = _level_path(directory, level, stat)
+            tmp_path = path + ".tmp.npy"
+            np.save(tmp_path, values)
+            os.replace(tmp_path, path)
+
+    return level
+
+
+class MapPyramid:
+    """
+    保存済みのピラミッドから、表示範囲に必要なタイルだけを読み出す
+
+    各レベルのファイルはメモリマップで開くので、読み込まれるのは表示するタイルの部分だけになる。
+    """
+
+    def __init__(self, date_dir, name, data_dir=DATA_DIR):
+        self.date_dir = date_dir
+        self.name = name
+        self.data_dir = data_dir
+        self.directory = pyramid_dir(date_dir, name, data_dir)
+        self._levels = {}
+
+        maps = load_maps_cached(date_dir, data_dir)
+        if maps is None or maps.get(name) is None:
+            raise FileNotFoundError(f"{date_dir} に {name} マップがありません")
+        self._base = maps[name]
+
+        self.max_level = 0
+        while os.path.exists(_level_path(self.directory, self.max_level + 1, "mean")):
+            self.max_level += 1
+
+    @property
+    def shape(self):
+        """レベル0（元のマップ）のサイズ"""
+        return self._base.shape
+
+    def level_data(self, level, stat="mean"):
+        """レベルの配列（メモリマップ）を返す"""
+        if level == 0:
+            return self._base
+        key = (level, stat)
+        if key not in self._levels:
+            self._levels[key] = np.load(_level_path(self.directory, level, stat), mmap_mode="r")
+        return self._levels[key]
+
+    def level_for_view(self, view_rows, view_cols, max_pixels):
+        """
+        表示範囲（レベル0のセル数）を max_pixels 程度の画素で表示するのに十分なレベルを選ぶ
+        """
+        level = 0
+        while level < self.max_level and max(view_rows, view_cols) / 2 ** (level + 1) >= max_pixels:
+            level += 1
+        return level
+
+    def read_view(self, row0, row1, col0, col1, max_pixels=600, stat="mean"):
+        """
+        表示範囲（レベル0の行・列の範囲）を適切なレベルで読み出す
+
+        Returns:
+        --------
+        tuple
+            (レベル, 配列)。配列の1セルはレベル0の 2^level x 2^level セルに対応する
+        """
+        level = self.level_for_view(row1 - row0, col1 - col0, max_pixels)
+        scale = 2 ** level
+        data = self.level_data(level, stat)
+        return level, np.array(data[row0 // scale:-(-row1 // scale), col0 // scale:-(-col1 // scale)])
+
+    def read_tile(self, level, tile_row, tile_col, stat="mean", tile_size=TILE_SIZE):
+        """指定レベルの1タイルを読み出す"""
+        data = self.level_data(level, stat)
+        return np.array(data[tile_row * tile_size:(tile_row + 1) * tile_size,
+                             tile_col * tile_size:(tile_col + 1) * tile_size])
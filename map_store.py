@@ -0,0 +1,170 @@
+# map_store.py
+import os
+import re
+import traceback
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:
+    # pyarrowがない環境では従来のCSVのみ読み込む
+    pa = None
+
+from run_catalog import DATA_DIR
+
+# 実行ごとのマップ保存ファイル（Arrow IPC、非圧縮なのでメモリマップで読める）
+MAP_STORE_NAME = "maps.arrow"
+
+# 従来形式のCDマップ
+LEGACY_CSV_NAME = "CD_map.csv"
+
+# 保存するマップ名と列名
+MAP_COLUMNS = {"CD": "cd", "position": "position", "LER": "ler"}
+
+
+def output_dir(date_dir, data_dir=DATA_DIR):
+    """実行ディレクトリ名から出力ディレクトリのパスを返す"""
+    return os.path.join(data_dir, date_dir, "data", "output")
+
+
+def save_maps(date_dir, x_nm, y_nm, maps, data_dir=DATA_DIR):
+    """
+    マップを実行の出力ディレクトリにArrow IPC形式で保存する
+
+    各セルを1行とし、x_nm, y_nm と各マップの値を列として持つ（行優先の並び）。
+
+    Parameters:
+    -----------
+    date_dir : str
+        実行ディレクトリ名
+    x_nm : array-like
+        列方向の座標 [nm]（長さ = 列数）
+    y_nm : array-like
+        行方向の座標 [nm]（長さ = 行数）
+    maps : dict
+        "CD" / "position" / "LER" -> 2次元配列（行数 x 列数）。ないマップは省略可
+    """
+    if pa is None:
+        raise ImportError("マップの保存にはpyarrowが必要です")
+
+    x_nm = np.asarray(x_nm, dtype=np.float64)
+    y_nm = np.asarray(y_nm, dtype=np.float64)
+    rows, cols = len(y_nm), len(x_nm)
+
+    columns = {
+        "x_nm": np.tile(x_nm, rows),
+        "y_nm": np.repeat(y_nm, cols),
+    }
+    for name, column in MAP_COLUMNS.items():
+        if maps.get(name) is not None:
+            data = np.asarray(maps[name], dtype=np.float64)
+            if data.shape != (rows, cols):
+                raise ValueError(f"{name}マップのサイズが座標と一致しません: {data.shape} != {(rows, cols)}")
+            columns[column] = data.ravel()
+
+    table = pa.table(columns).replace_schema_metadata({"rows": str(rows), "cols": str(cols)})
+
+    path = os.path.join(output_dir(date_dir, data_dir), MAP_STORE_NAME)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with pa.OSFile(tmp_path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(tmp_path, path)
+
+    # 1タイルに収まらない大きなマップは表示用のピラミッドも作成する
+    from map_pyramid import TILE_SIZE, build_pyramid
+    if max(rows, cols) > TILE_SIZE:
+        for name in MAP_COLUMNS:
+            if maps.get(name) is not None:
+                build_pyramid(date_dir, name, maps[name], data_dir)
+
+    return path
+
+
+def _load_store(path):
+    """Arrow IPCファイルをメモリマップで開き、2次元配列に戻す"""
+    with pa.memory_map(path, "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+
+    metadata = table.schema.metadata or {}
+    rows = int(metadata[b"rows"])
+    cols = int(metadata[b"cols"])
+
+    def column(name):
+        # 非圧縮・null無しなのでコピーせずにnumpy配列として参照できる
+        return table.column(name).chunk(0).to_numpy(zero_copy_only=True)
+
+    maps = {
+        "x_nm": column("x_nm")[:cols],
+        "y_nm": column("y_nm")[::cols],
+    }
+    for name, col in MAP_COLUMNS.items():
+        maps[name] = column(col).reshape(rows, cols) if col in table.column_names else None
+    return maps
+
+
+def _label_to_number(labels):
+    """"X12" や "Y3" のようなラベルから数値を取り出す（取り出せない場合は位置を使う）"""
+    values = []
+    for i, label in enumerate(labels):
+        match = re.search(r"-?\d+(\.\d+)?", str(label))
+        values.append(float(match.group()) if match else float(i))
+    return np.array(values, dtype=np.float64)
+
+
+def _load_legacy_csv(path):
+    """従来形式の CD_map.csv を読み込む"""
+    df = pd.read_csv(path, index_col=0)
+    return {
+        "x_nm": _label_to_number(df.columns),
+        "y_nm": _label_to_number(df.index),
+        "CD": df.values.astype(np.float64),
+        "position": None,
+        "LER": None,
+    }
+
+
+def load_maps(date_dir, data_dir=DATA_DIR):
+    """
+    実行のマップを読み込む
+
+    maps.arrow があればメモリマップで読み込む。ない場合（従来の実行）は
+    CD_map.csv を読み込み、次回以降のために maps.arrow に変換して保存する。
+
+    Returns:
+    --------
+    dict or None
+        "x_nm", "y_nm"（1次元の座標 [nm]）と "CD", "position", "LER"（2次元配列、
+        保存されていないマップはNone）。マップがない場合はNone
+    """
+    run_output_dir = output_dir(date_dir, data_dir)
+
+    store_path = os.path.join(run_output_dir, MAP_STORE_NAME)
+    if pa is not None and os.path.exists(store_path):
+        return _load_store(store_path)
+
+    # 従来形式（実行ディレクトリ内、なければカレントディレクトリのCSV）
+    run_csv_path = os.path.join(run_output_dir, LEGACY_CSV_NAME)
+    for csv_path in (run_csv_path, LEGACY_CSV_NAME):
+        if os.path.exists(csv_path):
+            print(f"CSVファイルを読み込み中: {csv_path}")
+            maps = _load_legacy_csv(csv_path)
+            # 実行ディレクトリ内のCSVだけをその実行のマップとして変換する
+            if pa is not None and csv_path == run_csv_path:
+                try:
+                    save_maps(date_dir, maps["x_nm"], maps["y_nm"], maps, data_dir)
+                except Exception as ex:
+                    print(f"マップの変換保存エラー: {str(ex)}")
+                    traceback.print_exc()
+            return maps
+
+    return None
+
+
+def map_to_dataframe(maps, name):
+    """読み込んだマップを座標[nm]を行・列ラベルに持つデータフレームにする"""
+    return pd.DataFrame(data=maps[name], index=maps["y_nm"], columns=maps["x_nm"])
@@ -1,198 +1,23 @@
 import flet as ft
-import pandas as pd
-import numpy as np
 import matplotlib
 matplotlib.use('Agg')  # GUIを使わないバックエンドを設定
-import matplotlib.pyplot as plt
-import base64
-import io
-import json
-import os
-import datetime
-import glob
+import threading
 import traceback
-import multiprocessing as mp
-import time
+import concurrent.futures
 
-# 別プロセスで実行するシミュレーション関数
-def run_simulation_in_process(params):
-    """
-    別プロセスでシミュレーションを実行する関数
-    simulation.pyをここでインポートして実行する
-
-    Parameters:
-    -----------
-    params : dict
-        シミュレーションパラメータ
-
-    Returns:
-    --------
-    dict
-        シミュレーション結果
-    """
-    try:
-        print("別プロセスでシミュレーション開始...")
-        
-        # simulation.pyをインポートする
-        # 注意: この行は実際のsimulation.pyがある場合にコメントアウトを外す
-        # import simulation
-        
-        # シミュレーション結果を保存するディレクトリを作成
-        date_str = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
-        data_dir = os.path.join("..", "data", date_str)
-        input_dir = os.path.join(data_dir, "data", "input")
-        output_dir = os.path.join(data_dir, "data", "output")
-        
-        os.makedirs(input_dir, exist_ok=True)
-        os.makedirs(output_dir, exist_ok=True)
-        
-        # 入力パラメータをJSONとして保存
-        with open(os.path.join(input_dir, "input.json"), "w") as f:
-            json.dump(params, f, indent=4)
-            
-        # 実際のシミュレーション呼び出し（コメントアウトを外す）
-        # result = simulation.simulation(params)
-        
-        # テスト用のダミー結果（実際のシミュレーションの代わり）
-        # 実際の実装では削除又はコメントアウトする
-        print("シミュレーション実行中（テスト用ダミー処理）...")
-        time.sleep(3)  # シミュレーション時間のシミュレーション
-        
-        # テスト用の出力データを生成
-        beam_energy = float(params.get("beam_energy", 50))
-        beam_current = float(params.get("beam_current", 10))
-        beam_size = float(params.get("beam_size", 20))
-        resist_thickness = float(params.get("resist_thickness", 300))
-        pattern_width = float(params.get("pattern_width", 100))
-        
-        # テスト用のシミュレーション結果データ
-        sim_result = {
-            "exposure_time": beam_current * resist_thickness / (beam_energy * 1000),  # 単位: ms
-            "development_depth": resist_thickness * 0.9,  # 単位: nm
-            "pattern_width_actual": pattern_width * (1 + 0.05 * (beam_size / 20 - 1)),  # 単位: nm
-            "beam_spot_profile": [beam_size * 0.5, beam_size, beam_size * 1.5]  # 単位: nm
-        }
-        
-        # シミュレーション結果をJSONとして保存
-        with open(os.path.join(output_dir, "output.json"), "w") as f:
-            json.dump(sim_result, f, indent=4)
-            
-        result = {
-            "date_dir": date_str,
-            "params": params,
-            "sim_result": sim_result
-        }
-        
-        print("シミュレーション完了、結果を返します")
-        return result
-        
-    except Exception as e:
-        print(f"シミュレーション実行中のエラー: {str(e)}")
-        traceback.print_exc()
-        return {"error": str(e), "traceback": traceback.format_exc()}
-
-# 解析実行関数
-def Analyze(date_dir, params, ROI, X0, Y0, X_pitch, Y_pitch, X_num, Y_num):
-    """
-    解析を実行し、データフレームを返す
-    
-    Returns:
-    --------
-    CD_df : pd.DataFrame
-        臨界寸法マップのデータフレーム
-    pos_df : pd.DataFrame
-        位置ずれマップのデータフレーム
-    LER_df : pd.DataFrame
-        Line Edge Roughnessマップのデータフレーム
-    """
-    print(f"解析パラメータ: ROI={ROI}, X0={X0}, Y0={Y0}, X_pitch={X_pitch}, Y_pitch={Y_pitch}, X_num={X_num}, Y_num={Y_num}")
-    
-    try:
-        # CSVファイルが存在するかチェック
-        csv_path = "CD_map.csv"
-        if not os.path.exists(csv_path):
-            # ファイルが見つからない場合はテストデータを生成
-            print(f"警告: {csv_path} が見つかりません。テストデータを生成します。")
-            # テスト用のデータフレーム生成
-            fixed_size = 20
-            
-            # インデックスと列名を生成（実際の値を想定）
-            y_indices = [f"Y{i}" for i in range(fixed_size)]
-            # X軸は降順
-            x_columns = [f"X{fixed_size - i - 1}" for i in range(fixed_size)]
-            
-            # CDマップのデータフレーム
-            cd_data = np.zeros((fixed_size, fixed_size))
-            base_cd = float(params.get("pattern_width", 100))
-            
-            for i in range(fixed_size):
-                for j in range(fixed_size):
-                    dist_from_center = np.sqrt(((i - fixed_size/2)/(fixed_size/2))**2 + ((j - fixed_size/2)/(fixed_size/2))**2)
-                    cd_value = base_cd * (1 - 0.2 * dist_from_center) + np.random.normal(0, base_cd * 0.03)
-                    wave_pattern = 5.0 * np.sin(i/2) * np.cos(j/2)
-                    cd_data[i, j] = cd_value + wave_pattern
-            
-            CD_df = pd.DataFrame(data=cd_data, index=y_indices, columns=x_columns)
-            
-            # 位置ずれマップのデータフレーム
-            pos_data = np.random.normal(0, 5, (fixed_size, fixed_size))
-            pos_df = pd.DataFrame(data=pos_data, index=y_indices, columns=x_columns)
-            
-            # LERマップのデータフレーム
-            ler_data = np.random.normal(3, 0.5, (fixed_size, fixed_size))
-            LER_df = pd.DataFrame(data=ler_data, index=y_indices, columns=x_columns)
-            
-        else:
-            # CSVファイルの読み込み
-            print(f"CSVファイルを読み込み中: {csv_path}")
-            CD_df = pd.read_csv(csv_path, index_col=0)
-            print(f"読み込み完了: {CD_df.shape}")
-            
-            # テスト用の他のマップも生成（同じインデックスと列名を使用）
-            pos_df = pd.DataFrame(
-                data=np.random.normal(0, 5, CD_df.shape),
-                index=CD_df.index,
-                columns=CD_df.columns
-            )
-            
-            LER_df = pd.DataFrame(
-                data=np.random.normal(3, 0.5, CD_df.shape),
-                index=CD_df.index,
-                columns=CD_df.columns
-            )
-            
-            # データの詳細を出力
-            print(f"データの範囲: min={CD_df.values.min()}, max={CD_df.values.max()}")
-            print(f"インデックス: {CD_df.index.tolist()}")
-            print(f"列名: {CD_df.columns.tolist()}")
-            
-    except Exception as e:
-        print(f"CSVファイル読み込みエラー: {str(e)}")
-        traceback.print_exc()
-        # エラー時はテストデータを返す
-        fixed_size = 20
-        y_indices = [f"Y{i}" for i in range(fixed_size)]
-        x_columns = [f"X{fixed_size - i - 1}" for i in range(fixed_size)]
-        
-        CD_df = pd.DataFrame(
-            data=np.random.normal(100, 10, (fixed_size, fixed_size)),
-            index=y_indices,
-            columns=x_columns
-        )
-        
-        pos_df = pd.DataFrame(
-            data=np.random.normal(0, 5, (fixed_size, fixed_size)),
-            index=y_indices,
-            columns=x_columns
-        )
-        
-        LER_df = pd.DataFrame(
-            data=np.random.normal(3, 0.5, (fixed_size, fixed_size)),
-            index=y_indices,
-            columns=x_columns
-        )
-    
-    return CD_df, pos_df, LER_df
+from analysis_pipeline import AnalysisPipeline
+from heatmap_renderer import FAST_RENDER_CELLS, ParallelHeatmapRenderer
+from job_runner import PRIORITY_SWEEP, JobRunner
+from map_pyramid import MapPyramid
+from progress import format_eta
+from result_selection import ResultSelection
+from run_catalog import RunCatalog
+from run_neighbors import NEIGHBOR_COUNT, get_neighbor_index
+from run_query import RunQuery
+from search_pager import SearchResultPager
+from simulation_service import connect_worker_pool
+from surrogate_model import get_surrogate
+from sweep import expand_sweep, is_sweep_value
 
 class PhotomaskApp:
     def __init__(self):
@@ -209,11 +34,43 @@ class PhotomaskApp:
         # アプリケーションの状態
         self.current_view = "input"  # 現在の画面
         self.simulation_result = None  # シミュレーション結果
-        self.search_results = []  # 検索結果
-        self.selected_result = None  # 選択された検索結果
+        self.search_pager = None  # 検索結果（1ページずつ取り出す）
+        self.result_selection = ResultSelection()  # 検索結果の選択状態
+        self.result_checkboxes = {}  # 表示中のページのチェックボックス（実行ディレクトリ名 -> Checkbox）
         
-        # プログレス表示用
+        # プログレス表示用（シミュレーションの進捗）
         self.progress_bar = ft.ProgressBar()
+        self.progress_text = ft.Text("", size=12)
+        self.progress_view = ft.Container(
+            ft.Column([self.progress_bar, self.progress_text], spacing=5),
+            bgcolor=ft.colors.WHITE,
+            padding=10
+        )
+        
+        # 検索・予測・解析の処理中表示（シミュレーションの進捗表示とは別に出し入れする）
+        self.busy_indicator = ft.ProgressBar()
+        self._busy_count = 0
+        self._busy_lock = threading.Lock()
+        
+        # シミュレーション用ワーカープール（起動時に一度だけ作成して使い回す）
+        # SIMULATION_SERVICE_URL が設定されていれば共有のシミュレーションサービスを使う
+        self.worker_pool = connect_worker_pool()
+        
+        # シミュレーションを優先度付きキューで実行するランナー（同時実行数はワーカー数まで）
+        self.job_runner = JobRunner(self.worker_pool)
+        self.job_runner.add_listener(self._refresh_queue_view)
+        self.queue_view = ft.Column(spacing=2)
+        
+        # ヒートマップ描画エンジン（マップごとの描画プロセスでFigureを使い回す）
+        self.heatmap_renderer = ParallelHeatmapRenderer(
+            ["CD Map [nm]", "Position Map [nm]", "LER Map [nm]"],
+            figsize=(6, 5),
+            dpi=100
+        )
+        self.heatmap_renderer.start()
+        
+        # 解析パイプライン（変わった解析パラメータに依存する段階だけを再計算する）
+        self.analysis_pipeline = AnalysisPipeline(self.heatmap_renderer)
         
         # パラメータの定義（15項目）
         self.param_fields = {
@@ -230,25 +87,33 @@ class PhotomaskApp:
             "pattern_pitch_y": ft.TextField(label="パターンピッチY [nm]", value="200"),
             "pattern_array_x": ft.TextField(label="パターン配列X", value="10"),
             "pattern_array_y": ft.TextField(label="パターン配列Y", value="10"),
-            "substrate_material": ft.Dropdown(
+            # 文字列のパラメータも検索では Si,Cr（いずれか）や Si*（ワイルドカード）を書けるよう入力欄にする
+            "substrate_material": ft.TextField(
                 label="基板材料",
-                options=[
-                    ft.dropdown.Option("Si"),
-                    ft.dropdown.Option("SiO2"),
-                    ft.dropdown.Option("Cr"),
-                ],
-                value="Si"
+                value="Si",
+                tooltip="Si / SiO2 / Cr（検索では Si,Cr や Si* も可）"
             ),
-            "resist_type": ft.Dropdown(
+            "resist_type": ft.TextField(
                 label="レジストタイプ",
-                options=[
-                    ft.dropdown.Option("ポジティブ"),
-                    ft.dropdown.Option("ネガティブ"),
-                ],
-                value="ポジティブ"
+                value="ポジティブ",
+                tooltip="ポジティブ / ネガティブ（検索では ポジ* なども可）"
             ),
         }
         
+        # 検索結果の並べ替え（パラメータの値の順、既定は実行順）
+        self.sort_dropdown = ft.Dropdown(
+            label="検索結果の並べ替え",
+            options=[ft.dropdown.Option("", "実行日時")] + [
+                ft.dropdown.Option(name) for name in self.param_fields.keys()
+            ],
+            value="",
+            width=220
+        )
+        self.sort_descending_checkbox = ft.Checkbox(label="降順", value=False)
+        
+        # 同じパラメータの過去の結果を使わずに再実行するかどうか
+        self.force_rerun_checkbox = ft.Checkbox(label="キャッシュを使わず再実行", value=False)
+        
         # 解析パラメータの定義
         self.analysis_fields = {
             "ROI": ft.TextField(label="ROI", value="center"),
@@ -285,12 +150,26 @@ class PhotomaskApp:
             on_click=self.run_simulation
         )
         
+        btn_sweep = ft.ElevatedButton(
+            text="スイープ実行",
+            icon=ft.icons.GRID_ON,
+            tooltip="値に 開始:終了:刻み または a,b,c を入力したパラメータを全組み合わせで実行",
+            on_click=self.run_sweep_simulation
+        )
+        
         btn_search = ft.ElevatedButton(
             text="過去の結果を検索",
             icon=ft.icons.SEARCH,
             on_click=self.search_results_handler
         )
         
+        btn_predict = ft.ElevatedButton(
+            text="結果を予測",
+            icon=ft.icons.INSIGHTS,
+            tooltip="過去の実行から学習した代理モデルで、シミュレーションせずに結果を予測",
+            on_click=self.predict_results_handler
+        )
+        
         # レイアウト
         content = ft.Column(
             controls=[
@@ -299,10 +178,22 @@ class PhotomaskApp:
                 *param_rows,
                 ft.Divider(),
                 ft.Row(
-                    [btn_simulate, btn_search],
+                    [btn_simulate, btn_sweep, btn_search, btn_predict, self.force_rerun_checkbox],
                     alignment=ft.MainAxisAlignment.CENTER,
                     spacing=20
-                )
+                ),
+                ft.Row(
+                    [
+                        ft.Text("検索条件: 40..60（範囲）, >=40, 50±2（許容差）, Si,Cr（いずれか）, Si*（ワイルドカード）", size=12),
+                        self.sort_dropdown,
+                        self.sort_descending_checkbox
+                    ],
+                    alignment=ft.MainAxisAlignment.CENTER,
+                    spacing=20
+                ),
+                ft.Divider(),
+                ft.Text("ジョブキュー", size=18, weight=ft.FontWeight.BOLD),
+                self.queue_view
             ],
             spacing=10,
             scroll=ft.ScrollMode.AUTO,
@@ -312,61 +203,205 @@ class PhotomaskApp:
         # 画面表示
         self.page.controls.clear()
         self.page.add(content)
+        self._refresh_queue_view()
         self.page.update()
         
+    def _refresh_queue_view(self):
+        """ジョブキューの表示を更新する（バックグラウンドスレッドからも呼ばれる）"""
+        status_labels = {
+            "queued": "待機中",
+            "running": "実行中",
+            "done": "完了",
+            "failed": "失敗",
+            "cancelled": "キャンセル",
+        }
+        rows = []
+        for job in self.job_runner.active_jobs():
+            kind = "スイープ" if job.priority == PRIORITY_SWEEP else "単発"
+            text = f"#{job.job_id} [{kind}] {status_labels[job.status]}"
+            if job.status == "running":
+                text += f" {job.percent:.0f}% {job.phase} {format_eta(job.eta)}"
+            rows.append(ft.Row(
+                [
+                    ft.Text(text, size=12, expand=True),
+                    ft.IconButton(
+                        icon=ft.icons.CANCEL,
+                        tooltip="キャンセル",
+                        disabled=job.finished or job.cancel_requested,
+                        on_click=lambda _, job_id=job.job_id: self.job_runner.cancel(job_id)
+                    ),
+                ],
+                spacing=5
+            ))
+        if not rows:
+            rows.append(ft.Text("実行中・待機中のジョブはありません", size=12))
+        self.queue_view.controls = rows
+        if self.current_view == "input":
+            self.page.update()
+        
+    def _show_busy(self):
+        """処理中表示を出す（_hide_busy() と対にして呼ぶ）"""
+        with self._busy_lock:
+            self._busy_count += 1
+            if self.busy_indicator not in self.page.overlay:
+                self.page.overlay.append(self.busy_indicator)
+        
+    def _hide_busy(self):
+        """処理中表示を消す（他の処理中表示が残っていれば消さない）"""
+        with self._busy_lock:
+            self._busy_count = max(self._busy_count - 1, 0)
+            if self._busy_count == 0 and self.busy_indicator in self.page.overlay:
+                self.page.overlay.remove(self.busy_indicator)
+        
+    def _hide_simulation_progress(self):
+        """シミュレーションの進捗表示を消す（実行中・待機中のジョブが残っていれば消さない）"""
+        if any(not job.finished and job.priority != PRIORITY_SWEEP for job in self.job_runner.active_jobs()):
+            return
+        if self.progress_view in self.page.overlay:
+            self.page.overlay.remove(self.progress_view)
+        self.progress_bar.value = None
+        
     def run_simulation(self, e):
-        """シミュレーションを実行する - マルチプロセス版"""
+        """シミュレーションを実行する - バックグラウンド実行版（すぐに戻る）"""
         try:
             # パラメータの取得
             params = {}
             for name, field in self.param_fields.items():
                 params[name] = field.value
                 
-            # プログレスバー表示 - 新しいoverlay APIを使用
-            self.page.overlay.append(self.progress_bar)
+            # プログレスバー表示（進捗率・フェーズ・残り時間）
+            self.progress_bar.value = 0
+            self.progress_text.value = "シミュレーションを開始しています..."
+            if self.progress_view not in self.page.overlay:
+                self.page.overlay.append(self.progress_view)
             self.page.update()
             
-            # マルチプロセスプールの作成
-            ctx = mp.get_context('spawn')  # Windows互換性のため'spawn'を使用
-            
-            # 別プロセスでシミュレーション実行
-            with ctx.Pool(processes=1) as pool:
-                result = pool.apply(run_simulation_in_process, (params,))
-                
-                # エラーチェック
-                if "error" in result:
-                    raise Exception(f"シミュレーション実行中にエラーが発生しました: {result['error']}")
-                
-                self.simulation_result = result
-            
-            # プログレスバーを非表示
-            self.page.overlay.clear()
-            
-            # 解析画面に移動
-            self.show_analysis_view()
+            # ワーカープールでバックグラウンド実行
+            self.job_runner.submit(
+                params,
+                on_progress=self._on_simulation_progress,
+                on_done=self._simulation_completed,
+                on_error=self._simulation_failed,
+                force=self.force_rerun_checkbox.value
+            )
             
         except Exception as ex:
             print(f"シミュレーション実行エラー: {str(ex)}")
             traceback.print_exc()
-            
-            # プログレスバーを非表示
-            self.page.overlay.clear()
-            
-            # エラーダイアログ表示
-            self.page.dialog = ft.AlertDialog(
-                title=ft.Text("エラー"),
-                content=ft.Text(f"シミュレーション実行中にエラーが発生しました: {str(ex)}"),
-                actions=[
-                    ft.TextButton("OK", on_click=lambda _: self.close_dialog())
-                ]
-            )
-            self.page.dialog.open = True
+            self._simulation_failed_message(ex)
+        
+    def _on_simulation_progress(self, job):
+        """シミュレーションの進捗を表示する（バックグラウンドスレッドから呼ばれる）"""
+        self.progress_bar.value = job.percent / 100
+        self.progress_text.value = f"{job.phase} ({job.percent:.0f}%)  {format_eta(job.eta)}"
+        self.page.update()
+        
+    def _simulation_completed(self, job):
+        """シミュレーション完了時の処理（バックグラウンドスレッドから呼ばれる）"""
+        self.simulation_result = job.result
+        
+        # プログレスバーを非表示
+        self._hide_simulation_progress()
+        
+        # 解析画面に移動
+        self.show_analysis_view()
+        
+    def _simulation_failed(self, job):
+        """シミュレーション失敗・キャンセル時の処理（バックグラウンドスレッドから呼ばれる）"""
+        if job.status == "cancelled":
+            self._hide_simulation_progress()
             self.page.update()
+            return
+        self._simulation_failed_message(job.error)
+        
+    def _simulation_failed_message(self, ex):
+        """シミュレーションのエラーダイアログを表示"""
+        # プログレスバーを非表示
+        self._hide_simulation_progress()
+        
+        # エラーダイアログ表示
+        self.page.dialog = ft.AlertDialog(
+            title=ft.Text("エラー"),
+            content=ft.Text(f"シミュレーション実行中にエラーが発生しました: {str(ex)}"),
+            actions=[
+                ft.TextButton("OK", on_click=lambda _: self.close_dialog())
+            ]
+        )
+        self.page.dialog.open = True
+        self.page.update()
+        
+    def run_sweep_simulation(self, e):
+        """パラメータスイープの全点を低い優先度でジョブキューに投入する（すぐに戻る）"""
+        try:
+            # パラメータの取得
+            params = {}
+            for name, field in self.param_fields.items():
+                params[name] = field.value
+                
+            if not any(is_sweep_value(value) for value in params.values()):
+                raise ValueError("スイープするパラメータに 開始:終了:刻み または a,b,c の形式で値を入力してください")
+                
+            # 全組み合わせのジョブに展開
+            jobs = expand_sweep(params)
+            
+            # 全点が終わったら結果をまとめて検索結果画面で表示する
+            sweep = {"remaining": len(jobs), "results": [], "errors": []}
+            sweep_lock = threading.Lock()
+            
+            def on_finished(job):
+                with sweep_lock:
+                    if job.status == "done":
+                        sweep["results"].append({"date_dir": job.result["date_dir"], "params": job.result["params"]})
+                    elif job.status == "failed":
+                        sweep["errors"].append(str(job.error))
+                    sweep["remaining"] -= 1
+                    if sweep["remaining"] > 0:
+                        return
+                self._sweep_completed(sweep["results"], sweep["errors"])
+            
+            for job_params in jobs:
+                self.job_runner.submit(
+                    job_params,
+                    on_done=on_finished,
+                    on_error=on_finished,
+                    force=self.force_rerun_checkbox.value,
+                    priority=PRIORITY_SWEEP
+                )
+            print(f"スイープ投入: {len(jobs)}件")
+                
+        except Exception as ex:
+            print(f"スイープ実行エラー: {str(ex)}")
+            traceback.print_exc()
+            self._sweep_failed_message(ex)
+            
+    def _sweep_completed(self, results, errors):
+        """スイープの全点が終わったときの処理（バックグラウンドスレッドから呼ばれる）"""
+        print(f"スイープ完了: 成功 {len(results)}件, 失敗 {len(errors)}件")
+        
+        # 結果を検索結果画面で表示
+        self.search_pager = SearchResultPager.from_list(results)
+        self.result_selection.clear()
+        self.show_search_results_view()
+        
+        if errors:
+            self._sweep_failed_message(Exception(f"{len(errors)}件のシミュレーションが失敗しました: {errors[0]}"))
+            
+    def _sweep_failed_message(self, ex):
+        """スイープのエラーダイアログを表示"""
+        self.page.dialog = ft.AlertDialog(
+            title=ft.Text("エラー"),
+            content=ft.Text(f"スイープ実行中にエラーが発生しました: {str(ex)}"),
+            actions=[
+                ft.TextButton("OK", on_click=lambda _: self.close_dialog())
+            ]
+        )
+        self.page.dialog.open = True
+        self.page.update()
         
     def search_results_handler(self, e):
         """過去の結果を検索"""
         try:
-            self.search_results = []
+            self.search_pager = None
             
             # 現在のパラメータを取得
             current_params = {}
@@ -374,40 +409,22 @@ class PhotomaskApp:
                 current_params[name] = field.value
                 
             # プログレスバー表示
-            self.page.overlay.append(self.progress_bar)
+            self._show_busy()
             self.page.update()
             
-            # 過去のデータを検索
-            data_path = os.path.join("..", "data")
-            if os.path.exists(data_path):
-                date_dirs = glob.glob(os.path.join(data_path, "*"))
-                
-                for date_dir in date_dirs:
-                    if os.path.isdir(date_dir):
-                        input_json_path = os.path.join(date_dir, "data", "input", "input.json")
-                        if os.path.exists(input_json_path):
-                            try:
-                                with open(input_json_path, "r") as f:
-                                    params = json.load(f)
-                                    
-                                # パラメータが一致するか確認
-                                match = True
-                                for key, value in current_params.items():
-                                    if key in params and str(params[key]) != str(value):
-                                        match = False
-                                        break
-                                        
-                                if match:
-                                    date_name = os.path.basename(date_dir)
-                                    self.search_results.append({
-                                        "date_dir": date_name,
-                                        "params": params
-                                    })
-                            except Exception as ex:
-                                print(f"Error reading {input_json_path}: {str(ex)}")
+            # カタログを差分更新してから索引で検索
+            catalog = RunCatalog()
+            catalog.refresh()
+            self.search_pager = SearchResultPager.from_query(catalog, self._build_run_query(current_params))
+            
+            # 一致する実行がなければ、パラメータ空間で近い実行を近い順に表示する
+            if self.search_pager.total == 0:
+                neighbors = get_neighbor_index().query(current_params, k=NEIGHBOR_COUNT)
+                self.search_pager = SearchResultPager.from_list(neighbors, keep_order=True)
+            self.result_selection.clear()
             
             # プログレスバーを非表示
-            self.page.overlay.clear()
+            self._hide_busy()
             
             # 検索結果画面に移動
             self.show_search_results_view()
@@ -417,7 +434,7 @@ class PhotomaskApp:
             traceback.print_exc()
             
             # プログレスバーを非表示
-            self.page.overlay.clear()
+            self._hide_busy()
             
             # エラーダイアログ
             self.page.dialog = ft.AlertDialog(
@@ -430,26 +447,109 @@ class PhotomaskApp:
             self.page.dialog.open = True
             self.page.update()
         
+    def predict_results_handler(self, e):
+        """過去の実行から学習した代理モデルで結果を予測して表示する（すぐに戻る）"""
+        # 現在のパラメータを取得
+        current_params = {}
+        for name, field in self.param_fields.items():
+            current_params[name] = field.value
+            
+        # カタログの差分更新と代理モデルの学習し直しは重いのでバックグラウンドで行う
+        self._show_busy()
+        self.page.update()
+        threading.Thread(
+            target=self._predict_in_background,
+            args=(current_params,),
+            daemon=True
+        ).start()
+        
+    def _predict_in_background(self, current_params):
+        """予測してダイアログに表示する（バックグラウンドスレッドから呼ばれる）"""
+        try:
+            # カタログを差分更新し、実行が増えていれば学習し直してから予測
+            RunCatalog().refresh()
+            prediction = get_surrogate().predict(current_params)
+            self._hide_busy()
+            
+            if not prediction["outputs"]:
+                message = f"予測に使える実行が足りません（学習済みの実行: {prediction['training_runs']}件）"
+            else:
+                lines = [
+                    f"{name}: {mean:.4g} ± {2 * std:.2g}"
+                    for name, (mean, std) in prediction["outputs"].items()
+                ]
+                lines.append("")
+                lines.append(f"{prediction['training_runs']}件の実行から予測（± は95%の幅）")
+                if prediction["imputed"]:
+                    lines.append(f"数値でない入力は学習データの平均で補いました: {', '.join(prediction['imputed'])}")
+                message = "\n".join(lines)
+                
+            self.page.dialog = ft.AlertDialog(
+                title=ft.Text("予測結果"),
+                content=ft.Text(message),
+                actions=[
+                    ft.TextButton("OK", on_click=lambda _: self.close_dialog())
+                ]
+            )
+            self.page.dialog.open = True
+            self.page.update()
+            
+        except Exception as ex:
+            print(f"予測エラー: {str(ex)}")
+            traceback.print_exc()
+            
+            # プログレスバーを非表示
+            self._hide_busy()
+            
+            # エラーダイアログ
+            self.page.dialog = ft.AlertDialog(
+                title=ft.Text("エラー"),
+                content=ft.Text(f"予測中にエラーが発生しました: {str(ex)}"),
+                actions=[
+                    ft.TextButton("OK", on_click=lambda _: self.close_dialog())
+                ]
+            )
+            self.page.dialog.open = True
+            self.page.update()
+        
+    def _build_run_query(self, current_params):
+        """入力欄の値と並べ替えの指定から検索条件を作る"""
+        return RunQuery.from_fields(
+            current_params,
+            sort_by=self.sort_dropdown.value or None,
+            descending=self.sort_descending_checkbox.value
+        )
+        
     def show_search_results_view(self):
         """検索結果画面を表示"""
         self.current_view = "search_results"
         
-        # 検索結果テーブルの作成
+        # 検索結果テーブルの作成（近い実行を表示する場合は距離の列を加える）
+        show_distance = any("distance" in result for result in self.search_pager.rows)
         table_columns = [
             ft.DataColumn(ft.Text("選択")),
             ft.DataColumn(ft.Text("日付")),
-        ] + [
+        ] + (
+            [ft.DataColumn(ft.Text("距離"), numeric=True)] if show_distance else []
+        ) + [
             ft.DataColumn(ft.Text(name)) for name in self.param_fields.keys()
         ]
         
+        # 表示中のページの行だけを作る
         table_rows = []
-        for i, result in enumerate(self.search_results):
+        self.result_checkboxes = {}
+        for i, result in enumerate(self.search_pager.rows):
+            checkbox = ft.Checkbox(
+                value=self.result_selection.is_selected(result["date_dir"]),
+                on_change=lambda e, idx=i: self.select_result(e, idx)
+            )
+            self.result_checkboxes[result["date_dir"]] = checkbox
             row_cells = [
-                ft.DataCell(
-                    ft.Checkbox(value=False, on_change=lambda e, idx=i: self.select_result(e, idx))
-                ),
+                ft.DataCell(checkbox),
                 ft.DataCell(ft.Text(result["date_dir"])),
             ]
+            if show_distance:
+                row_cells.append(ft.DataCell(ft.Text(f"{result['distance']:.3f}")))
             
             for name in self.param_fields.keys():
                 value = result["params"].get(name, "")
@@ -472,17 +572,46 @@ class PhotomaskApp:
             on_click=lambda _: self.show_input_view()
         )
         
+        btn_prev = ft.ElevatedButton(
+            text="前のページ",
+            icon=ft.icons.NAVIGATE_BEFORE,
+            disabled=not self.search_pager.has_prev,
+            on_click=lambda _: self.change_search_page(-1)
+        )
+        
+        btn_next = ft.ElevatedButton(
+            text="次のページ",
+            icon=ft.icons.NAVIGATE_NEXT,
+            disabled=not self.search_pager.has_next,
+            on_click=lambda _: self.change_search_page(1)
+        )
+        
         btn_analyze = ft.ElevatedButton(
             text="解析モードに移る",
             icon=ft.icons.ANALYTICS,
             on_click=self.go_to_analysis_from_search
         )
         
+        btn_compare = ft.ElevatedButton(
+            text="選択した結果を比較",
+            icon=ft.icons.COMPARE_ARROWS,
+            on_click=self.compare_selected_results
+        )
+        
+        multi_select_checkbox = ft.Checkbox(
+            label="複数選択",
+            value=self.result_selection.multi,
+            on_change=self.toggle_multi_select
+        )
+        
         # レイアウト
         content = ft.Column(
             controls=[
                 ft.Text("検索結果", size=24, weight=ft.FontWeight.BOLD),
-                ft.Text(f"検索結果: {len(self.search_results)}件"),
+                ft.Text(
+                    "一致する実行がないため、条件に近い実行を近い順に表示しています" if show_distance
+                    else self.search_pager.describe()
+                ),
                 ft.Divider(),
                 ft.Container(
                     results_table,
@@ -492,7 +621,7 @@ class PhotomaskApp:
                 ),
                 ft.Divider(),
                 ft.Row(
-                    [btn_back, btn_analyze],
+                    [btn_back, btn_prev, btn_next, multi_select_checkbox, btn_compare, btn_analyze],
                     alignment=ft.MainAxisAlignment.CENTER,
                     spacing=20
                 )
@@ -506,28 +635,79 @@ class PhotomaskApp:
         self.page.add(content)
         self.page.update()
         
-    def select_result(self, e, idx):
-        """検索結果を選択"""
-        # チェックボックスの状態を更新
-        for i, row in enumerate(self.page.controls[0].controls[3].content.rows):
-            checkbox = row.cells[0].content
-            if i == idx:
-                checkbox.value = e.control.value
-            else:
-                checkbox.value = False
-                
-        # 選択された結果を保存
-        if e.control.value:
-            self.selected_result = self.search_results[idx]
+    def change_search_page(self, step):
+        """検索結果のページを送る（step: 1で次、-1で前のページ）"""
+        if step > 0:
+            self.search_pager.next_page()
         else:
-            self.selected_result = None
+            self.search_pager.prev_page()
+        self.show_search_results_view()
+        
+    def _update_result_checkboxes(self, changed):
+        """選択状態が変わった行のチェックボックスだけを画面に反映する"""
+        for date_dir in changed:
+            checkbox = self.result_checkboxes.get(date_dir)
+            if checkbox is None:
+                continue  # 表示中のページにない行
+            value = self.result_selection.is_selected(date_dir)
+            if checkbox.value != value:
+                checkbox.value = value
+                checkbox.update()
+        
+    def select_result(self, e, idx):
+        """検索結果を選択（変わった行のチェックボックスだけを更新する）"""
+        changed = self.result_selection.set(self.search_pager.rows[idx], e.control.value)
+        self._update_result_checkboxes(changed)
+        
+    def toggle_multi_select(self, e):
+        """単一選択・複数選択を切り替える"""
+        changed = self.result_selection.set_multi(e.control.value)
+        self._update_result_checkboxes(changed)
+        
+    def compare_selected_results(self, e):
+        """選択した結果のパラメータを並べて表示する（値が異なるパラメータだけ）"""
+        results = self.result_selection.results
+        if len(results) < 2:
+            self.page.dialog = ft.AlertDialog(
+                title=ft.Text("選択エラー"),
+                content=ft.Text("「複数選択」をオンにして、比較する結果を2件以上選択してください。"),
+                actions=[
+                    ft.TextButton("OK", on_click=lambda _: self.close_dialog())
+                ]
+            )
+            self.page.dialog.open = True
+            self.page.update()
+            return
             
+        differing = [
+            name for name in self.param_fields.keys()
+            if len({str(r["params"].get(name, "")) for r in results}) > 1
+        ]
+        compare_table = ft.DataTable(
+            columns=[ft.DataColumn(ft.Text("パラメータ"))] + [
+                ft.DataColumn(ft.Text(r["date_dir"])) for r in results
+            ],
+            rows=[
+                ft.DataRow(cells=[ft.DataCell(ft.Text(name))] + [
+                    ft.DataCell(ft.Text(str(r["params"].get(name, "")))) for r in results
+                ])
+                for name in differing
+            ],
+        )
+        self.page.dialog = ft.AlertDialog(
+            title=ft.Text(f"{len(results)}件の比較（値が異なるパラメータ {len(differing)}項目）"),
+            content=ft.Row([compare_table], scroll=ft.ScrollMode.AUTO),
+            actions=[
+                ft.TextButton("OK", on_click=lambda _: self.close_dialog())
+            ]
+        )
+        self.page.dialog.open = True
         self.page.update()
         
     def go_to_analysis_from_search(self, e):
-        """検索結果から解析画面に移動"""
-        if self.selected_result:
-            self.simulation_result = self.selected_result
+        """検索結果から解析画面に移動（複数選択時は最後に選択した結果）"""
+        if self.result_selection.current:
+            self.simulation_result = self.result_selection.current
             self.show_analysis_view()
         else:
             # 何も選択されていない場合はアラート表示
@@ -710,7 +890,7 @@ class PhotomaskApp:
                 analysis_params[name] = field.value
                 
             # 解析実行
-            self.page.overlay.append(self.progress_bar)
+            self._show_busy()
             self.status_text.value = "解析を実行中..."
             self.page.update()
             
@@ -723,8 +903,8 @@ class PhotomaskApp:
             except ValueError as ve:
                 raise ValueError(f"パラメータエラー: {str(ve)}")
             
-            # 解析実行 - データフレームとして返される
-            CD_df, pos_df, LER_df = Analyze(
+            # 解析実行 - 前回と入力が同じ段階は記憶した結果を使う
+            metrics = self.analysis_pipeline.analyze(
                 self.simulation_result["date_dir"],
                 self.simulation_result["params"],
                 analysis_params["ROI"],
@@ -737,7 +917,7 @@ class PhotomaskApp:
             )
             
             # マップを表示
-            self.update_map_display(CD_df, pos_df, LER_df)
+            self.update_map_display(metrics)
             
             # 成功メッセージ
             self.status_text.value = "解析が完了しました。マップを表示しています。"
@@ -761,44 +941,47 @@ class PhotomaskApp:
             
         finally:
             # プログレスバーを非表示
-            self.page.overlay.clear()
+            self._hide_busy()
             self.page.update()
         
-    def update_map_display(self, CD_df, pos_df, LER_df):
-        """マップ表示を更新"""
+    def update_map_display(self, metrics):
+        """マップ表示を更新（3つのマップを並列に描画し、できた順に表示する）"""
         try:
-            print(f"マップサイズ: CD={CD_df.shape}, POS={pos_df.shape}, LER={LER_df.shape}")
-            
-            # CD Map
-            print("CDマップの画像生成開始")
-            cd_map_img = self.create_matplotlib_heatmap(CD_df, "CD Map [nm]", "viridis")
-            if cd_map_img:
-                print("CDマップの画像をコンテナに設定")
-                self.cd_map_container.content = ft.Image(src_base64=cd_map_img)
-            else:
-                self.cd_map_container.content = ft.Text("CDマップの生成に失敗しました", color=ft.colors.RED)
-            
-            # Position Map
-            print("位置マップの画像生成開始")
-            pos_map_img = self.create_matplotlib_heatmap(pos_df, "Position Map [nm]", "coolwarm", center_zero=True)
-            if pos_map_img:
-                print("位置マップの画像をコンテナに設定")
-                self.pos_map_container.content = ft.Image(src_base64=pos_map_img)
-            else:
-                self.pos_map_container.content = ft.Text("位置マップの生成に失敗しました", color=ft.colors.RED)
-            
-            # LER Map
-            print("LERマップの画像生成開始")
-            ler_map_img = self.create_matplotlib_heatmap(LER_df, "LER Map [nm]", "hot")
-            if ler_map_img:
-                print("LERマップの画像をコンテナに設定")
-                self.ler_map_container.content = ft.Image(src_base64=ler_map_img)
-            else:
-                self.ler_map_container.content = ft.Text("LERマップの生成に失敗しました", color=ft.colors.RED)
+            print("マップサイズ: " + ", ".join(f"{name}={df.shape}" for name, (_, df) in metrics.items()))
             
-            # 画面更新
-            print("画面更新")
-            self.page.update()
+            # (マップ名, タイトル, カラーマップ, 0中心, 表示先, 表示名)
+            map_specs = [
+                ("CD", "CD Map [nm]", "viridis", False, self.cd_map_container, "CDマップ"),
+                ("position", "Position Map [nm]", "coolwarm", True, self.pos_map_container, "位置マップ"),
+                ("LER", "LER Map [nm]", "hot", False, self.ler_map_container, "LERマップ"),
+            ]
+            
+            # 3つのマップの描画をまとめて投入（前回と同じマップは記憶した画像を使う）
+            futures = {}
+            for name, title, cmap_name, center_zero, container, label in map_specs:
+                print(f"{label}の画像生成開始")
+                metric_key, df = metrics[name]
+                future = self.analysis_pipeline.render(
+                    metric_key, title, cmap_name, center_zero,
+                    prepare=lambda df=df, name=name: self._display_data(df, name)
+                )
+                futures[future] = (container, label)
+            
+            # 描画が終わったマップから順に表示
+            for future in concurrent.futures.as_completed(futures):
+                container, label = futures[future]
+                try:
+                    img = future.result()
+                except Exception:
+                    print(f"ヒートマップ生成エラー:\n{traceback.format_exc()}")
+                    img = None
+                    
+                if img:
+                    print(f"{label}の画像をコンテナに設定")
+                    container.content = ft.Image(src_base64=img)
+                else:
+                    container.content = ft.Text(f"{label}の生成に失敗しました", color=ft.colors.RED)
+                self.page.update()
             
         except Exception as e:
             error_details = traceback.format_exc()
@@ -806,85 +989,26 @@ class PhotomaskApp:
             self.status_text.value = f"マップの表示中にエラーが発生しました: {str(e)}"
             self.status_text.color = ft.colors.RED
     
-    def create_matplotlib_heatmap(self, df, title, cmap_name, center_zero=False):
-        """matplotlibを使用してデータフレームからヒートマップを生成する"""
+    def _display_data(self, df, name, max_pixels=600):
+        """
+        表示用の配列とラベルを返す
+
+        実行全体の大きなマップはピラミッドから表示サイズに合ったレベルを読み出す。
+        """
+        if df.size <= FAST_RENDER_CELLS:
+            return df.values, df.columns, df.index
+        
         try:
-            # Clean previous plot
-            plt.clf()
-            # 横に並べる場合はより小さいサイズで生成
-            plt.figure(figsize=(6, 5))
-            
-            # データフレームから値の配列を取得
-            data = df.values
-            
-            # 値の範囲を設定
-            if center_zero:
-                vmax = max(abs(np.min(data)), abs(np.max(data)))
-                vmin = -vmax
-            else:
-                vmin = np.min(data)
-                vmax = np.max(data)
-            
-            # ヒートマップを作成
-            im = plt.imshow(data, cmap=cmap_name, interpolation='nearest', 
-                           vmin=vmin, vmax=vmax, origin='upper', aspect='equal')
-            
-            # カラーバーを追加
-            cbar = plt.colorbar(im)
-            cbar.set_label(title)
-            
-            # タイトルを設定
-            plt.title(title)
-            
-            # X軸とY軸のラベルを設定
-            plt.xlabel("X軸")
-            plt.ylabel("Y軸")
-            
-            # X軸とY軸の目盛りとラベルを設定
-            # インデックスと列名のうち、5おきに表示する（表示を減らして見やすくする）
-            xtick_step = max(1, len(df.columns) // 5)
-            ytick_step = max(1, len(df.index) // 5)
-            
-            # X軸（列名）の目盛り - 5おきに表示
-            xticks_pos = np.arange(0, len(df.columns), xtick_step)
-            plt.xticks(xticks_pos, [df.columns[i] for i in xticks_pos], rotation=90)
-            
-            # Y軸（インデックス）の目盛り - 5おきに表示
-            yticks_pos = np.arange(0, len(df.index), ytick_step)
-            plt.yticks(yticks_pos, [df.index[i] for i in yticks_pos])
-            
-            # グリッド線の表示
-            ax = plt.gca()
-            ax.grid(True, color='white', linestyle='-', linewidth=0.5)
-            ax.set_axisbelow(False)
-            
-            # 統計情報を表示
-            mean_val = np.mean(data)
-            std_val = np.std(data)
-            min_val = np.min(data)
-            max_val = np.max(data)
-            
-            stats_text = f"Mean: {mean_val:.2f}, Std: {std_val:.2f}\nMin: {min_val:.2f}, Max: {max_val:.2f}"
-            plt.figtext(0.02, 0.02, stats_text, fontsize=8, bbox=dict(facecolor='white', alpha=0.8))
-            
-            # レイアウトの調整
-            plt.tight_layout()
-            
-            # 画像をメモリに保存してBase64でエンコード
-            buf = io.BytesIO()
-            plt.savefig(buf, format='png', dpi=100)
-            buf.seek(0)
-            plt.close()
-            
-            # Base64エンコード
-            img_base64 = base64.b64encode(buf.getvalue()).decode('utf-8')
-            
-            return img_base64
-            
-        except Exception as e:
-            error_details = traceback.format_exc()
-            print(f"Matplotlibヒートマップ生成エラー:\n{error_details}")
-            return None
+            pyramid = MapPyramid(self.simulation_result["date_dir"], name)
+            if pyramid.shape == df.shape and pyramid.max_level > 0:
+                level, data = pyramid.read_view(0, df.shape[0], 0, df.shape[1], max_pixels=max_pixels)
+                scale = 2 ** level
+                print(f"{name}マップをピラミッドのレベル{level}で表示: {data.shape}")
+                return data, df.columns[::scale], df.index[::scale]
+        except Exception as ex:
+            print(f"ピラミッド読み込みエラー: {str(ex)}")
+        
+        return df.values, df.columns, df.index
 
 if __name__ == "__main__":
     app = PhotomaskApp()
\ No newline at end of file
@@ -0,0 +1,48 @@
+# progress.py
+import json
+import time
+
+# サブプロセスが標準出力に書く進捗行の接頭辞
+PROGRESS_PREFIX = "PROGRESS "
+
+
+def format_progress_line(percent, phase):
+    """
+    進捗を1行の文字列にする（サブプロセスの標準出力用）
+
+    例: PROGRESS {"percent": 40.0, "phase": "シミュレーション実行中"}
+    """
+    return PROGRESS_PREFIX + json.dumps({"percent": float(percent), "phase": phase}, ensure_ascii=False)
+
+
+def parse_progress_line(line):
+    """
+    標準出力の1行が進捗行なら (percent, phase) を返し、そうでなければNoneを返す
+    """
+    if not line.startswith(PROGRESS_PREFIX):
+        return None
+    try:
+        data = json.loads(line[len(PROGRESS_PREFIX):])
+        return float(data["percent"]), str(data.get("phase", ""))
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def estimate_eta(started_at, percent):
+    """
+    経過時間と進捗率から残り時間[秒]を見積もる（見積もれない場合はNone）
+    """
+    if percent <= 0:
+        return None
+    elapsed = time.time() - started_at
+    return max(0.0, elapsed * (100.0 - percent) / percent)
+
+
+def format_eta(eta):
+    """残り時間を表示用の文字列にする"""
+    if eta is None:
+        return "残り時間: 計算中"
+    minutes, seconds = divmod(int(round(eta)), 60)
+    if minutes:
+        return f"残り時間: 約{minutes}分{seconds}秒"
+    return f"残り時間: 約{seconds}秒"
@@ -0,0 +1,240 @@
+# result_cache.py
+import hashlib
+import importlib.util
+import json
+import math
+import os
+import sqlite3
+import time
+
+from run_catalog import CATALOG_PATH, DATA_DIR
+
+# キャッシュの既定の保持条件
+DEFAULT_MAX_AGE_DAYS = 90
+DEFAULT_MAX_BYTES = None  # Noneの場合はサイズで削除しない
+
+# コードバージョンの計算に含めるモジュール
+_VERSION_MODULES = ["simulation_runner", "factories.SimulationFactory", "simulation"]
+_code_version = None
+
+
+def simulation_code_version():
+    """
+    シミュレーションコードのバージョン（ソースファイルのハッシュ）を返す
+
+    コードが変わればキャッシュキーも変わり、古い結果は使われなくなる。
+    """
+    global _code_version
+    if _code_version is not None:
+        return _code_version
+
+    digest = hashlib.sha256()
+    for module_name in _VERSION_MODULES:
+        try:
+            spec = importlib.util.find_spec(module_name)
+        except (ImportError, ValueError):
+            spec = None
+        if spec is None or not spec.origin or not os.path.isfile(spec.origin):
+            continue
+        digest.update(module_name.encode("utf-8"))
+        with open(spec.origin, "rb") as f:
+            digest.update(f.read())
+
+    _code_version = digest.hexdigest()[:16]
+    return _code_version
+
+
+def normalize_value(value):
+    """
+    パラメータ値を正規化する
+
+    数値として解釈できる値は "50" も "50.0" も同じ表現にそろえる。
+    """
+    text = str(value).strip()
+    try:
+        number = float(text)
+    except ValueError:
+        return text
+    if not math.isfinite(number):
+        return text
+    if number == 0:
+        number = 0.0  # -0.0 と 0.0 を区別しない
+    return repr(number)
+
+
+def normalize_params(params):
+    """パラメータ辞書の全ての値を正規化する"""
+    return {str(name): normalize_value(value) for name, value in params.items()}
+
+
+def cache_key(params):
+    """正規化したパラメータとコードバージョンからキャッシュキーを作る"""
+    payload = json.dumps(
+        {"params": normalize_params(params), "version": simulation_code_version()},
+        sort_keys=True,
+        ensure_ascii=False
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _dir_size(path):
+    """ディレクトリ以下のファイルサイズの合計[byte]"""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class ResultCache:
+    """
+    パラメータのハッシュから既存の実行ディレクトリを引くキャッシュ
+
+    対応表はカタログと同じSQLiteファイルに保存する。削除（evict）するのは
+    対応表の行だけで、実行ディレクトリ自体は検索結果として残す。
+    """
+
+    def __init__(self, db_path=CATALOG_PATH, data_dir=DATA_DIR,
+                 max_age_days=DEFAULT_MAX_AGE_DAYS, max_bytes=DEFAULT_MAX_BYTES):
+        self.db_path = db_path
+        self.data_dir = data_dir
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self._init_schema()
+
+    def _connect(self):
+        """キャッシュへの接続を開く"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_schema(self):
+        """テーブルを作成する"""
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        conn = self._connect()
+        try:
+            conn.execute(
+                """CREATE TABLE IF NOT EXISTS result_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    date_dir TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL,
+                    size_bytes INTEGER NOT NULL
+                )"""
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_result_cache_last_used ON result_cache (last_used_at)"
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _output_json_path(self, date_dir):
+        """実行ディレクトリ名から output.json のパスを返す"""
+        return os.path.join(self.data_dir, date_dir, "data", "output", "output.json")
+
+    def lookup(self, params):
+        """
+        同じパラメータの実行結果があれば返す
+
+        Returns:
+        --------
+        dict or None
+            {"date_dir", "params", "sim_result", "cached": True}。なければNone
+        """
+        key = cache_key(params)
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT date_dir FROM result_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            date_dir = row["date_dir"]
+            try:
+                with open(self._output_json_path(date_dir), "r") as f:
+                    sim_result = json.load(f)
+            except (OSError, ValueError):
+                # 結果が消えている・壊れている場合はキャッシュから外す
+                conn.execute("DELETE FROM result_cache WHERE cache_key = ?", (key,))
+                conn.commit()
+                return None
+
+            conn.execute(
+                "UPDATE result_cache SET last_used_at = ? WHERE cache_key = ?", (time.time(), key)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+        return {"date_dir": date_dir, "params": params, "sim_result": sim_result, "cached": True}
+
+    def store(self, params, date_dir):
+        """実行結果をキャッシュに登録し、保持条件を超えた分を削除する"""
+        now = time.time()
+        size_bytes = _dir_size(os.path.join(self.data_dir, date_dir))
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO result_cache VALUES (?, ?, ?, ?, ?)",
+                (cache_key(params), date_dir, now, now, size_bytes)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        self.evict()
+
+    def invalidate(self, params):
+        """指定パラメータのキャッシュを削除する"""
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM result_cache WHERE cache_key = ?", (cache_key(params),))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def evict(self):
+        """
+        保持条件（最終利用からの日数・合計サイズ）を超えたキャッシュを削除する
+
+        合計サイズを超えた場合は最終利用が古いものから削除する。
+
+        Returns:
+        --------
+        int
+            削除した件数
+        """
+        removed = 0
+        conn = self._connect()
+        try:
+            if self.max_age_days is not None:
+                cutoff = time.time() - self.max_age_days * 86400
+                removed += conn.execute(
+                    "DELETE FROM result_cache WHERE last_used_at < ?", (cutoff,)
+                ).rowcount
+
+            if self.max_bytes is not None:
+                total = conn.execute(
+                    "SELECT COALESCE(SUM(size_bytes), 0) FROM result_cache"
+                ).fetchone()[0]
+                if total > self.max_bytes:
+                    for row in conn.execute(
+                        "SELECT cache_key, size_bytes FROM result_cache ORDER BY last_used_at"
+                    ).fetchall():
+                        if total <= self.max_bytes:
+                            break
+                        conn.execute("DELETE FROM result_cache WHERE cache_key = ?", (row["cache_key"],))
+                        total -= row["size_bytes"]
+                        removed += 1
+
+            conn.commit()
+        finally:
+            conn.close()
+        return removed
@@ -0,0 +1,197 @@
+# result_channel.py
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+# 配列をファイルに出したことを示すJSON上の目印
+ARRAY_MARKER = "__ndarray__"
+
+# object型の配列（メモリマップで開けない）をJSONに埋め込んだことを示す目印
+OBJECT_ARRAY_MARKER = "__object_ndarray__"
+
+# 実行ディレクトリ内で配列を保存するディレクトリ名
+ARRAY_DIR_NAME = "arrays"
+
+
+def _relative_path(path, base_dir):
+    """JSONファイルの場所から見た相対パス（ドライブが違う場合は絶対パス）"""
+    try:
+        return os.path.relpath(path, base_dir)
+    except ValueError:
+        return os.path.abspath(path)
+
+
+def _safe_name(key):
+    """
+    辞書のキーをファイル名に使える文字列にする
+
+    英小文字・数字・_ だけのキーはそのまま使う。それ以外の文字を含むキーは置き換えた上で
+    元のキーのハッシュを付け、"a.b" と "a/b"、"A" と "a"（大文字小文字を区別しない
+    ファイルシステム）のように別のキーが同じファイル名にならないようにする。
+    """
+    key = str(key)
+    if re.fullmatch(r"[a-z0-9_]+", key):
+        return key
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:8]
+    return f"{re.sub(r'[^a-z0-9_]', '_', key.lower())}-{digest}"
+
+
+def encode_result(result, array_dir, base_dir, _path="result"):
+    """
+    結果に含まれるnumpy配列を .npy ファイルに出し、JSONにできる形にする
+
+    配列は {"__ndarray__": パス, "dtype": 型, "shape": 形状} に置き換える。
+    パスは base_dir（JSONファイルのあるディレクトリ）からの相対パスにする。
+    object型の配列は {"__object_ndarray__": 要素のリスト, "shape": 形状} としてJSONに埋め込む。
+
+    Returns:
+    --------
+    object
+        JSONにできる結果
+    """
+    if isinstance(result, np.ndarray) and result.dtype.hasobject:
+        return {
+            OBJECT_ARRAY_MARKER: [
+                encode_result(value, array_dir, base_dir, f"{_path}.{i}")
+                for i, value in enumerate(result.ravel())
+            ],
+            "shape": list(result.shape),
+        }
+    if isinstance(result, np.ndarray):
+        os.makedirs(array_dir, exist_ok=True)
+        array_path = os.path.join(array_dir, f"{_path}.npy")
+        tmp_path = array_path + ".tmp.npy"
+        np.save(tmp_path, np.ascontiguousarray(result))
+        os.replace(tmp_path, array_path)
+        return {
+            ARRAY_MARKER: _relative_path(array_path, base_dir),
+            "dtype": str(result.dtype),
+            "shape": list(result.shape),
+        }
+    if isinstance(result, np.generic):
+        return result.item()
+    if isinstance(result, dict):
+        return {
+            key: encode_result(value, array_dir, base_dir, f"{_path}.{_safe_name(key)}")
+            for key, value in result.items()
+        }
+    if isinstance(result, (list, tuple)):
+        return [
+            encode_result(value, array_dir, base_dir, f"{_path}.{i}")
+            for i, value in enumerate(result)
+        ]
+    return result
+
+
+def _is_array_marker(value):
+    """JSON上の値が配列の目印かどうか"""
+    return isinstance(value, dict) and ARRAY_MARKER in value
+
+
+def _map_arrays(doc, func):
+    """JSON上の配列の目印ごとに関数を適用する"""
+    if _is_array_marker(doc):
+        return func(doc)
+    if isinstance(doc, dict):
+        return {key: _map_arrays(value, func) for key, value in doc.items()}
+    if isinstance(doc, list):
+        return [_map_arrays(value, func) for value in doc]
+    return doc
+
+
+def _restore_object_arrays(doc):
+    """JSONに埋め込んだobject型の配列を np.ndarray に戻す"""
+    if isinstance(doc, dict) and OBJECT_ARRAY_MARKER in doc:
+        items = [_restore_object_arrays(value) for value in doc[OBJECT_ARRAY_MARKER]]
+        array = np.empty(len(items), dtype=object)
+        for i, value in enumerate(items):
+            array[i] = value
+        return array.reshape(doc["shape"])
+    if isinstance(doc, dict):
+        return {key: _restore_object_arrays(value) for key, value in doc.items()}
+    if isinstance(doc, list):
+        return [_restore_object_arrays(value) for value in doc]
+    return doc
+
+
+def decode_result(doc, base_dir, mmap=True):
+    """
+    encode_result() の逆変換（配列はメモリマップで開くのでコピーしない）
+
+    Returns:
+    --------
+    object
+        配列を np.ndarray に戻した結果
+    """
+    def load(marker):
+        path = marker[ARRAY_MARKER]
+        if not os.path.isabs(path):
+            path = os.path.join(base_dir, path)
+        return np.load(path, mmap_mode="r" if mmap else None)
+
+    return _restore_object_arrays(_map_arrays(doc, load))
+
+
+def _write_json(doc, path):
+    """JSONを書き込む（整形しない・書き込み途中のファイルを読ませない）"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def write_result(result, path, array_dir=None):
+    """
+    結果を「小さなJSON + 配列ごとの .npy」として書き込む
+
+    Parameters:
+    -----------
+    result : object
+        シミュレーション結果（numpy配列を含んでよい）
+    path : str
+        JSONファイルのパス
+    array_dir : str, optional
+        .npy を保存するディレクトリ（省略時はJSONファイルと同じ場所の arrays）
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    if array_dir is None:
+        array_dir = os.path.join(base_dir, ARRAY_DIR_NAME)
+    _write_json(encode_result(result, array_dir, base_dir), path)
+
+
+def read_result(path, mmap=True):
+    """write_result() で書いた結果を読み込む（配列はメモリマップで開く）"""
+    with open(path, "r", encoding="utf-8") as f:
+        doc = json.load(f)
+    return decode_result(doc, os.path.dirname(os.path.abspath(path)), mmap=mmap)
+
+
+def rebase_result(doc, src_dir, dst_dir):
+    """
+    結果のJSONの配列の参照を、src_dir からの相対パスから dst_dir からの相対パスに直す
+
+    結果のJSONを別のディレクトリのファイルに書き写すときに使う。
+    """
+    def rebase(marker):
+        path = marker[ARRAY_MARKER]
+        if not os.path.isabs(path):
+            path = os.path.join(src_dir, path)
+        return dict(marker, **{ARRAY_MARKER: _relative_path(path, dst_dir)})
+
+    return _map_arrays(doc, rebase)
+
+
+def copy_result(src_path, dst_path):
+    """
+    結果のJSONだけを別の場所にコピーする（配列の .npy はコピーせず元のファイルを参照する）
+    """
+    src_dir = os.path.dirname(os.path.abspath(src_path))
+    dst_dir = os.path.dirname(os.path.abspath(dst_path))
+
+    with open(src_path, "r", encoding="utf-8") as f:
+        doc = json.load(f)
+    _write_json(rebase_result(doc, src_dir, dst_dir), dst_path)
+
@@ -0,0 +1,85 @@
+# result_selection.py
+from collections import OrderedDict
+
+
+class ResultSelection:
+    """
+    検索結果の選択状態（実行ディレクトリ名で管理する）
+
+    クリックのたびに表の全行を調べ直さないよう、選択の変化で状態が変わった
+    実行ディレクトリ名だけを返す。画面側はその行のチェックボックスだけを更新する。
+    選択はページをまたいで保持する。
+    """
+
+    def __init__(self, multi=False):
+        self.multi = multi
+        self._selected = OrderedDict()  # 実行ディレクトリ名 -> 検索結果（選択した順）
+
+    def is_selected(self, date_dir):
+        """実行が選択されているかどうか"""
+        return date_dir in self._selected
+
+    def set(self, result, selected):
+        """
+        1件の選択状態を変える
+
+        単一選択モードで別の実行を選んだ場合は、それまでの選択を外す。
+
+        Returns:
+        --------
+        list of str
+            選択状態が変わった実行ディレクトリ名
+        """
+        date_dir = result["date_dir"]
+        if not selected:
+            if self._selected.pop(date_dir, None) is None:
+                return []
+            return [date_dir]
+
+        changed = []
+        if not self.multi:
+            changed = [d for d in self._selected if d != date_dir]
+            for d in changed:
+                del self._selected[d]
+        if date_dir not in self._selected:
+            self._selected[date_dir] = result
+            changed.append(date_dir)
+        return changed
+
+    def set_multi(self, multi):
+        """
+        単一選択・複数選択を切り替える（複数→単一では最後に選んだ1件だけ残す）
+
+        Returns:
+        --------
+        list of str
+            選択状態が変わった実行ディレクトリ名
+        """
+        self.multi = multi
+        if multi or len(self._selected) <= 1:
+            return []
+        changed = list(self._selected)[:-1]
+        for date_dir in changed:
+            del self._selected[date_dir]
+        return changed
+
+    def clear(self):
+        """選択を全て外す"""
+        changed = list(self._selected)
+        self._selected.clear()
+        return changed
+
+    @property
+    def results(self):
+        """選択した検索結果（選択した順）"""
+        return list(self._selected.values())
+
+    @property
+    def current(self):
+        """最後に選択した検索結果（選択がなければNone）"""
+        if not self._selected:
+            return None
+        return next(reversed(self._selected.values()))
+
+    def __len__(self):
+        return len(self._selected)
@@ -0,0 +1,553 @@
+# run_catalog.py
+import os
+import json
+import sqlite3
+import threading
+import time
+import traceback
+
+from run_query import is_numeric_param
+
+# シミュレーション結果の保存先とカタログファイルの場所
+DATA_DIR = os.path.join("..", "data")
+CATALOG_PATH = os.path.join("..", "run_catalog.sqlite3")
+
+# カタログで索引を張るパラメータ（GUIのparam_fieldsと同じ15項目）
+PARAM_NAMES = [
+    "beam_energy",
+    "beam_current",
+    "beam_size",
+    "resist_thickness",
+    "resist_sensitivity",
+    "development_time",
+    "development_temperature",
+    "pattern_width",
+    "pattern_height",
+    "pattern_pitch_x",
+    "pattern_pitch_y",
+    "pattern_array_x",
+    "pattern_array_y",
+    "substrate_material",
+    "resist_type",
+]
+
+# 検索結果1ページあたりの既定の件数
+PAGE_SIZE = 50
+
+# 既存の input.json の書き換えを拾うために、全ての実行を調べ直す間隔（秒）
+FULL_RESCAN_INTERVAL = 600
+
+# バックグラウンドの rescan() を同時に1つだけ走らせるためのロック
+_background_rescan_lock = threading.Lock()
+
+
+def _column(name):
+    """パラメータ名からカタログの列名を作る"""
+    return f"p_{name}"
+
+
+def _numeric_column(name):
+    """数値のパラメータの数値列の列名を作る（範囲検索・数値での一致に使う）"""
+    return f"n_{name}"
+
+
+# 数値列を持つパラメータ
+NUMERIC_PARAM_NAMES = [name for name in PARAM_NAMES if is_numeric_param(name)]
+
+
+def _to_number(value):
+    """パラメータの値を数値にする（数値でない場合はNone）"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class RunCatalog:
+    """
+    ../data 以下のシミュレーション結果を1実行1行で管理するSQLiteカタログ
+
+    検索のたびに全ての input.json を開く代わりに、パラメータごとに索引を張った
+    テーブルへ問い合わせる。ディレクトリの追加・変更は rescan() で差分だけ取り込み、
+    検索の前には ../data が変わったときだけ一覧を読む refresh() を呼ぶ。
+    """
+
+    def __init__(self, db_path=CATALOG_PATH, data_dir=DATA_DIR):
+        self.db_path = db_path
+        self.data_dir = data_dir
+        self._init_schema()
+
+    def _connect(self):
+        """カタログへの接続を開く（並列プロセスからの書き込みに備えて待ち時間を長めに取る）"""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_schema(self):
+        """テーブルとパラメータごとの索引を作成する"""
+        db_dir = os.path.dirname(self.db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+
+        param_columns = ", ".join(
+            [f"{_column(name)} TEXT" for name in PARAM_NAMES]
+            + [f"{_numeric_column(name)} REAL" for name in NUMERIC_PARAM_NAMES]
+        )
+        conn = self._connect()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                f"""CREATE TABLE IF NOT EXISTS runs (
+                    date_dir TEXT PRIMARY KEY,
+                    input_mtime INTEGER NOT NULL,
+                    params_json TEXT NOT NULL,
+                    {param_columns}
+                )"""
+            )
+            self._add_numeric_columns(conn)
+            for name in PARAM_NAMES:
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_runs_{name} ON runs ({_column(name)})"
+                )
+            for name in NUMERIC_PARAM_NAMES:
+                conn.execute(
+                    f"CREATE INDEX IF NOT EXISTS idx_runs_n_{name} ON runs ({_numeric_column(name)})"
+                )
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _add_numeric_columns(self, conn):
+        """数値列のない古いカタログに列を追加し、既存の行の値を埋める"""
+        existing = {row["name"] for row in conn.execute("PRAGMA table_info(runs)")}
+        missing = [name for name in NUMERIC_PARAM_NAMES if _numeric_column(name) not in existing]
+        if not missing:
+            return
+
+        for name in missing:
+            conn.execute(f"ALTER TABLE runs ADD COLUMN {_numeric_column(name)} REAL")
+        assignments = ", ".join(f"{_numeric_column(name)} = ?" for name in missing)
+        rows = conn.execute("SELECT date_dir, params_json FROM runs").fetchall()
+        conn.executemany(
+            f"UPDATE runs SET {assignments} WHERE date_dir = ?",
+            [
+                [_to_number(params.get(name)) for name in missing] + [row["date_dir"]]
+                for row in rows
+                for params in (json.loads(row["params_json"]),)
+            ]
+        )
+
+    def _input_json_path(self, date_dir):
+        """実行ディレクトリ名から input.json のパスを返す"""
+        return os.path.join(self.data_dir, date_dir, "data", "input", "input.json")
+
+    def _upsert(self, conn, date_dir, params, input_mtime):
+        """1実行分の行を追加または更新する"""
+        columns = (
+            ["date_dir", "input_mtime", "params_json"]
+            + [_column(name) for name in PARAM_NAMES]
+            + [_numeric_column(name) for name in NUMERIC_PARAM_NAMES]
+        )
+        values = [date_dir, input_mtime, json.dumps(params, ensure_ascii=False)]
+        for name in PARAM_NAMES:
+            values.append(str(params[name]) if name in params else None)
+        for name in NUMERIC_PARAM_NAMES:
+            values.append(_to_number(params.get(name)))
+
+        placeholders = ", ".join("?" for _ in columns)
+        conn.execute(
+            f"INSERT OR REPLACE INTO runs ({', '.join(columns)}) VALUES ({placeholders})",
+            values,
+        )
+
+    def register_run(self, date_dir, params):
+        """
+        新しい実行をカタログに登録する
+
+        Parameters:
+        -----------
+        date_dir : str
+            ../data 以下の実行ディレクトリ名
+        params : dict
+            input.json に保存したシミュレーションパラメータ
+        """
+        try:
+            input_mtime = os.stat(self._input_json_path(date_dir)).st_mtime_ns
+        except OSError:
+            input_mtime = 0
+
+        conn = self._connect()
+        try:
+            self._upsert(conn, date_dir, params, input_mtime)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _data_dir_mtime(self):
+        """../data の更新時刻（実行ディレクトリの追加・削除で変わる。なければNone）"""
+        try:
+            return os.stat(self.data_dir).st_mtime_ns
+        except OSError:
+            return None
+
+    def refresh(self):
+        """
+        検索の前に呼ぶ軽い差分更新
+
+        ../data の更新時刻が前回の走査から変わっていなければ何もしない。変わっていれば
+        ディレクトリ一覧だけを読み、新しい実行を取り込んで消えた実行を削除する（既知の
+        実行の input.json は調べない）。前回の走査で input.json がまだなかった実行
+        ディレクトリは、更新時刻が変わっていなくても毎回確かめ、書き終わっていれば
+        取り込む。既存の input.json の書き換えは、前回の
+        rescan() から FULL_RESCAN_INTERVAL 秒たっていればバックグラウンドの rescan() で
+        取り込む（呼び出し元は待たない）。
+
+        Returns:
+        --------
+        int
+            追加・更新・削除した行数
+        """
+        data_dir_mtime = self._data_dir_mtime()
+        if data_dir_mtime is None:
+            return 0
+
+        conn = self._connect()
+        try:
+            meta = {row["key"]: row["value"] for row in conn.execute("SELECT key, value FROM meta")}
+        finally:
+            conn.close()
+
+        if time.time() - float(meta.get("rescanned_at", 0)) >= FULL_RESCAN_INTERVAL:
+            threading.Thread(target=self._background_rescan, daemon=True).start()
+        if meta.get("data_dir_mtime") == str(data_dir_mtime):
+            pending = json.loads(meta.get("pending_dirs", "[]"))
+            if not any(self._pending_ready(date_dir) for date_dir in pending):
+                return 0
+        return self._scan(check_known=False)
+
+    def _pending_ready(self, date_dir):
+        """input.json 待ちだった実行ディレクトリが、取り込める（または消えた）状態になったか"""
+        return (
+            os.path.exists(self._input_json_path(date_dir))
+            or not os.path.isdir(os.path.join(self.data_dir, date_dir))
+        )
+
+    def _background_rescan(self):
+        """refresh() から起動するバックグラウンドの rescan()（既に走っていれば何もしない）"""
+        if not _background_rescan_lock.acquire(blocking=False):
+            return
+        try:
+            self.rescan()
+        except Exception as ex:
+            print(f"カタログの再走査エラー: {str(ex)}")
+            traceback.print_exc()
+        finally:
+            _background_rescan_lock.release()
+
+    def rescan(self):
+        """
+        ../data を走査し、新規または更新された実行ディレクトリだけを読み込む
+
+        既知のディレクトリは input.json の更新時刻が変わっていなければ開かない。
+        消えたディレクトリの行は削除する。
+
+        Returns:
+        --------
+        int
+            追加・更新・削除した行数
+        """
+        return self._scan(check_known=True)
+
+    def _scan(self, check_known):
+        """
+        ../data の実行ディレクトリをカタログに取り込む
+
+        check_known がFalseの場合は既知のディレクトリの input.json を調べない。
+        input.json がまだない（または読めない）ディレクトリは meta の pending_dirs に
+        記録し、次の refresh() で確かめる。
+        """
+        # 走査中に追加されたディレクトリを次回に拾えるよう、走査前の更新時刻を記録する
+        data_dir_mtime = self._data_dir_mtime()
+        if data_dir_mtime is None:
+            return 0
+
+        conn = self._connect()
+        try:
+            known = {
+                row["date_dir"]: row["input_mtime"]
+                for row in conn.execute("SELECT date_dir, input_mtime FROM runs")
+            }
+
+            changed = 0
+            seen = set()
+            pending = []
+            with os.scandir(self.data_dir) as entries:
+                for entry in entries:
+                    if not check_known and entry.name in known:
+                        seen.add(entry.name)
+                        continue
+                    if not entry.is_dir():
+                        continue
+                    input_json_path = self._input_json_path(entry.name)
+                    try:
+                        input_mtime = os.stat(input_json_path).st_mtime_ns
+                    except OSError:
+                        pending.append(entry.name)
+                        continue
+
+                    seen.add(entry.name)
+                    if known.get(entry.name) == input_mtime:
+                        continue
+
+                    try:
+                        with open(input_json_path, "r") as f:
+                            params = json.load(f)
+                        self._upsert(conn, entry.name, params, input_mtime)
+                        changed += 1
+                    except Exception as ex:
+                        print(f"Error reading {input_json_path}: {str(ex)}")
+                        pending.append(entry.name)
+
+            removed = [date_dir for date_dir in known if date_dir not in seen]
+            conn.executemany("DELETE FROM runs WHERE date_dir = ?", [(d,) for d in removed])
+            changed += len(removed)
+
+            meta = [("data_dir_mtime", str(data_dir_mtime)), ("pending_dirs", json.dumps(pending))]
+            if check_known:
+                meta.append(("rescanned_at", str(time.time())))
+            conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", meta)
+            conn.commit()
+            return changed
+        finally:
+            conn.close()
+
+    def _conditions(self, params):
+        """検索条件からWHERE句の条件とその値を作る"""
+        conditions = []
+        values = []
+        for name, value in params.items():
+            if name not in PARAM_NAMES:
+                continue
+            conditions.append(f"({_column(name)} = ? OR {_column(name)} IS NULL)")
+            values.append(str(value))
+        return conditions, values
+
+    def _query(self, query, values):
+        """検索を実行し、結果を {"date_dir", "params"} のリストにする"""
+        conn = self._connect()
+        try:
+            return [
+                {"date_dir": row["date_dir"], "params": json.loads(row["params_json"])}
+                for row in conn.execute(query, values)
+            ]
+        finally:
+            conn.close()
+
+    def search(self, params):
+        """
+        パラメータが一致する実行を索引から検索する
+
+        従来の検索と同じく、保存側にないパラメータは一致とみなし、
+        値は文字列として比較する。
+
+        Parameters:
+        -----------
+        params : dict
+            検索条件（パラメータ名 -> 値）
+
+        Returns:
+        --------
+        list of dict
+            {"date_dir": 実行ディレクトリ名, "params": パラメータ} のリスト
+        """
+        conditions, values = self._conditions(params)
+
+        query = "SELECT date_dir, params_json FROM runs"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY date_dir"
+
+        return self._query(query, values)
+
+    def runs_after(self, after=None):
+        """
+        実行ディレクトリ名が after より後の実行を全て返す（after を省略した場合は全件）
+
+        Returns:
+        --------
+        list of dict
+            {"date_dir": 実行ディレクトリ名, "params": パラメータ,
+             "numbers": NUMERIC_PARAM_NAMES の順の数値（値がなければNone）} のリスト
+            （実行ディレクトリ名の順）
+        """
+        numeric_columns = ", ".join(_numeric_column(name) for name in NUMERIC_PARAM_NAMES)
+        query = f"SELECT date_dir, params_json, {numeric_columns} FROM runs"
+        values = []
+        if after is not None:
+            query += " WHERE date_dir > ?"
+            values.append(after)
+        query += " ORDER BY date_dir"
+
+        conn = self._connect()
+        try:
+            return [
+                {
+                    "date_dir": row["date_dir"],
+                    "params": json.loads(row["params_json"]),
+                    "numbers": tuple(row)[2:],
+                }
+                for row in conn.execute(query, values)
+            ]
+        finally:
+            conn.close()
+
+    def count(self, params):
+        """検索条件に一致する実行の件数を返す"""
+        conditions, values = self._conditions(params)
+
+        query = "SELECT COUNT(*) FROM runs"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+
+        conn = self._connect()
+        try:
+            return conn.execute(query, values).fetchone()[0]
+        finally:
+            conn.close()
+
+    def search_page(self, params, after=None, before=None, limit=PAGE_SIZE):
+        """
+        検索結果を実行ディレクトリ名の順に1ページ分だけ返す（キーセット方式のページ送り）
+
+        OFFSETを使わず、前のページの最後（または次のページの最初）の実行ディレクトリ名を
+        起点に索引をたどるので、何ページ目でも読む行数は1ページ分で済む。
+
+        Parameters:
+        -----------
+        params : dict
+            検索条件（パラメータ名 -> 値）
+        after : str, optional
+            この実行ディレクトリ名より後のページを返す（次のページ）
+        before : str, optional
+            この実行ディレクトリ名より前のページを返す（前のページ）
+        limit : int
+            1ページの件数
+
+        Returns:
+        --------
+        list of dict
+            {"date_dir": 実行ディレクトリ名, "params": パラメータ} のリスト（昇順）
+        """
+        conditions, values = self._conditions(params)
+        if after is not None:
+            conditions.append("date_dir > ?")
+            values.append(after)
+        if before is not None:
+            conditions.append("date_dir < ?")
+            values.append(before)
+
+        query = "SELECT date_dir, params_json FROM runs"
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        # 前のページは起点から逆向きにたどり、並べ直して返す
+        query += " ORDER BY date_dir DESC" if before is not None else " ORDER BY date_dir"
+        query += " LIMIT ?"
+        values.append(limit)
+
+        rows = self._query(query, values)
+        if before is not None:
+            rows.reverse()
+        return rows
+
+    def count_query(self, run_query):
+        """run_query.RunQuery に一致する実行の件数を返す"""
+        clauses, values = run_query.where()
+
+        query = "SELECT COUNT(*) FROM runs"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+
+        conn = self._connect()
+        try:
+            return conn.execute(query, values).fetchone()[0]
+        finally:
+            conn.close()
+
+    def query_page(self, run_query, after=None, before=None, limit=PAGE_SIZE):
+        """
+        run_query.RunQuery（範囲・許容差・集合・ワイルドカード・並べ替え）で1ページ分を検索する
+
+        search_page() と同じキーセット方式で、起点には前後のページの端の行
+        （このメソッドが返した行）を渡す。並べ替えの値が同じ行は実行ディレクトリ名の順になる。
+
+        Parameters:
+        -----------
+        run_query : run_query.RunQuery
+            検索条件と並べ替え順
+        after : dict, optional
+            この行より後のページを返す（次のページ）
+        before : dict, optional
+            この行より前のページを返す（前のページ）
+        limit : int
+            1ページの件数
+
+        Returns:
+        --------
+        list of dict
+            {"date_dir", "params", "sort_key"} のリスト（並べ替え順）
+        """
+        clauses, values = run_query.where()
+        sort_expression = run_query.sort_expression() or "date_dir"
+        missing_last = run_query.missing_last_expression() or "0"
+        key = f"({missing_last}, {sort_expression}, date_dir)"
+
+        # 前のページは逆向きにたどり、並べ直して返す
+        reverse = before is not None
+        descending = run_query.descending != reverse
+        if after is not None:
+            clauses.append(f"{key} {'<' if run_query.descending else '>'} (?, ?, ?)")
+            values.extend(after["sort_key"])
+        if before is not None:
+            clauses.append(f"{key} {'>' if run_query.descending else '<'} (?, ?, ?)")
+            values.extend(before["sort_key"])
+
+        query = (
+            f"SELECT date_dir, params_json, {missing_last} AS missing_last, "
+            f"{sort_expression} AS sort_value FROM runs"
+        )
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        direction = "DESC" if descending else "ASC"
+        query += f" ORDER BY {missing_last} {direction}, {sort_expression} {direction}, date_dir {direction} LIMIT ?"
+        values.append(limit)
+
+        conn = self._connect()
+        try:
+            rows = [
+                {
+                    "date_dir": row["date_dir"],
+                    "params": json.loads(row["params_json"]),
+                    "sort_key": (row["missing_last"], row["sort_value"], row["date_dir"]),
+                }
+                for row in conn.execute(query, values)
+            ]
+        finally:
+            conn.close()
+        if reverse:
+            rows.reverse()
+        return rows
+
+
+def register_run(date_dir, params):
+    """
+    シミュレーション実行後にカタログへ登録する
+
+    カタログの更新に失敗してもシミュレーション結果自体は保存済みなので、
+    エラーは表示するだけにする（次回の refresh() か rescan() で取り込まれる）。
+    """
+    try:
+        RunCatalog().register_run(date_dir, params)
+    except Exception as ex:
+        print(f"カタログ登録エラー: {str(ex)}")
+        traceback.print_exc()
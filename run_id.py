@@ -0,0 +1,55 @@
+# run_id.py
+import datetime
+import os
+import threading
+
+from run_catalog import DATA_DIR
+
+# このプロセスで最後に割り当てたID（マイクロ秒単位の時刻）
+_last_micros = 0
+_lock = threading.Lock()
+
+
+def _format_run_id(micros):
+    """マイクロ秒単位の時刻を実行ID（YYYYmmddHHMMSS_ffffff）にする"""
+    seconds, fraction = divmod(micros, 1_000_000)
+    return datetime.datetime.fromtimestamp(seconds).strftime("%Y%m%d%H%M%S") + f"_{fraction:06d}"
+
+
+def allocate_run_dir(data_dir=DATA_DIR):
+    """
+    重複しない実行ディレクトリを作成し、そのIDとパスを返す
+
+    IDは時刻（マイクロ秒まで）なので文字列順に並べると作成順になる。
+    ディレクトリは os.mkdir で作成し、既に存在する場合（同時刻に別プロセスが
+    作成した場合）は1マイクロ秒ずらして作り直すので、並列実行でも衝突しない。
+
+    Parameters:
+    -----------
+    data_dir : str
+        実行ディレクトリを作成する親ディレクトリ
+
+    Returns:
+    --------
+    tuple of (str, str)
+        (実行ID, 実行ディレクトリのパス)
+    """
+    global _last_micros
+
+    os.makedirs(data_dir, exist_ok=True)
+
+    now = datetime.datetime.now()
+    micros = int(now.timestamp()) * 1_000_000 + now.microsecond
+    with _lock:
+        micros = max(micros, _last_micros + 1)
+        while True:
+            run_id = _format_run_id(micros)
+            run_dir = os.path.join(data_dir, run_id)
+            try:
+                os.mkdir(run_dir)
+                break
+            except FileExistsError:
+                micros += 1
+        _last_micros = micros
+
+    return run_id, run_dir
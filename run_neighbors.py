@@ -0,0 +1,232 @@
+# run_neighbors.py
+import threading
+import warnings
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+from run_catalog import NUMERIC_PARAM_NAMES, PARAM_NAMES, RunCatalog
+from run_query import TEXT_PARAM_NAMES
+
+# 前回の構築後に追加された実行がこの割合を超えたら木を作り直す
+REBUILD_RATIO = 0.1
+
+# 近い実行を返す既定の件数
+NEIGHBOR_COUNT = 10
+
+
+def _to_number(value):
+    """パラメータの値を数値にする（数値でない・範囲指定などの場合はNone）"""
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ParamEncoder:
+    """
+    シミュレーションパラメータを正規化した数値ベクトルにする
+
+    数値のパラメータは fit() した実行の平均・標準偏差で正規化し、文字列のパラメータ
+    （基板材料・レジストタイプ）は値が違えば距離1になるよう one-hot にして並べる。
+    値がない（または数値として読めない）パラメータは平均で埋める。
+    """
+
+    def __init__(self):
+        self.mean = None
+        self.std = None
+        self.categories = {}  # 文字列パラメータ名 -> 値のリスト
+
+    def numbers(self, rows):
+        """数値のパラメータを (実行数, パラメータ数) の配列にする（値がない所はNaN）"""
+        return np.array(
+            [
+                row["numbers"] if "numbers" in row
+                else [_to_number(row["params"].get(name)) for name in NUMERIC_PARAM_NAMES]
+                for row in rows
+            ],
+            dtype=np.float64
+        ).reshape(len(rows), len(NUMERIC_PARAM_NAMES))
+
+    def fit(self, rows, numbers=None):
+        """正規化の平均・標準偏差と、文字列パラメータの値の一覧を求める"""
+        if numbers is None:
+            numbers = self.numbers(rows)
+        with warnings.catch_warnings():
+            # 全ての実行で値がないパラメータはNaNになるので、後で0と1に置き換える
+            warnings.simplefilter("ignore", RuntimeWarning)
+            mean = np.nanmean(numbers, axis=0)
+            std = np.nanstd(numbers, axis=0)
+        self.mean = np.nan_to_num(mean, nan=0.0)
+        std = np.nan_to_num(std, nan=0.0)
+        self.std = np.where(std > 0, std, 1.0)
+        self.categories = {
+            name: sorted({str(row["params"][name]) for row in rows if name in row["params"]})
+            for name in TEXT_PARAM_NAMES
+        }
+        return self
+
+    def transform(self, rows, numbers=None):
+        """実行ごとのパラメータを正規化した座標の配列にする"""
+        if numbers is None:
+            numbers = self.numbers(rows)
+        numbers = np.where(np.isnan(numbers), self.mean, numbers)
+        parts = [(numbers - self.mean) / self.std]
+        for name in TEXT_PARAM_NAMES:
+            # 値が違えば距離が1になるよう、one-hot の値を sqrt(1/2) にする
+            lookup = {value: i for i, value in enumerate(self.categories[name])}
+            one_hot = np.zeros((len(rows), len(lookup)))
+            for r, row in enumerate(rows):
+                i = lookup.get(str(row["params"].get(name)))
+                if i is not None:
+                    one_hot[r, i] = np.sqrt(0.5)
+            parts.append(one_hot)
+        return np.hstack(parts)
+
+    def vector(self, params):
+        """パラメータを正規化した座標にする"""
+        return self.transform([{"params": params}])[0]
+
+    def knows_categories(self, params):
+        """文字列パラメータの値が fit() で見た値だけかどうか"""
+        return all(
+            name not in params or str(params[name]) in self.categories[name]
+            for name in TEXT_PARAM_NAMES
+        )
+
+
+class RunNeighborIndex:
+    """
+    パラメータ空間で近い過去の実行を探すk近傍探索の索引
+
+    パラメータは ParamEncoder で正規化した座標にして距離を測る。
+    scipy があればKD木、なければnumpyの総当たりで探す。構築後に追加された実行は
+    別に持って総当たりで探し、一定数たまったら作り直す（refresh() で差分を取り込む）。
+    """
+
+    def __init__(self, catalog=None):
+        self.catalog = catalog or RunCatalog()
+        self._lock = threading.Lock()
+        self._encoder = ParamEncoder()
+        self._rows = []           # 木に入っている実行 {"date_dir", "params"}
+        self._points = None       # 木に入っている実行の正規化した座標
+        self._tree = None
+        self._pending_rows = []   # 構築後に追加された実行
+        self._pending_points = []
+        self._date_dirs = set()
+        self._last_date_dir = None
+
+    def _build(self, rows):
+        """全ての実行から木を作り直す（ロックを取った状態で呼ぶ）"""
+        numbers = self._encoder.numbers(rows)
+        self._encoder.fit(rows, numbers)
+        self._rows = rows
+        self._points = self._encoder.transform(rows, numbers)
+        self._tree = cKDTree(self._points) if cKDTree is not None and len(rows) else None
+        self._pending_rows = []
+        self._pending_points = []
+        self._date_dirs = {row["date_dir"] for row in rows}
+        self._last_date_dir = max(self._date_dirs) if rows else None
+
+    def refresh(self):
+        """
+        カタログの変化を取り込む
+
+        前回より後に作られた実行だけを読み込んで追加する。実行が削除された、または
+        古い日付の実行が取り込まれた場合と、追加分が一定数を超えた場合は作り直す。
+
+        Returns:
+        --------
+        int
+            追加した実行の数
+        """
+        total = self.catalog.count({})
+        with self._lock:
+            if self._points is None:
+                self._build(self.catalog.runs_after())
+                return len(self._rows)
+
+            new_rows = self.catalog.runs_after(self._last_date_dir)
+            known = len(self._date_dirs)
+            if known + len(new_rows) != total:
+                self._build(self.catalog.runs_after())
+                return len(new_rows)
+            if not new_rows:
+                return 0
+
+            if (not all(self._encoder.knows_categories(row["params"]) for row in new_rows)
+                    or len(self._pending_rows) + len(new_rows) > REBUILD_RATIO * max(len(self._rows), 1)):
+                self._build(self._rows + self._pending_rows + new_rows)
+                return len(new_rows)
+
+            for row in new_rows:
+                self._pending_rows.append(row)
+                self._pending_points.append(self._encoder.vector(row["params"]))
+                self._date_dirs.add(row["date_dir"])
+            self._last_date_dir = new_rows[-1]["date_dir"]
+            return len(new_rows)
+
+    def query(self, params, k=NEIGHBOR_COUNT):
+        """
+        パラメータに近い順に過去の実行を返す
+
+        Parameters:
+        -----------
+        params : dict
+            パラメータ名 -> 値（数値として読めない値・範囲指定などは無視する）
+        k : int
+            返す件数
+
+        Returns:
+        --------
+        list of dict
+            {"date_dir", "params", "distance"} のリスト（距離の近い順）
+        """
+        params = {name: value for name, value in params.items() if name in PARAM_NAMES}
+        with self._lock:
+            if self._points is None:
+                return []
+            target = self._encoder.vector(params)
+            candidates = []
+
+            count = min(k, len(self._rows))
+            if count:
+                if self._tree is not None:
+                    distances, indices = self._tree.query(target, k=count)
+                    distances, indices = np.atleast_1d(distances), np.atleast_1d(indices)
+                else:
+                    distances = np.sqrt(((self._points - target) ** 2).sum(axis=1))
+                    indices = np.argpartition(distances, count - 1)[:count]
+                    distances = distances[indices]
+                candidates += [(float(d), self._rows[i]) for d, i in zip(distances, indices)]
+
+            if self._pending_points:
+                distances = np.sqrt(((np.array(self._pending_points) - target) ** 2).sum(axis=1))
+                candidates += [(float(d), row) for d, row in zip(distances, self._pending_rows)]
+
+        candidates.sort(key=lambda item: (item[0], item[1]["date_dir"]))
+        return [
+            {"date_dir": row["date_dir"], "params": row["params"], "distance": distance}
+            for distance, row in candidates[:k]
+        ]
+
+
+# プロセス全体で共有する索引
+_neighbor_index = None
+_neighbor_index_lock = threading.Lock()
+
+
+def get_neighbor_index():
+    """プロセス全体で共有するk近傍探索の索引を返す（呼ぶたびにカタログの差分を取り込む）"""
+    global _neighbor_index
+    with _neighbor_index_lock:
+        if _neighbor_index is None:
+            _neighbor_index = RunNeighborIndex()
+    _neighbor_index.refresh()
+    return _neighbor_index
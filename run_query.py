@@ -0,0 +1,206 @@
+# run_query.py
+import re
+
+from sweep import parse_sweep_value
+
+# 文字列として扱うパラメータ（それ以外は数値として比較する）
+TEXT_PARAM_NAMES = ("substrate_material", "resist_type")
+
+_COMPARISON = re.compile(r"^(>=|<=|>|<)\s*(.+)$")
+_TOLERANCE = re.compile(r"^(.+?)\s*(?:±|\+-|\+/-)\s*(.+)$")
+_WILDCARD_CHARS = ("*", "?", "[")
+
+
+def is_numeric_param(name):
+    """パラメータを数値として比較するかどうか"""
+    return name not in TEXT_PARAM_NAMES
+
+
+def _number(name, text):
+    """検索条件の数値を読み取る（読めない場合は分かりやすいエラーにする）"""
+    try:
+        return float(text)
+    except ValueError:
+        raise ValueError(f"{name} の検索条件 '{text}' は数値ではありません")
+
+
+class Condition:
+    """
+    1つのパラメータに対する検索条件
+
+    kind は "eq"（一致）, "range"（範囲・許容差・大小比較）, "in"（いずれか）,
+    "glob"（ワイルドカード）のいずれか。数値のパラメータは数値列、文字列の
+    パラメータは文字列列に対する条件になり、どちらもパラメータごとの索引を使う。
+    """
+
+    def __init__(self, name, kind, value=None, low=None, high=None,
+                 low_inclusive=True, high_inclusive=True):
+        self.name = name
+        self.kind = kind
+        self.value = value
+        self.low = low
+        self.high = high
+        self.low_inclusive = low_inclusive
+        self.high_inclusive = high_inclusive
+
+    def sql(self):
+        """
+        WHERE句の条件と値を返す
+
+        従来の検索と同じく、そのパラメータを保存していない実行は一致とみなす。
+
+        Returns:
+        --------
+        tuple of (str, list)
+        """
+        text_column = f"p_{self.name}"
+        column = f"n_{self.name}" if is_numeric_param(self.name) and self.kind != "glob" else text_column
+
+        if self.kind == "eq":
+            clause, values = f"{column} = ?", [self.value]
+        elif self.kind == "in":
+            placeholders = ", ".join("?" for _ in self.value)
+            clause, values = f"{column} IN ({placeholders})", list(self.value)
+        elif self.kind == "glob":
+            clause, values = f"{column} GLOB ?", [self.value]
+        else:
+            parts, values = [], []
+            if self.low is not None:
+                parts.append(f"{column} {'>=' if self.low_inclusive else '>'} ?")
+                values.append(self.low)
+            if self.high is not None:
+                parts.append(f"{column} {'<=' if self.high_inclusive else '<'} ?")
+                values.append(self.high)
+            clause = " AND ".join(parts)
+        return f"(({clause}) OR {text_column} IS NULL)", values
+
+
+def parse_condition(name, text):
+    """
+    入力欄の文字列を検索条件にする
+
+    書式:
+      （空欄）, *        条件なし
+      50                 一致（数値は 50 と 50.0 を区別しない）
+      40..60             範囲（両端を含む。40.. や ..60 も可）
+      >=40, <60 など     大小比較
+      50±2, 50+-2        許容差
+      Si,Cr / Si|Cr      いずれかに一致
+      40:60:10           スイープ指定の値のいずれかに一致
+      Si*, ポジ?         ワイルドカード（* は任意の文字列、? は任意の1文字）
+
+    Returns:
+    --------
+    Condition or None
+        条件なしの場合はNone
+    """
+    text = str(text).strip()
+    if text in ("", "*"):
+        return None
+
+    numeric = is_numeric_param(name)
+
+    if any(c in text for c in _WILDCARD_CHARS):
+        return Condition(name, "glob", value=text)
+
+    if "," in text or "|" in text or text.count(":") == 2:
+        if text.count(":") == 2:
+            items = parse_sweep_value(text)
+        else:
+            items = [item.strip() for item in re.split(r"[,|]", text) if item.strip()]
+        values = [_number(name, item) for item in items] if numeric else items
+        return Condition(name, "in", value=values)
+
+    if not numeric:
+        return Condition(name, "eq", value=text)
+
+    match = _COMPARISON.match(text)
+    if match:
+        op, number = match.group(1), _number(name, match.group(2))
+        if op.startswith(">"):
+            return Condition(name, "range", low=number, low_inclusive=(op == ">="))
+        return Condition(name, "range", high=number, high_inclusive=(op == "<="))
+
+    match = _TOLERANCE.match(text)
+    if match:
+        center, tolerance = _number(name, match.group(1)), abs(_number(name, match.group(2)))
+        return Condition(name, "range", low=center - tolerance, high=center + tolerance)
+
+    if ".." in text:
+        low_text, high_text = (part.strip() for part in text.split("..", 1))
+        low = _number(name, low_text) if low_text else None
+        high = _number(name, high_text) if high_text else None
+        if low is None and high is None:
+            return None
+        if low is not None and high is not None and high < low:
+            raise ValueError(f"{name} の範囲 '{text}' の終わりが始まりより小さくなっています")
+        return Condition(name, "range", low=low, high=high)
+
+    return Condition(name, "eq", value=_number(name, text))
+
+
+class RunQuery:
+    """
+    実行カタログへの検索条件と並べ替え順
+
+    sort_by を指定するとそのパラメータの値の順（数値のパラメータは数値順）に、
+    指定しない場合は実行ディレクトリ名（作成順）に並べる。値を保存していない実行は
+    昇順・降順のどちらでも最後になる。
+    """
+
+    def __init__(self, conditions=None, sort_by=None, descending=False):
+        # sort_by はSQLの列名に埋め込むので、カタログのパラメータ名に限る
+        from run_catalog import PARAM_NAMES
+        if sort_by is not None and sort_by not in PARAM_NAMES:
+            raise ValueError(f"並べ替えに使えないパラメータです: {sort_by}")
+        self.conditions = list(conditions or [])
+        self.sort_by = sort_by
+        self.descending = descending
+
+    @classmethod
+    def from_fields(cls, fields, sort_by=None, descending=False):
+        """
+        入力欄の値（パラメータ名 -> 文字列）から検索条件を作る
+
+        Parameters:
+        -----------
+        fields : dict
+            パラメータ名 -> parse_condition() の書式の文字列
+        """
+        conditions = []
+        for name, text in fields.items():
+            if text is None:
+                continue
+            condition = parse_condition(name, text)
+            if condition is not None:
+                conditions.append(condition)
+        return cls(conditions, sort_by, descending)
+
+    def where(self):
+        """WHERE句の条件のリストと値を返す"""
+        clauses, values = [], []
+        for condition in self.conditions:
+            clause, condition_values = condition.sql()
+            clauses.append(clause)
+            values.extend(condition_values)
+        return clauses, values
+
+    def sort_expression(self):
+        """並べ替えに使う式（保存していない実行は空文字にする）"""
+        if self.sort_by is None:
+            return None
+        if is_numeric_param(self.sort_by):
+            return f"COALESCE(n_{self.sort_by}, p_{self.sort_by}, '')"
+        return f"COALESCE(p_{self.sort_by}, '')"
+
+    def missing_last_expression(self):
+        """
+        値を保存していない実行を最後にするため、sort_expression() の前に並べる式
+
+        sort_expression() と同じ向きに並べたときに、昇順では (値が空) が、
+        降順では (値が空でない) が先頭の列になり、どちらの向きでも空の実行が最後になる。
+        """
+        sort_expression = self.sort_expression()
+        if sort_expression is None:
+            return None
+        return f"({sort_expression} {'<>' if self.descending else '='} '')"
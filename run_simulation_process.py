@@ -1,39 +1,74 @@
 # run_simulation_process.py
 import sys
 import json
-import os
 import traceback
 
+from checkpoint import RunClaimedError, format_run_id_line
+from progress import format_progress_line
+from result_channel import copy_result
+from simulation_runner import execute_simulation, prepare_run_dir
+
+
 def main():
     """
     コマンドライン引数からパラメータを読み取り、シミュレーションを実行し、結果を保存する
     引数1: 入力パラメータJSONファイルのパス
     引数2: 出力結果JSONファイルのパス
+    --run-id ID: 中断した実行を最後のチェックポイントから再開する
+    
+    実行IDは "RUN_ID <ID>" の行として標準出力に書くので、タイムアウトや異常終了の後は
+    同じ引数に --run-id を付けて起動し直せば続きから計算する。
+    
+    第1引数が "batch" の場合はパラメータセットのファイルを一括実行する
+    （python run_simulation_process.py batch <JSONL/CSV> <JSONL/Parquet> [-j N]）
     """
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from batch_runner import batch_main
+        sys.exit(batch_main(sys.argv[2:]))
+    
     try:
         # 引数の取得
-        if len(sys.argv) != 3:
-            print("使用法: python run_simulation_process.py <入力パラメータファイル> <出力結果ファイル>")
+        args = sys.argv[1:]
+        run_id = None
+        if "--run-id" in args:
+            index = args.index("--run-id")
+            run_id = args[index + 1] if index + 1 < len(args) else None
+            del args[index:index + 2]
+        result_file = args[1] if len(args) > 1 else None
+        if len(args) != 2 or ("--run-id" in sys.argv and not run_id):
+            print("使用法: python run_simulation_process.py <入力パラメータファイル> <出力結果ファイル> [--run-id 実行ID]")
+            print("       python run_simulation_process.py batch <パラメータセットファイル> <出力ファイル> [-j ワーカー数]")
             sys.exit(1)
             
-        param_file = sys.argv[1]
-        result_file = sys.argv[2]
+        param_file = args[0]
         
         # パラメータの読み込み
         with open(param_file, 'r', encoding='utf-8') as f:
             simu_parameters = json.load(f)
+        print(format_progress_line(5, "パラメータ読み込み完了"), flush=True)
+        
+        # 実行ディレクトリ（チェックポイントの保存先）を用意し、IDを親プロセスに伝える
+        run_id, run_dir = prepare_run_dir(run_id, simu_parameters)
+        print(format_run_id_line(run_id), flush=True)
         
         # ここで必要なインポートを行う（GUIプロセスと分離するため）
         from factories.SimulationFactory import SimulationFactory
         
-        # シミュレーションオブジェクトの作成と実行
-        simulation = SimulationFactory.cleate_simulation()
-        result = simulation.run_simulation(simu_parameters)
+        # シミュレーションの実行と結果の保存（前回の実行が完了済みなら計算し直さない）
+        report = lambda percent, phase: print(format_progress_line(percent, phase), flush=True)
+        try:
+            output_path = execute_simulation(SimulationFactory, simu_parameters, run_id, run_dir, progress=report)
+        except RunClaimedError as ex:
+            # 同じ中断した実行を別のプロセスが先に再開した場合は新しい実行として計算する
+            print(f"{str(ex)}。新しい実行として計算します")
+            run_id, run_dir = prepare_run_dir(None, simu_parameters)
+            print(format_run_id_line(run_id), flush=True)
+            output_path = execute_simulation(SimulationFactory, simu_parameters, run_id, run_dir, progress=report)
         
-        # 結果をJSONファイルに保存
-        with open(result_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
+        # 親プロセスにはJSONだけを渡す（配列は実行ディレクトリの .npy をそのまま参照させる）
+        copy_result(output_path, result_file)
             
+        print(format_progress_line(100, "完了"), flush=True)
         print(f"シミュレーション完了、結果を {result_file} に保存しました")
         sys.exit(0)
         
@@ -44,6 +79,8 @@ def main():
         }
         
         # エラー情報をファイルに保存
+        if result_file is None:
+            sys.exit(1)
         try:
             with open(result_file, 'w', encoding='utf-8') as f:
                 json.dump(error_info, f, ensure_ascii=False, indent=2)
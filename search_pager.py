@@ -0,0 +1,111 @@
+# search_pager.py
+from run_catalog import PAGE_SIZE
+
+
+class SearchResultPager:
+    """
+    検索結果を1ページずつ取り出して表示するためのページ送り
+
+    前後のページは表示中のページの端の行を起点に取り出す（キーセット方式）。画面に作るのは
+    表示中のページの行だけになる。
+    """
+
+    def __init__(self, fetch, total, page_size=PAGE_SIZE):
+        """
+        Parameters:
+        -----------
+        fetch : callable
+            fetch(after, before, limit) で1ページ分の結果を表示順で返す関数
+            （after / before は表示中のページの端の行）
+        total : int
+            結果の総件数
+        page_size : int
+            1ページの件数
+        """
+        self._fetch = fetch
+        self.total = total
+        self.page_size = page_size
+        self.start = 0  # 表示中のページの先頭が何件目か（0始まり）
+        self.rows = fetch(None, None, page_size)
+
+    @classmethod
+    def from_catalog(cls, catalog, params, page_size=PAGE_SIZE):
+        """カタログの検索結果をページ送りする"""
+        return cls(
+            lambda after, before, limit: catalog.search_page(
+                params,
+                after["date_dir"] if after is not None else None,
+                before["date_dir"] if before is not None else None,
+                limit
+            ),
+            catalog.count(params),
+            page_size
+        )
+
+    @classmethod
+    def from_query(cls, catalog, run_query, page_size=PAGE_SIZE):
+        """カタログを run_query.RunQuery（範囲・並べ替えなど）で検索した結果をページ送りする"""
+        return cls(
+            lambda after, before, limit: catalog.query_page(run_query, after, before, limit),
+            catalog.count_query(run_query),
+            page_size
+        )
+
+    @classmethod
+    def from_list(cls, results, page_size=PAGE_SIZE, keep_order=False):
+        """
+        手元にある結果のリスト（スイープの結果、近い順の実行など）をページ送りする
+
+        keep_order がFalseの場合は実行ディレクトリ名の順に並べ替える。
+        同じ実行ディレクトリの結果（キャッシュから返ったスイープの点など）は最初の1件だけを
+        残す（ページの端の行と選択状態を実行ディレクトリ名で区別するため）。
+        """
+        unique = {}
+        for r in results:
+            unique.setdefault(r["date_dir"], r)
+        results = list(unique.values())
+        if not keep_order:
+            results.sort(key=lambda r: r["date_dir"])
+        positions = {r["date_dir"]: i for i, r in enumerate(results)}
+
+        def fetch(after, before, limit):
+            if before is not None:
+                stop = positions[before["date_dir"]]
+                return results[max(0, stop - limit):stop]
+            begin = positions[after["date_dir"]] + 1 if after is not None else 0
+            return results[begin:begin + limit]
+
+        return cls(fetch, len(results), page_size)
+
+    @property
+    def has_next(self):
+        """次のページがあるかどうか"""
+        return self.start + len(self.rows) < self.total
+
+    @property
+    def has_prev(self):
+        """前のページがあるかどうか"""
+        return self.start > 0
+
+    def next_page(self):
+        """次のページに進む"""
+        if not self.rows or not self.has_next:
+            return
+        rows = self._fetch(self.rows[-1], None, self.page_size)
+        if rows:
+            self.start += len(self.rows)
+            self.rows = rows
+
+    def prev_page(self):
+        """前のページに戻る"""
+        if not self.rows or not self.has_prev:
+            return
+        rows = self._fetch(None, self.rows[0], self.page_size)
+        self.start = max(0, self.start - len(rows))
+        self.rows = rows
+
+    def describe(self):
+        """「全N件中 a〜b件目」の表示用文字列"""
+        if not self.rows:
+            return f"検索結果: {self.total}件"
+        return f"検索結果: {self.total}件中 {self.start + 1}〜{self.start + len(self.rows)}件目"
@@ -0,0 +1,244 @@
+# simulation_runner.py
+import json
+import os
+import traceback
+import time
+
+from checkpoint import Checkpoint, RunClaim, RunClaimedError, supports_checkpoint
+from result_cache import ResultCache
+from result_channel import write_result
+from run_catalog import DATA_DIR, register_run
+from run_id import allocate_run_dir
+
+
+def load_simulation_module():
+    """
+    シミュレーションモジュールをインポートする
+
+    Returns:
+    --------
+    SimulationFactory クラス、simulation モジュール、どちらもなければNone
+    """
+    try:
+        from factories.SimulationFactory import SimulationFactory
+        return SimulationFactory
+    except ImportError:
+        try:
+            import simulation
+            return simulation
+        except ImportError:
+            return None
+
+
+def simulation_function(simulation_module):
+    """シミュレーションモジュールから1件を実行する関数 run(params[, checkpoint]) を取り出す"""
+    if hasattr(simulation_module, "cleate_simulation"):
+        return simulation_module.cleate_simulation().run_simulation
+    return simulation_module.simulation
+
+
+def prepare_run_dir(run_id, params):
+    """
+    実行ディレクトリを用意する（実行IDを指定した場合は既存のディレクトリで再開する）
+
+    Returns:
+    --------
+    tuple of (str, str)
+        (実行ID, 実行ディレクトリのパス)
+    """
+    if run_id is None:
+        run_id, run_dir = allocate_run_dir()
+    else:
+        run_dir = os.path.join(DATA_DIR, run_id)
+
+    input_dir = os.path.join(run_dir, "data", "input")
+    os.makedirs(input_dir, exist_ok=True)
+    os.makedirs(os.path.join(run_dir, "data", "output"), exist_ok=True)
+
+    input_path = os.path.join(input_dir, "input.json")
+    if os.path.exists(input_path):
+        # 再開時は前回と同じパラメータでなければならない
+        with open(input_path, 'r', encoding='utf-8') as f:
+            saved_parameters = json.load(f)
+        if saved_parameters != params:
+            raise ValueError(f"実行 {run_id} は別のパラメータで開始されているため再開できません")
+    else:
+        with open(input_path, 'w', encoding='utf-8') as f:
+            json.dump(params, f, ensure_ascii=False, indent=4)
+
+    return run_id, run_dir
+
+
+def execute_simulation(simulation_module, params, run_id, run_dir, progress=None):
+    """
+    用意した実行ディレクトリでシミュレーションを実行し、結果を output.json に保存する
+
+    前回の実行が結果の保存まで終わっていた場合は計算し直さない。シミュレーションが
+    チェックポイントに対応していれば実行ディレクトリに途中経過を保存しながら計算する。
+    実行中は RunClaim で実行ディレクトリを押さえ、別のプロセスが実行中の場合は
+    RunClaimedError を送出する。
+
+    Parameters:
+    -----------
+    simulation_module
+        load_simulation_module() でインポートしたシミュレーションモジュール
+    params : dict
+        シミュレーションパラメータ
+    run_id, run_dir : str
+        prepare_run_dir() の戻り値
+    progress : callable, optional
+        進捗通知用の関数 progress(percent, phase)
+
+    Returns:
+    --------
+    str
+        output.json のパス
+    """
+    def report(percent, phase):
+        if progress is not None:
+            progress(percent, phase)
+
+    claim = RunClaim(run_dir)
+    if not claim.acquire():
+        raise RunClaimedError(f"実行 {run_id} は別のプロセスで実行中です")
+    try:
+        output_path = os.path.join(run_dir, "data", "output", "output.json")
+        if os.path.exists(output_path):
+            print(f"実行 {run_id} は完了済みです")
+            return output_path
+
+        run = simulation_function(simulation_module)
+        report(10, "シミュレーション実行中")
+        if supports_checkpoint(run):
+            # シミュレーションの進捗（チェックポイントの percent）を 10〜90% に割り当てて伝える
+            checkpoint = Checkpoint(
+                run_dir, params=params,
+                on_progress=lambda percent: report(10 + 80 * min(max(percent, 0), 100) / 100, "シミュレーション実行中")
+            )
+            result = run(params, checkpoint=checkpoint)
+        else:
+            print("警告: このシミュレーションはチェックポイントに対応していないため、中断すると最初からやり直しになります")
+            checkpoint = None
+            result = run(params)
+        report(90, "結果を保存中")
+
+        # 実行ディレクトリに結果を保存してからチェックポイントを消す
+        # （配列は .npy に出し、JSONには小さなメタデータだけを書く）
+        write_result(result, output_path)
+        if checkpoint is not None:
+            checkpoint.clear()
+        register_run(run_id, params)
+        return output_path
+    finally:
+        claim.release()
+
+
+# 別プロセスで実行するシミュレーション関数
+def run_simulation_in_process(params, progress=None, force=False, simulation_module=None):
+    """
+    別プロセスでシミュレーションを実行する関数
+
+    Parameters:
+    -----------
+    params : dict
+        シミュレーションパラメータ
+    progress : callable, optional
+        進捗通知用の関数 progress(percent, phase)
+    force : bool
+        Trueの場合はキャッシュを使わずに再実行する
+    simulation_module : optional
+        load_simulation_module() でインポート済みのシミュレーションモジュール
+        （Noneの場合はテスト用のダミー処理を行う）
+
+    Returns:
+    --------
+    dict
+        シミュレーション結果
+    """
+    def report(percent, phase):
+        if progress is not None:
+            progress(percent, phase)
+    
+    try:
+        print("別プロセスでシミュレーション開始...")
+        report(0, "準備中")
+        
+        # 同じパラメータの結果があればそのまま返す
+        cache = ResultCache()
+        if not force:
+            cached = cache.lookup(params)
+            if cached is not None:
+                print(f"キャッシュヒット: {cached['date_dir']}")
+                report(100, "キャッシュから取得")
+                return cached
+        
+        if simulation_module is not None:
+            # 単発実行（run_simulation_process.py）と同じ手順で実際のシミュレーションを実行する
+            run_id, run_dir = prepare_run_dir(None, params)
+            output_path = execute_simulation(simulation_module, params, run_id, run_dir, progress=report)
+            cache.store(params, run_id)
+            
+            # 配列は .npy の参照のまま返す（キャッシュヒット時と同じ形）
+            with open(output_path, "r", encoding="utf-8") as f:
+                sim_result = json.load(f)
+            report(100, "完了")
+            return {"date_dir": run_id, "params": params, "sim_result": sim_result}
+        
+        # シミュレーション結果を保存するディレクトリを作成
+        date_str, data_dir = allocate_run_dir()
+        input_dir = os.path.join(data_dir, "data", "input")
+        output_dir = os.path.join(data_dir, "data", "output")
+        
+        os.makedirs(input_dir, exist_ok=True)
+        os.makedirs(output_dir, exist_ok=True)
+        
+        # 入力パラメータをJSONとして保存
+        with open(os.path.join(input_dir, "input.json"), "w") as f:
+            json.dump(params, f, indent=4)
+        report(10, "入力パラメータ保存完了")
+            
+        # シミュレーションモジュールがない環境ではテスト用のダミー結果を返す
+        print("シミュレーション実行中（テスト用ダミー処理）...")
+        dummy_steps = 10
+        for step in range(dummy_steps):
+            time.sleep(0.3)  # シミュレーション時間のシミュレーション
+            report(10 + 80 * (step + 1) / dummy_steps, "シミュレーション実行中")
+        
+        # テスト用の出力データを生成
+        beam_energy = float(params.get("beam_energy", 50))
+        beam_current = float(params.get("beam_current", 10))
+        beam_size = float(params.get("beam_size", 20))
+        resist_thickness = float(params.get("resist_thickness", 300))
+        pattern_width = float(params.get("pattern_width", 100))
+        
+        # テスト用のシミュレーション結果データ
+        sim_result = {
+            "exposure_time": beam_current * resist_thickness / (beam_energy * 1000),  # 単位: ms
+            "development_depth": resist_thickness * 0.9,  # 単位: nm
+            "pattern_width_actual": pattern_width * (1 + 0.05 * (beam_size / 20 - 1)),  # 単位: nm
+            "beam_spot_profile": [beam_size * 0.5, beam_size, beam_size * 1.5]  # 単位: nm
+        }
+        
+        # シミュレーション結果をJSONとして保存
+        report(90, "結果を保存中")
+        with open(os.path.join(output_dir, "output.json"), "w") as f:
+            json.dump(sim_result, f, indent=4)
+            
+        # 検索用カタログとキャッシュに登録
+        register_run(date_str, params)
+        cache.store(params, date_str)
+        
+        result = {
+            "date_dir": date_str,
+            "params": params,
+            "sim_result": sim_result
+        }
+        
+        report(100, "完了")
+        print("シミュレーション完了、結果を返します")
+        return result
+        
+    except Exception as e:
+        print(f"シミュレーション実行中のエラー: {str(e)}")
+        traceback.print_exc()
+        return {"error": str(e), "traceback": traceback.format_exc()}
@@ -0,0 +1,456 @@
+# simulation_service.py
+import argparse
+import collections
+import concurrent.futures
+import json
+import os
+import threading
+import time
+import traceback
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from job_runner import PRIORITY_INTERACTIVE, PRIORITY_SWEEP, JobRunner
+from run_catalog import DATA_DIR
+
+# サービスの既定の待ち受けアドレス（ローカルからのみ接続を受け付ける）
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+# GUIやスクリプトがサービスの場所を知るための環境変数
+SERVICE_URL_ENV = "SIMULATION_SERVICE_URL"
+
+# 状態を問い合わせる間隔（秒）
+POLL_INTERVAL = 0.5
+
+# ジョブ一覧から外れた後も結果を返せるよう覚えておく完了ジョブの数（古いものから忘れる）
+MAX_FINISHED_RUNS = 10000
+
+PRIORITIES = {"interactive": PRIORITY_INTERACTIVE, "sweep": PRIORITY_SWEEP}
+
+
+def priority_name(priority):
+    """JobRunner の優先度をAPIの優先度名にする"""
+    return "sweep" if priority >= PRIORITY_SWEEP else "interactive"
+
+
+def job_to_dict(job):
+    """ジョブの状態をJSONにできる形にする"""
+    return {
+        "job_id": job.job_id,
+        "status": job.status,
+        "priority": job.priority,
+        "percent": job.percent,
+        "phase": job.phase,
+        "eta": job.eta,
+        "error": str(job.error) if job.error is not None else None,
+        "submitted_at": job.submitted_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at,
+        "params": job.params,
+    }
+
+
+def read_run_result(date_dir, data_dir=DATA_DIR):
+    """
+    実行ディレクトリから結果を読み込む（結果キャッシュのヒット時と同じ形）
+
+    Returns:
+    --------
+    dict
+        {"date_dir", "params", "sim_result"}
+    """
+    run_data_dir = os.path.join(data_dir, date_dir, "data")
+    with open(os.path.join(run_data_dir, "input", "input.json"), "r", encoding="utf-8") as f:
+        params = json.load(f)
+    with open(os.path.join(run_data_dir, "output", "output.json"), "r", encoding="utf-8") as f:
+        sim_result = json.load(f)
+    return {"date_dir": date_dir, "params": params, "sim_result": sim_result}
+
+
+class _ServiceHandler(BaseHTTPRequestHandler):
+    """シミュレーションサービスのHTTP/JSON API"""
+
+    # 状態を流し続けるイベントストリームのためにHTTP/1.0（接続を閉じて終わりを示す）
+    protocol_version = "HTTP/1.0"
+
+    @property
+    def runner(self):
+        return self.server.job_runner
+
+    def log_message(self, format, *args):
+        # 状態の問い合わせのたびに出力しないよう、エラー以外は表示しない
+        pass
+
+    def _send_json(self, status, body):
+        """JSONの応答を返す"""
+        data = json.dumps(body, ensure_ascii=False, default=str).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_error(self, status, message):
+        self._send_json(status, {"error": message})
+
+    def _read_json(self):
+        """リクエスト本文のJSONを読み込む"""
+        length = int(self.headers.get("Content-Length") or 0)
+        if length == 0:
+            return {}
+        return json.loads(self.rfile.read(length).decode("utf-8"))
+
+    def _find_job(self, job_id_text):
+        """ジョブを探す（見つからない場合は404を返してNone）"""
+        try:
+            job = self.runner.jobs.get(int(job_id_text))
+        except ValueError:
+            job = None
+        if job is None:
+            self._send_error(404, f"ジョブ {job_id_text} が見つかりません")
+        return job
+
+    def _finished_run(self, job_id_text):
+        """ジョブ一覧から外れた完了済みジョブの実行ディレクトリ名（一覧にあればNone）"""
+        try:
+            job_id = int(job_id_text)
+        except ValueError:
+            return None
+        if job_id in self.runner.jobs:
+            return None
+        return self.server.finished_runs.get(job_id)
+
+    def _route(self):
+        """パスを (リソース, ジョブID, サブリソース) に分ける"""
+        parts = [p for p in self.path.split("?")[0].split("/") if p]
+        parts += [None] * (3 - len(parts))
+        return parts[:3]
+
+    def do_GET(self):
+        try:
+            resource, job_id, sub = self._route()
+            if resource == "health":
+                self._send_json(200, {"status": "ok", "workers": self.runner.max_concurrent})
+            elif resource == "jobs" and job_id is None:
+                self._send_json(200, [job_to_dict(job) for job in self.runner.active_jobs()])
+            elif resource == "jobs" and sub is None:
+                job = self._find_job(job_id)
+                if job is not None:
+                    self._send_json(200, job_to_dict(job))
+            elif resource == "jobs" and sub == "result":
+                date_dir = self._finished_run(job_id)
+                if date_dir is not None:
+                    # キュー表示から外れた古いジョブは実行ディレクトリから結果を読む
+                    self._send_json(200, read_run_result(date_dir))
+                    return
+                job = self._find_job(job_id)
+                if job is None:
+                    return
+                if job.status == "done":
+                    self._send_json(200, job.result)
+                elif job.finished:
+                    self._send_error(410, f"ジョブは {job.status} で終了しました: {job.error}")
+                else:
+                    self._send_error(409, "ジョブはまだ終わっていません")
+            elif resource == "jobs" and sub == "events":
+                job = self._find_job(job_id)
+                if job is not None:
+                    self._stream_events(job)
+            else:
+                self._send_error(404, f"不明なパスです: {self.path}")
+        except Exception as ex:
+            traceback.print_exc()
+            self._send_error(500, str(ex))
+
+    def _stream_events(self, job):
+        """
+        ジョブが終わるまで状態が変わるたびに1行のJSONを送る
+
+        クライアントが途中で切断した場合は何も送らずに終える（切れた接続に
+        500 を返そうとしない）。
+        """
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+            self.end_headers()
+            last = None
+            while True:
+                state = job_to_dict(job)
+                if state != last:
+                    self.wfile.write((json.dumps(state, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+                    last = state
+                if job.finished:
+                    break
+                time.sleep(POLL_INTERVAL)
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True
+
+    def do_POST(self):
+        try:
+            resource, job_id, _ = self._route()
+            if resource != "jobs" or job_id is not None:
+                self._send_error(404, f"不明なパスです: {self.path}")
+                return
+            body = self._read_json()
+            params = body.get("params")
+            if not isinstance(params, dict):
+                self._send_error(400, "params にシミュレーションパラメータを指定してください")
+                return
+            priority = PRIORITIES.get(body.get("priority", "interactive"))
+            if priority is None:
+                self._send_error(400, f"priority は {list(PRIORITIES)} のいずれかです")
+                return
+            job = self.runner.submit(
+                params,
+                on_done=self.server.remember_finished_run,
+                force=bool(body.get("force", False)),
+                priority=priority
+            )
+            self._send_json(202, job_to_dict(job))
+        except json.JSONDecodeError as ex:
+            self._send_error(400, f"JSONを読み込めません: {str(ex)}")
+        except Exception as ex:
+            traceback.print_exc()
+            self._send_error(500, str(ex))
+
+    def do_DELETE(self):
+        try:
+            resource, job_id, _ = self._route()
+            if resource != "jobs" or job_id is None:
+                self._send_error(404, f"不明なパスです: {self.path}")
+                return
+            job = self._find_job(job_id)
+            if job is not None:
+                self._send_json(200, {"cancelled": self.runner.cancel(job.job_id), "job": job_to_dict(job)})
+        except Exception as ex:
+            traceback.print_exc()
+            self._send_error(500, str(ex))
+
+
+class SimulationService:
+    """
+    ワーカープール・ジョブキュー・結果の保存を1つのプロセスにまとめたローカルサービス
+
+    複数のGUIやスクリプトがHTTP/JSONでジョブを投入し、状態と結果を受け取る。
+    ウォーム済みのワーカープールを共有するので、クライアントごとにシミュレーションの
+    インポートやプロセス起動の時間を払わなくて済む。結果は通常の実行と同じく
+    ../data、カタログ、結果キャッシュに保存される。
+
+    API:
+      GET    /health               サービスの状態
+      POST   /jobs                 {"params": {...}, "force": false, "priority": "interactive"|"sweep"}
+      GET    /jobs                 実行中・待機中・最近終わったジョブの一覧
+      GET    /jobs/<id>            ジョブの状態
+      GET    /jobs/<id>/events     終わるまで状態の変化を1行1JSONで流す
+      GET    /jobs/<id>/result     シミュレーション結果（一覧から外れたジョブは実行ディレクトリから読む）
+      DELETE /jobs/<id>            キャンセル
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, processes=None):
+        from worker_pool import SimulationWorkerPool
+
+        self.worker_pool = SimulationWorkerPool(processes)
+        self.job_runner = JobRunner(self.worker_pool)
+        self.server = ThreadingHTTPServer((host, port), _ServiceHandler)
+        self.server.daemon_threads = True
+        self.server.job_runner = self.job_runner
+        self.server.finished_runs = collections.OrderedDict()  # 完了したジョブのID -> 実行ディレクトリ名（古い順）
+        self.server.remember_finished_run = self._remember_finished_run
+
+    def _remember_finished_run(self, job):
+        """完了したジョブの実行ディレクトリを覚えておく（ジョブ一覧から外れた後の結果取得用）"""
+        date_dir = (job.result or {}).get("date_dir")
+        if date_dir is not None:
+            finished_runs = self.server.finished_runs
+            finished_runs[job.job_id] = date_dir
+            while len(finished_runs) > MAX_FINISHED_RUNS:
+                finished_runs.popitem(last=False)
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        """ワーカープールを起動してリクエストを受け付ける（shutdown() まで戻らない）"""
+        self.worker_pool.start()
+        print(f"シミュレーションサービス起動: {self.url}（ワーカー {self.worker_pool.processes} 個）")
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            self.worker_pool.shutdown()
+
+    def shutdown(self):
+        """サービスを停止する（別スレッドから呼ぶ）"""
+        self.server.shutdown()
+
+
+class SimulationServiceClient:
+    """シミュレーションサービスのクライアント"""
+
+    def __init__(self, url=None, timeout=10):
+        self.url = (url or os.environ.get(SERVICE_URL_ENV) or f"http://{DEFAULT_HOST}:{DEFAULT_PORT}").rstrip("/")
+        self.timeout = timeout
+
+    def _request(self, method, path, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        request = urllib.request.Request(
+            self.url + path,
+            data=data,
+            method=method,
+            headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                return json.loads(response.read().decode("utf-8"))
+        except urllib.error.HTTPError as ex:
+            try:
+                message = json.loads(ex.read().decode("utf-8")).get("error", str(ex))
+            except Exception:
+                message = str(ex)
+            raise RuntimeError(f"シミュレーションサービスのエラー ({ex.code}): {message}")
+
+    def health(self):
+        """サービスの状態（ワーカー数など）を返す"""
+        return self._request("GET", "/health")
+
+    def submit(self, params, force=False, priority="interactive"):
+        """ジョブを投入し、その状態を返す"""
+        return self._request("POST", "/jobs", {"params": params, "force": force, "priority": priority})
+
+    def jobs(self):
+        """実行中・待機中・最近終わったジョブの一覧を返す"""
+        return self._request("GET", "/jobs")
+
+    def status(self, job_id):
+        """ジョブの状態を返す"""
+        return self._request("GET", f"/jobs/{job_id}")
+
+    def result(self, job_id):
+        """終わったジョブのシミュレーション結果を返す"""
+        return self._request("GET", f"/jobs/{job_id}/result")
+
+    def cancel(self, job_id):
+        """ジョブをキャンセルする"""
+        return self._request("DELETE", f"/jobs/{job_id}")
+
+    def events(self, job_id):
+        """ジョブが終わるまで状態を1件ずつ返す"""
+        request = urllib.request.Request(f"{self.url}/jobs/{job_id}/events")
+        with urllib.request.urlopen(request) as response:
+            for line in response:
+                if line.strip():
+                    yield json.loads(line.decode("utf-8"))
+
+    def run(self, params, force=False, priority="interactive"):
+        """ジョブを投入して終わるまで待ち、結果を返す"""
+        job = self.submit(params, force, priority)
+        for state in self.events(job["job_id"]):
+            job = state
+        if job["status"] != "done":
+            raise RuntimeError(f"ジョブ {job['job_id']} は {job['status']} で終了しました: {job['error']}")
+        return self.result(job["job_id"])
+
+
+class ServiceWorkerPool:
+    """
+    シミュレーションサービスを SimulationWorkerPool と同じ使い方で使うためのアダプタ
+
+    JobRunner に渡すと、ジョブはこのプロセスではなくサービスのワーカーで実行される。
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.processes = client.health()["workers"]
+
+    def start(self):
+        return self
+
+    def restart(self):
+        return self
+
+    def shutdown(self):
+        pass
+
+    def health_check(self, timeout=10):
+        self.client.health()
+        return True
+
+    def submit(self, params, on_progress=None, force=False, priority=PRIORITY_INTERACTIVE):
+        """
+        ジョブをサービスに投入し、終わるまで状態を追いかけるFutureを返す
+
+        Futureをキャンセルするとサービスのジョブもキャンセルする。
+        """
+        job = self.client.submit(params, force=force, priority=priority_name(priority))
+        job_id = job["job_id"]
+        future = concurrent.futures.Future()
+
+        def cancel_remote(f):
+            if not f.cancelled():
+                return
+            try:
+                self.client.cancel(job_id)
+            except Exception as ex:
+                print(f"シミュレーションサービスのジョブ {job_id} をキャンセルできません: {str(ex)}")
+
+        future.add_done_callback(cancel_remote)
+
+        def follow():
+            try:
+                state = job
+                for state in self.client.events(job_id):
+                    if future.cancelled():
+                        return
+                    if on_progress is not None and state["status"] == "running":
+                        on_progress(state["percent"], state["phase"])
+                if state["status"] == "done":
+                    future.set_result(self.client.result(job_id))
+                elif state["status"] == "cancelled":
+                    future.set_exception(concurrent.futures.CancelledError())
+                else:
+                    future.set_result({"error": state["error"]})
+            except concurrent.futures.InvalidStateError:
+                pass  # 追いかけている間にキャンセルされた
+            except Exception as ex:
+                if not future.cancelled():
+                    future.set_exception(ex)
+
+        threading.Thread(target=follow, daemon=True).start()
+        return future
+
+
+def connect_worker_pool():
+    """
+    環境変数 SIMULATION_SERVICE_URL のサービスに接続できればそのワーカーを、
+    できなければこのプロセス専用のワーカープールを返す
+    """
+    if os.environ.get(SERVICE_URL_ENV):
+        try:
+            pool = ServiceWorkerPool(SimulationServiceClient())
+            print(f"シミュレーションサービスに接続しました: {pool.client.url}")
+            return pool
+        except Exception as ex:
+            print(f"シミュレーションサービスに接続できません（ローカルで実行します）: {str(ex)}")
+
+    from worker_pool import SimulationWorkerPool
+    pool = SimulationWorkerPool()
+    pool.start()
+    return pool
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ローカルのシミュレーションサービスを起動する")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("-j", "--workers", type=int, default=None, help="ワーカープロセス数（省略時はCPU数）")
+    args = parser.parse_args()
+    SimulationService(args.host, args.port, args.workers).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+# subprocess_log.py
+import collections
+import logging
+import logging.handlers
+import os
+import threading
+
+# 実行ディレクトリ内のログファイル名
+LOG_FILE_NAME = "simulation.log"
+
+# ログファイル1個の上限サイズと、残す古いファイルの数
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 3
+
+# メモリに残す最近の行数と、1行あたりの最大文字数
+TAIL_LINES = 200
+MAX_LINE_CHARS = 2000
+
+
+class SubprocessLogCapture:
+    """
+    シミュレーションのサブプロセスの標準出力・標準エラーを1行ずつログファイルに書き出す
+
+    出力を全てメモリに溜めずに、実行ディレクトリのローテーションするログファイルへ流す。
+    メモリには最近の行だけ（エラー表示用）を残す。実行ディレクトリが分かる
+    （attach_run_dir() が呼ばれる）までの行も、最近の分だけ保持して後でファイルに書く。
+    """
+
+    def __init__(self, tail_lines=TAIL_LINES, max_bytes=LOG_MAX_BYTES, backup_count=LOG_BACKUP_COUNT):
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.log_path = None
+        self._handler = None
+        self._pending = collections.deque(maxlen=tail_lines)
+        self._tails = {
+            "stdout": collections.deque(maxlen=tail_lines),
+            "stderr": collections.deque(maxlen=tail_lines),
+        }
+        self._lock = threading.Lock()
+        self._formatter = logging.Formatter("%(asctime)s [%(stream)s] %(message)s")
+
+    def _emit(self, stream_name, line):
+        """ログファイルに1行書く（ロックを取った状態で呼ぶ）"""
+        record = logging.makeLogRecord({"msg": line, "stream": stream_name, "levelno": logging.INFO})
+        self._handler.handle(record)
+
+    def attach_run_dir(self, run_dir):
+        """実行ディレクトリの data/output にログファイルを開き、それまでの行を書き出す"""
+        log_dir = os.path.join(run_dir, "data", "output")
+        os.makedirs(log_dir, exist_ok=True)
+        with self._lock:
+            if self._handler is not None:
+                return
+            self.log_path = os.path.join(log_dir, LOG_FILE_NAME)
+            self._handler = logging.handlers.RotatingFileHandler(
+                self.log_path,
+                maxBytes=self.max_bytes,
+                backupCount=self.backup_count,
+                encoding="utf-8"
+            )
+            self._handler.setFormatter(self._formatter)
+            while self._pending:
+                self._emit(*self._pending.popleft())
+
+    def write(self, stream_name, line):
+        """出力の1行を記録する（複数のスレッドから呼んでよい）"""
+        line = line.rstrip("\r\n")
+        if len(line) > MAX_LINE_CHARS:
+            line = line[:MAX_LINE_CHARS] + " ...（省略）"
+        with self._lock:
+            self._tails[stream_name].append(line)
+            if self._handler is None:
+                self._pending.append((stream_name, line))
+            else:
+                self._emit(stream_name, line)
+
+    def pump(self, stream, stream_name, on_line=None):
+        """
+        ストリームを終わりまで1行ずつ読んで記録する
+
+        on_line が与えられた場合は各行を渡し、Trueが返った行（進捗行など）は記録しない。
+        """
+        for line in stream:
+            if on_line is not None and on_line(line.rstrip("\r\n")):
+                continue
+            self.write(stream_name, line)
+
+    def tail(self, stream_name="stderr"):
+        """最近の出力を1つの文字列にして返す"""
+        with self._lock:
+            return "\n".join(self._tails[stream_name])
+
+    def close(self):
+        """ログファイルを閉じる"""
+        with self._lock:
+            if self._handler is not None:
+                self._handler.close()
+                self._handler = None
@@ -0,0 +1,304 @@
+# surrogate_model.py
+import json
+import math
+import os
+import threading
+import traceback
+
+import numpy as np
+
+try:
+    from scipy.linalg import cho_solve, solve_triangular
+except ImportError:
+    cho_solve = None
+    solve_triangular = None
+
+from run_catalog import DATA_DIR, NUMERIC_PARAM_NAMES, PARAM_NAMES, RunCatalog
+from run_neighbors import ParamEncoder, _to_number
+
+# 学習に使う実行の最大数（新しい方から。GPの学習は実行数の3乗で重くなる）
+MAX_TRAINING_RUNS = 1000
+
+# これより少ない実行しかない出力は予測しない
+MIN_TRAINING_RUNS = 5
+
+# 周辺尤度で選ぶカーネルの長さスケールとノイズ（入力・出力とも正規化した単位）
+LENGTH_SCALES = (0.5, 1.0, 2.0, 4.0, 8.0)
+NOISE_LEVELS = (1e-6, 1e-4, 1e-2, 1e-1)
+
+
+def _output_json_path(date_dir, data_dir=DATA_DIR):
+    """実行ディレクトリの output.json のパス"""
+    return os.path.join(data_dir, date_dir, "data", "output", "output.json")
+
+
+def scalar_outputs(doc):
+    """
+    output.json の内容から数値のスカラーだけを取り出す
+
+    配列（リストや .npy の参照）と文字列・真偽値は学習に使わない。
+    結果が "sim_result" の下に入っている場合はその中を見る。
+    """
+    if isinstance(doc.get("sim_result"), dict):
+        doc = doc["sim_result"]
+    return {
+        name: float(value)
+        for name, value in doc.items()
+        if isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+    }
+
+
+def _squared_distances(a, b):
+    """2つの点の集合の間の距離の2乗の行列"""
+    d2 = (a ** 2).sum(axis=1)[:, None] + (b ** 2).sum(axis=1)[None, :] - 2 * a @ b.T
+    return np.maximum(d2, 0.0)
+
+
+def _solve_lower(chol, b):
+    """下三角行列の連立方程式 chol @ x = b を解く"""
+    if solve_triangular is not None:
+        return solve_triangular(chol, b, lower=True, check_finite=False)
+    return np.linalg.solve(chol, b)
+
+
+def _cho_solve(chol, b):
+    """コレスキー分解 chol @ chol.T = K から K @ x = b を解く"""
+    if cho_solve is not None:
+        return cho_solve((chol, True), b, check_finite=False)
+    return np.linalg.solve(chol.T, np.linalg.solve(chol, b))
+
+
+class _GaussianProcess:
+    """
+    RBFカーネルのガウス過程回帰（1つの入力集合に対して複数の出力をまとめて学習する）
+
+    出力ごとに平均0・分散1に正規化し、長さスケールとノイズは LENGTH_SCALES と
+    NOISE_LEVELS の組み合わせから対数周辺尤度が最大のものを出力ごとに選ぶ。
+    """
+
+    def fit(self, points, targets):
+        """
+        Parameters:
+        -----------
+        points : numpy.ndarray
+            (実行数, 次元) の正規化した入力
+        targets : numpy.ndarray
+            (実行数, 出力数) の出力
+        """
+        n = len(points)
+        self.points = points
+        self.y_mean = targets.mean(axis=0)
+        y_std = targets.std(axis=0)
+        self.y_std = np.where(y_std > 0, y_std, 1.0)
+        y = (targets - self.y_mean) / self.y_std
+
+        d2 = _squared_distances(points, points)
+        best = [(-np.inf, None)] * targets.shape[1]
+        for length_scale in LENGTH_SCALES:
+            kernel = np.exp(-d2 / (2 * length_scale ** 2))
+            for noise in NOISE_LEVELS:
+                try:
+                    chol = np.linalg.cholesky(kernel + noise * np.eye(n))
+                except np.linalg.LinAlgError:
+                    continue
+                # 全ての出力の対数周辺尤度をまとめて求める
+                w = _solve_lower(chol, y)
+                log_likelihood = (
+                    -0.5 * (w ** 2).sum(axis=0)
+                    - np.log(np.diag(chol)).sum()
+                    - 0.5 * n * np.log(2 * np.pi)
+                )
+                for j, value in enumerate(log_likelihood):
+                    if value > best[j][0]:
+                        best[j] = (value, (length_scale, noise))
+
+        # 選ばれた (長さスケール, ノイズ) ごとにコレスキー分解を1回だけ作って持っておく
+        # （逆行列は作らず、予測も三角行列の連立方程式で解く）
+        self.alpha = np.empty_like(y)
+        self.factors = {}
+        self.hyper = []
+        for j, (_, hyper) in enumerate(best):
+            if hyper is None:
+                raise np.linalg.LinAlgError("カーネル行列のコレスキー分解に失敗しました")
+            if hyper not in self.factors:
+                length_scale, noise = hyper
+                kernel = np.exp(-d2 / (2 * length_scale ** 2)) + noise * np.eye(n)
+                self.factors[hyper] = np.linalg.cholesky(kernel)
+            self.hyper.append(hyper)
+            self.alpha[:, j] = _cho_solve(self.factors[hyper], y[:, j])
+        return self
+
+    def predict(self, point):
+        """1点の予測平均と標準偏差（元の単位）を出力ごとに返す"""
+        d2 = _squared_distances(point[None, :], self.points)[0]
+        means = np.empty(len(self.hyper))
+        stds = np.empty(len(self.hyper))
+        kernels = {}
+        for j, hyper in enumerate(self.hyper):
+            length_scale, noise = hyper
+            if hyper not in kernels:
+                k = np.exp(-d2 / (2 * length_scale ** 2))
+                v = _solve_lower(self.factors[hyper], k)
+                # 1 + noise - v @ v は理論上 noise 以上（丸め誤差で下回る分だけ切り上げる）
+                variance = max(1.0 + noise - v @ v, noise)
+                kernels[hyper] = (k, variance)
+            k, variance = kernels[hyper]
+            means[j] = k @ self.alpha[:, j]
+            stds[j] = np.sqrt(variance)
+        return self.y_mean + means * self.y_std, stds * self.y_std
+
+
+class SurrogateModel:
+    """
+    過去の実行の output.json から学習し、未実行のパラメータの結果を予測する代理モデル
+
+    入力は ParamEncoder で正規化し（k近傍探索と同じ座標）、数値のスカラー出力ごとに
+    ガウス過程回帰で予測平均と標準偏差を出す。refresh() でカタログに実行が増えて
+    いれば学習し直す。読み込んだ output.json は更新時刻ごとに覚えておき、学習し直す
+    ときは新しい実行の分だけ読む。
+    """
+
+    def __init__(self, catalog=None, max_runs=MAX_TRAINING_RUNS):
+        self.catalog = catalog or RunCatalog()
+        self.max_runs = max_runs
+        self._lock = threading.Lock()
+        self._encoder = None
+        self._groups = []        # [(出力名のリスト, _GaussianProcess)]
+        self._rows = []          # 学習対象の実行（実行ディレクトリ名の順）
+        self._outputs = {}       # 実行ディレクトリ名 -> (更新時刻, スカラー出力)
+        self._last_date_dir = None
+        self._total = 0          # 前回学習したときのカタログの実行数
+        self.training_runs = 0
+
+    def _read_outputs(self, date_dir):
+        """実行の output.json のスカラー出力を返す（まだない・読めない場合はNone）"""
+        path = _output_json_path(date_dir, self.catalog.data_dir)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+        cached = self._outputs.get(date_dir)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                outputs = scalar_outputs(json.load(f))
+        except Exception as e:
+            print(f"結果の読み込みエラー ({date_dir}): {str(e)}")
+            outputs = None
+        self._outputs[date_dir] = (mtime, outputs)
+        return outputs
+
+    def _train(self):
+        """学習対象の実行から全ての出力のモデルを作り直す（ロックを取った状態で呼ぶ）"""
+        rows, outputs = [], []
+        for row in self._rows:
+            values = self._read_outputs(row["date_dir"])
+            if values:
+                rows.append(row)
+                outputs.append(values)
+        self._outputs = {row["date_dir"]: self._outputs[row["date_dir"]] for row in rows}
+        self._groups = []
+        self.training_runs = len(rows)
+        if len(rows) < MIN_TRAINING_RUNS:
+            self._encoder = None
+            return
+
+        self._encoder = ParamEncoder().fit(rows)
+        points = self._encoder.transform(rows)
+
+        # 同じ実行の集合で値がそろう出力をまとめて学習する
+        names = sorted({name for values in outputs for name in values})
+        groups = {}
+        for name in names:
+            mask = tuple(name in values for values in outputs)
+            if sum(mask) >= MIN_TRAINING_RUNS:
+                groups.setdefault(mask, []).append(name)
+        for mask, group_names in groups.items():
+            index = np.flatnonzero(mask)
+            targets = np.array([[outputs[i][name] for name in group_names] for i in index])
+            try:
+                model = _GaussianProcess().fit(points[index], targets)
+            except np.linalg.LinAlgError:
+                traceback.print_exc()
+                continue
+            self._groups.append((group_names, model))
+
+    def refresh(self):
+        """
+        カタログに実行が増えていれば学習し直す
+
+        Returns:
+        --------
+        bool
+            学習し直した場合はTrue
+        """
+        total = self.catalog.count({})
+        with self._lock:
+            if self._last_date_dir is None:
+                rows = self.catalog.runs_after()
+            else:
+                new_rows = self.catalog.runs_after(self._last_date_dir)
+                if not new_rows and total == self._total:
+                    return False
+                if self._total + len(new_rows) == total:
+                    rows = self._rows + new_rows
+                else:
+                    # 実行の削除や古い日付の実行の取り込みがあったので全件読み直す
+                    rows = self.catalog.runs_after()
+            self._total = total
+            if not rows:
+                return False
+            self._rows = rows[-self.max_runs:]
+            self._last_date_dir = rows[-1]["date_dir"]
+            self._train()
+            print(f"代理モデルを学習しました: {self.training_runs}件の実行, 出力 {len(self.output_names)}種類")
+            return True
+
+    @property
+    def output_names(self):
+        """予測できる出力の名前"""
+        return [name for group_names, _ in self._groups for name in group_names]
+
+    def predict(self, params):
+        """
+        パラメータに対する結果を予測する
+
+        Parameters:
+        -----------
+        params : dict
+            パラメータ名 -> 値（数値として読めない値・範囲指定などは学習データの平均で補う）
+
+        Returns:
+        --------
+        dict
+            {"outputs": 出力名 -> (予測平均, 標準偏差),
+             "training_runs": 学習に使った実行の数,
+             "imputed": 平均で補ったパラメータ名のリスト}
+        """
+        params = {name: value for name, value in params.items() if name in PARAM_NAMES}
+        imputed = [name for name in NUMERIC_PARAM_NAMES if _to_number(params.get(name)) is None]
+        with self._lock:
+            outputs = {}
+            if self._encoder is not None:
+                point = self._encoder.vector(params)
+                for group_names, model in self._groups:
+                    means, stds = model.predict(point)
+                    for name, mean, std in zip(group_names, means, stds):
+                        outputs[name] = (float(mean), float(std))
+            return {"outputs": outputs, "training_runs": self.training_runs, "imputed": imputed}
+
+
+# プロセス全体で共有する代理モデル
+_surrogate = None
+_surrogate_lock = threading.Lock()
+
+
+def get_surrogate():
+    """プロセス全体で共有する代理モデルを返す（呼ぶたびにカタログの差分を取り込む）"""
+    global _surrogate
+    with _surrogate_lock:
+        if _surrogate is None:
+            _surrogate = SurrogateModel()
+    _surrogate.refresh()
+    return _surrogate
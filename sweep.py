@@ -0,0 +1,84 @@
+# sweep.py
+import itertools
+
+
+def is_sweep_value(text):
+    """入力値が範囲指定（開始:終了:刻み）またはリスト指定（a,b,c）かどうか"""
+    text = str(text)
+    return ":" in text or "," in text
+
+
+def _format_number(value):
+    """スイープで生成した数値を入力欄と同じ形式の文字列にする"""
+    value = round(value, 10)
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def parse_sweep_value(text):
+    """
+    スイープ指定の文字列を値のリストに展開する
+
+    "40:60:10" -> ["40", "50", "60"]（終了値を含む）
+    "40,50,60" -> ["40", "50", "60"]
+    "50"       -> ["50"]
+    """
+    text = str(text).strip()
+    if ":" in text:
+        parts = [p.strip() for p in text.split(":")]
+        if len(parts) != 3:
+            raise ValueError(f"範囲指定は 開始:終了:刻み の形式で入力してください: {text}")
+        start, stop, step = (float(p) for p in parts)
+        if step <= 0:
+            raise ValueError(f"刻みは正の値である必要があります: {text}")
+        if stop < start:
+            raise ValueError(f"終了値は開始値以上である必要があります: {text}")
+        count = int(round((stop - start) / step)) + 1
+        return [_format_number(start + i * step) for i in range(count)]
+    if "," in text:
+        return [p.strip() for p in text.split(",") if p.strip()]
+    return [text]
+
+
+def expand_sweep(params):
+    """
+    スイープ指定を含むパラメータを、全組み合わせのパラメータセットのリストに展開する
+
+    Parameters:
+    -----------
+    params : dict
+        パラメータ名 -> 値（範囲指定・リスト指定を含んでよい）
+
+    Returns:
+    --------
+    list of dict
+        1点ごとのシミュレーションパラメータ
+    """
+    names = list(params.keys())
+    value_lists = [
+        parse_sweep_value(params[name]) if is_sweep_value(params[name]) else [params[name]]
+        for name in names
+    ]
+    return [dict(zip(names, values)) for values in itertools.product(*value_lists)]
+
+
+def run_sweep(jobs, pool, force=False):
+    """
+    パラメータセットのリストを並列に実行し、終わった順に結果を返す
+
+    Parameters:
+    -----------
+    jobs : list of dict
+        expand_sweep() で展開したパラメータセット
+    pool : worker_pool.SimulationWorkerPool
+        アプリ全体で使い回すウォーム済みのワーカープール
+    force : bool
+        Trueの場合は結果キャッシュを使わずに全点を再実行する
+
+    Yields:
+    -------
+    dict
+        run_simulation_in_process() の結果（完了順）
+    """
+    yield from pool.run_unordered(jobs, force=force)
@@ -0,0 +1,51 @@
+# synthetic_maps.py
+import numpy as np
+
+
+def generate_synthetic_maps(params, X0=0.0, Y0=0.0, X_pitch=1.0, Y_pitch=1.0, X_num=20, Y_num=20, seed=None):
+    """
+    テスト・デモ用のCD・位置ずれ・LERマップを生成する
+
+    中心から離れるほど細くなるCDに波状のパターンとノイズを重ねたマップを、
+    ループを使わずに配列演算だけで作る。乱数は1回の呼び出しでまとめて生成する。
+
+    Parameters:
+    -----------
+    params : dict
+        シミュレーションパラメータ（pattern_width を基準CDに使う）
+    X0, Y0 : float
+        原点の座標 [nm]
+    X_pitch, Y_pitch : float
+        点の間隔 [nm]
+    X_num, Y_num : int
+        列数・行数
+    seed : int, optional
+        乱数シード（指定すると同じマップを再現できる）
+
+    Returns:
+    --------
+    dict
+        map_store.load_maps() と同じ形式（"x_nm", "y_nm", "CD", "position", "LER"）
+    """
+    rng = np.random.default_rng(seed)
+    base_cd = float(params.get("pattern_width", 100))
+
+    i = np.arange(Y_num, dtype=np.float64)[:, np.newaxis]  # 行（Y）
+    j = np.arange(X_num, dtype=np.float64)[np.newaxis, :]  # 列（X）
+
+    # 中心からの正規化距離
+    dist_from_center = np.sqrt(((i - Y_num / 2) / (Y_num / 2)) ** 2 + ((j - X_num / 2) / (X_num / 2)) ** 2)
+    wave_pattern = 5.0 * np.sin(i / 2) * np.cos(j / 2)
+
+    # 3つのマップ分の標準正規乱数を一度に生成
+    noise = rng.standard_normal((3, Y_num, X_num))
+
+    cd_map = base_cd * (1 - 0.2 * dist_from_center) + wave_pattern + noise[0] * (base_cd * 0.03)
+    pos_map = noise[1] * 5.0
+    ler_map = 3.0 + noise[2] * 0.5
+
+    # X軸は実データ（CD_map.csv）に合わせて降順
+    x_nm = X0 + X_pitch * np.arange(X_num - 1, -1, -1, dtype=np.float64)
+    y_nm = Y0 + Y_pitch * np.arange(Y_num, dtype=np.float64)
+
+    return {"x_nm": x_nm, "y_nm": y_nm, "CD": cd_map, "position": pos_map, "LER": ler_map}
@@ -0,0 +1,232 @@
+# worker_pool.py
+import concurrent.futures
+import itertools
+import multiprocessing as mp
+import os
+import threading
+import traceback
+from concurrent.futures.process import BrokenProcessPool
+
+from simulation_runner import load_simulation_module, run_simulation_in_process
+
+# ワーカープロセス内で保持するシミュレーションモジュール（なければテスト用ダミー処理）
+_simulation_module = None
+
+# ワーカープロセスから親プロセスへ進捗を送るキュー
+_progress_queue = None
+
+
+def _warm_up(progress_queue=None):
+    """ワーカー起動時に一度だけシミュレーションモジュールをインポートしておく"""
+    global _simulation_module, _progress_queue
+    _progress_queue = progress_queue
+    _simulation_module = load_simulation_module()
+    if _simulation_module is None:
+        print(f"ワーカー {os.getpid()}: シミュレーションモジュールがないためテスト用ダミー処理で実行します")
+    print(f"ワーカー {os.getpid()} 起動完了")
+
+
+def _ping():
+    """ヘルスチェック用：ワーカーのプロセスIDを返す"""
+    return os.getpid()
+
+
+def _run_job(job_id, params, force=False):
+    """ワーカー内でシミュレーションを実行し、進捗をキューで親プロセスに送る"""
+    def report(percent, phase):
+        if _progress_queue is not None:
+            _progress_queue.put((job_id, percent, phase))
+
+    return run_simulation_in_process(
+        params, progress=report, force=force, simulation_module=_simulation_module
+    )
+
+
+class SimulationWorkerPool:
+    """
+    アプリ起動時に一度だけ作成し、実行のたびに使い回すワーカープール
+
+    ワーカーは起動時にシミュレーションモジュールをインポート済みの状態で待機する。
+    ワーカーが異常終了してプールが壊れた場合は作り直して再実行する。
+    """
+
+    def __init__(self, processes=None):
+        self.processes = processes or os.cpu_count() or 1
+        self._executor = None
+        self._progress_queue = None
+        self._progress_callbacks = {}
+        self._job_ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def _dispatch_progress(self, progress_queue):
+        """ワーカーからの進捗を受け取り、ジョブごとのコールバックに渡す（専用スレッド）"""
+        while True:
+            item = progress_queue.get()
+            if item is None:
+                break
+            job_id, percent, phase = item
+            callback = self._progress_callbacks.get(job_id)
+            if callback is None:
+                continue
+            try:
+                callback(percent, phase)
+            except Exception:
+                traceback.print_exc()
+
+    def _stop_progress_listener(self, progress_queue):
+        """進捗受信スレッドを終了させる"""
+        if progress_queue is not None:
+            progress_queue.put(None)
+
+    def start(self):
+        """プールを起動し、全ワーカーのウォームアップを開始する"""
+        with self._lock:
+            if self._executor is None:
+                ctx = mp.get_context('spawn')  # Windows互換性のため'spawn'を使用
+                self._progress_queue = ctx.Queue()
+                threading.Thread(
+                    target=self._dispatch_progress,
+                    args=(self._progress_queue,),
+                    daemon=True
+                ).start()
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.processes,
+                    mp_context=ctx,
+                    initializer=_warm_up,
+                    initargs=(self._progress_queue,)
+                )
+                # ProcessPoolExecutorはワーカーを遅延起動するので、ここで全員起こしておく
+                for _ in range(self.processes):
+                    self._executor.submit(_ping)
+            return self._executor
+
+    def restart(self):
+        """プールを破棄して作り直す"""
+        print("ワーカープールを再起動します")
+        with self._lock:
+            executor, self._executor = self._executor, None
+            progress_queue, self._progress_queue = self._progress_queue, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self._stop_progress_listener(progress_queue)
+        return self.start()
+
+    def shutdown(self):
+        """プールを終了する"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            progress_queue, self._progress_queue = self._progress_queue, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        self._stop_progress_listener(progress_queue)
+
+    def health_check(self, timeout=10):
+        """
+        ワーカーが応答するか確認し、応答しない場合はプールを再起動する
+
+        Returns:
+        --------
+        bool
+            再起動せずに応答があった場合はTrue
+        """
+        try:
+            self.start().submit(_ping).result(timeout=timeout)
+            return True
+        except Exception as ex:
+            print(f"ワーカープールのヘルスチェック失敗: {str(ex)}")
+            self.restart()
+            return False
+
+    def submit(self, params, on_progress=None, force=False, priority=None):
+        """
+        1件のシミュレーションを投入する
+
+        Parameters:
+        -----------
+        params : dict
+            シミュレーションパラメータ
+        on_progress : callable, optional
+            進捗通知用の関数 on_progress(percent, phase)（進捗受信スレッドから呼ばれる）
+        force : bool
+            Trueの場合は結果キャッシュを使わずに再実行する
+        priority : int, optional
+            ジョブの優先度（このプールでは使わない。実行順は JobRunner が決める）
+
+        Returns:
+        --------
+        concurrent.futures.Future
+            run_simulation_in_process() の結果を返すFuture
+        """
+        job_id = next(self._job_ids)
+        if on_progress is not None:
+            self._progress_callbacks[job_id] = on_progress
+
+        try:
+            future = self.start().submit(_run_job, job_id, params, force)
+        except BrokenProcessPool:
+            future = self.restart().submit(_run_job, job_id, params, force)
+
+        future.add_done_callback(lambda _: self._progress_callbacks.pop(job_id, None))
+        return future
+
+    def run(self, params, on_progress=None, force=False):
+        """
+        1件のシミュレーションを実行して結果を待つ（ワーカー異常終了時は1回だけ再実行する）
+
+        Returns:
+        --------
+        dict
+            シミュレーション結果
+        """
+        try:
+            return self.submit(params, on_progress, force).result()
+        except BrokenProcessPool:
+            traceback.print_exc()
+            self.restart()
+            return self.submit(params, on_progress, force).result()
+
+    def run_unordered(self, jobs, force=False):
+        """
+        複数のシミュレーションを並列に実行し、終わった順に結果を返す
+
+        ワーカーが異常終了した場合はプールを作り直し、未完了のジョブを再投入する。
+
+        Yields:
+        -------
+        dict
+            run_simulation_in_process() の結果（完了順）
+        """
+        for _, result in self.run_unordered_items(jobs, force=force):
+            yield result
+
+    def run_unordered_items(self, jobs, force=False):
+        """
+        run_unordered() と同じだが、結果を投入したパラメータと組にして返す
+
+        Yields:
+        -------
+        tuple
+            (パラメータ, run_simulation_in_process() の結果)（完了順）
+        """
+        pending = list(jobs)
+        retried = False
+        while pending:
+            futures = {self.submit(params, force=force): params for params in pending}
+            pending = []
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        pending.append(futures[future])
+                        continue
+                    yield futures[future], result
+            finally:
+                for future in futures:
+                    future.cancel()
+
+            if pending:
+                if retried:
+                    raise BrokenProcessPool(f"ワーカーの異常終了が続いたため {len(pending)} 件を実行できませんでした")
+                retried = True
+                self.restart()